@@ -1,21 +1,117 @@
 #!/usr/bin/env python3
+import asyncio
+import atexit
+import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from utils.api import ApiClient, DEFAULT_POOL_SIZE, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, DEFAULT_RATE_LIMIT
+from utils.cassette import Cassette, REPLAY
+from utils.http_cache import ResponseCache
+from utils.metrics import JsonLinesTrace, Metrics
+from utils.resilience import RetryPolicy
+
+DEFAULT_MAX_WORKERS = 4
 
 
 class BankAPIBase:
+    # Converters from raw API records to classes.models, set per bank
+    account_model = None
+    balance_model = None
+    transaction_model = None
+
     def __init__(self, env_prefix):
         load_dotenv()
         self.client_id = os.getenv(f'{env_prefix}_CLIENT_ID')
         self.client_secret = os.getenv(f'{env_prefix}_CLIENT_SECRET')
         self.username = os.getenv(f'{env_prefix}_USERNAME')
         self.pin = os.getenv(f'{env_prefix}_PIN')
+        self.client = ApiClient(
+            pool_size=int(os.getenv(
+                f'{env_prefix}_POOL_SIZE', DEFAULT_POOL_SIZE)),
+            connect_timeout=float(os.getenv(
+                f'{env_prefix}_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT)),
+            read_timeout=float(os.getenv(
+                f'{env_prefix}_READ_TIMEOUT', DEFAULT_READ_TIMEOUT)),
+            retry_policy=RetryPolicy(max_retries=int(os.getenv(
+                f'{env_prefix}_MAX_RETRIES', 3))),
+            rate_limit=float(os.getenv(
+                f'{env_prefix}_RATE_LIMIT', DEFAULT_RATE_LIMIT))
+        )
+        self.max_workers = int(os.getenv(
+            f'{env_prefix}_MAX_WORKERS', DEFAULT_MAX_WORKERS))
+        # Set to abort a running 2FA wait (see cancel_authentication)
+        self.auth_cancelled = threading.Event()
+        self.metrics = Metrics()
+        self.client.add_hook(self.metrics)
+        self._setup_exporters(env_prefix)
+        self._setup_cassette(env_prefix)
+
+    def _setup_exporters(self, env_prefix):
+        """Attach the trace/metrics exporters configured in the environment
+
+        {PREFIX}_TRACE_FILE (or BANKCONNECT_TRACE_FILE) appends a JSON-lines
+        event trace; {PREFIX}_METRICS_FILE (or BANKCONNECT_METRICS_FILE) is
+        rewritten as a Prometheus textfile when the process exits.
+        """
+        trace_file = os.getenv(f'{env_prefix}_TRACE_FILE') or os.getenv('BANKCONNECT_TRACE_FILE')
+        if trace_file:
+            trace = JsonLinesTrace(trace_file)
+            self.client.add_hook(trace)
+            atexit.register(trace.close)
+        metrics_file = os.getenv(f'{env_prefix}_METRICS_FILE') or os.getenv('BANKCONNECT_METRICS_FILE')
+        if metrics_file:
+            atexit.register(self.metrics.write_prometheus, metrics_file,
+                            f'bankconnect_{env_prefix.lower()}')
+
+    def _setup_cassette(self, env_prefix):
+        """Record to or replay from {PREFIX}_CASSETTE per {PREFIX}_CASSETTE_MODE"""
+        path = os.getenv(f'{env_prefix}_CASSETTE')
+        if path:
+            self.client.cassette = Cassette(
+                path, os.getenv(f'{env_prefix}_CASSETTE_MODE', REPLAY))
+            atexit.register(self.client.cassette.save)
+
+    def _setup_http_cache(self, env_prefix):
+        """Persist the response cache to {PREFIX}_HTTP_CACHE, encrypted with the PIN
 
-    def authenticate(self):
+        Called by subclasses once self.pin is known.
+        """
+        cache_path = os.getenv(f'{env_prefix}_HTTP_CACHE')
+        if cache_path:
+            self.client.cache = ResponseCache(path=cache_path, secret=self.pin)
+
+    def authenticate(self, on_progress=None):
         raise NotImplementedError(
             "This method should be overridden by subclasses")
 
-    def get_accounts(self):
+    def cancel_authentication(self):
+        """Stop waiting for a 2FA confirmation; authenticate() raises PollCancelled"""
+        self.auth_cancelled.set()
+
+    async def authenticate_async(self, on_progress=None):
+        """Authenticate without blocking the event loop
+
+        Lets several banks wait for their 2FA confirmation in parallel,
+        e.g. via asyncio.gather(). Cancelling the task also cancels the
+        2FA poll running in the worker thread.
+        """
+        self.auth_cancelled.clear()
+        try:
+            await asyncio.to_thread(self.authenticate, on_progress)
+        except asyncio.CancelledError:
+            self.cancel_authentication()
+            raise
+
+    def keep_alive(self, within):
+        """Renew the session if it would expire within the next `within` seconds
+
+        Called by the scheduler daemon between runs; banks without
+        renewable sessions keep this no-op.
+        """
+
+    def get_accounts(self, force_refresh=False):
         raise NotImplementedError(
             "This method should be overridden by subclasses")
 
@@ -23,10 +119,64 @@ class BankAPIBase:
         raise NotImplementedError(
             "This method should be overridden by subclasses")
 
-    def get_all_balances(self):
+    def iter_transactions(self, account_id, from_date=None, to_date=None, stream=False):
         raise NotImplementedError(
             "This method should be overridden by subclasses")
 
-    def get_account_balance(self, account_id):
+    def get_all_balances(self, force_refresh=False):
         raise NotImplementedError(
             "This method should be overridden by subclasses")
+
+    def get_account_balance(self, account_id, force_refresh=False):
+        raise NotImplementedError(
+            "This method should be overridden by subclasses")
+
+    @staticmethod
+    def _values(response):
+        if isinstance(response, dict) and 'values' in response:
+            response = json.loads(response['values']) if isinstance(
+                response['values'], str) else response['values']
+        return response or []
+
+    def get_account_ids(self, force_refresh=False):
+        """Get the ids of all accounts returned by get_accounts()"""
+        return [account['accountId'] for account in self._values(self.get_accounts(force_refresh))]
+
+    def get_account_models(self, force_refresh=False):
+        """get_accounts() as a list of Account models"""
+        return [self.account_model(account)
+                for account in self._values(self.get_accounts(force_refresh))]
+
+    def get_balance_models(self, force_refresh=False):
+        """get_all_balances() as a list of Balance models"""
+        return [self.balance_model(balance)
+                for balance in self._values(self.get_all_balances(force_refresh))]
+
+    def get_account_balance_model(self, account_id, force_refresh=False):
+        return self.balance_model(self.get_account_balance(account_id, force_refresh))
+
+    def iter_transaction_models(self, account_id, from_date=None, to_date=None):
+        """Stream an account's transactions as Transaction models"""
+        for transaction in self.iter_transactions(account_id, from_date, to_date, stream=True):
+            yield self.transaction_model(transaction, account_id)
+
+    def fetch_all(self, from_date=None, to_date=None, max_workers=None):
+        """Fetch transactions and balance of every account concurrently
+
+        Expects authenticate() to have been called. Failures are recorded
+        per account under 'error' instead of aborting the whole run.
+        """
+        def fetch_account(account_id):
+            result = {'transactions': None, 'balance': None, 'error': None}
+            try:
+                result['transactions'] = self.get_transactions(
+                    account_id, from_date, to_date)
+                result['balance'] = self.get_account_balance(account_id)
+            except Exception as e:
+                result['error'] = str(e)
+            return result
+
+        account_ids = self.get_account_ids()
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+            results = executor.map(fetch_account, account_ids)
+            return dict(zip(account_ids, results))
@@ -1,25 +1,57 @@
 #!/usr/bin/env python3
 from .api_base import BankAPIBase
-from utils.api import create_request_headers, make_request
+from .models import Account, Balance, Transaction
+from utils.api import create_request_headers
 from utils.credentials import get_credential
+from utils.poller import ChallengePoller
+from utils.token_cache import TokenCache
 import requests
 import base64
 import json
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+DEFAULT_PAGE_SIZE = 500
+TOKEN_REFRESH_MARGIN = 60
+ACCOUNTS_CACHE_TTL = 24 * 60 * 60
+BALANCES_CACHE_TTL = 60
+
+
+def is_invalid_grant(error):
+    """Whether an OAuth error says the refresh token itself is no longer valid"""
+    response = getattr(error, 'response', None)
+    if response is None or response.status_code not in (400, 401):
+        return False
+    try:
+        return response.json().get('error') == 'invalid_grant'
+    except ValueError:
+        return False
+
 
 class ComdirectAPI(BankAPIBase):
+    account_model = staticmethod(Account.from_comdirect)
+    balance_model = staticmethod(Balance.from_comdirect)
+    transaction_model = staticmethod(Transaction.from_comdirect)
+
     def __init__(self):
         super().__init__('COMDIRECT')
         self.base_url = "https://api.comdirect.de"
         self.session_id = self.get_session_id()
         self.access_token = None
+        # Current token entry (see TokenCache.save); the disk cache only
+        # carries it over to the next process
+        self.token = None
         self.client_id = self.get_client_id()
         self.client_secret = self.get_client_secret()
         self.username = self.get_username()
         self.pin = self.get_pin()
+        self.client.cache_namespace = f'COMDIRECT:{self.username}'
+        self._setup_http_cache('COMDIRECT')
+        # Replayed tokens are fake, keep them out of the real token cache
+        self.token_cache = TokenCache(
+            'COMDIRECT', self.username, None if self.client.replaying else self.pin)
 
     def get_pin(self):
         return get_credential('PIN', 'COMDIRECT', use_getpass=True)
@@ -39,8 +71,86 @@ class ComdirectAPI(BankAPIBase):
     def get_request_id(self):
         return str(uuid.uuid4())
 
-    def authenticate(self):
-        """Authenticate with Comdirect"""
+    def _auth_headers(self):
+        return {
+            'Accept': 'application/json',
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'X-Request-ID': self.get_request_id(),
+            'Authorization': 'Basic ' + base64.b64encode(
+                f"{self.client_id}:{self.client_secret}".encode()
+            ).decode()
+        }
+
+    def authenticate(self, on_progress=None):
+        """Authenticate with Comdirect
+
+        Reuses the token held in memory, or else the one from the disk
+        cache, while it is valid and tries the refresh_token grant when it
+        is about to expire, so the TAN flow only runs when there is no
+        usable token. on_progress receives (elapsed, attempt)
+        while waiting for the push-TAN confirmation.
+        """
+        with self.client.phase('auth'):
+            self._authenticate(on_progress)
+
+    def _authenticate(self, on_progress):
+        token = self._current_token()
+        if token:
+            self.session_id = token.get('session_id', self.session_id)
+            if token['expires_at'] - time.time() > TOKEN_REFRESH_MARGIN:
+                self.access_token = token['access_token']
+                return
+            if token.get('refresh_token'):
+                try:
+                    self.refresh(token['refresh_token'])
+                    return
+                except requests.HTTPError as e:
+                    # Network errors and 5xx must not cost a valid refresh token
+                    if not is_invalid_grant(e):
+                        raise
+                    self.token = None
+                    self.token_cache.clear()
+                    self.session_id = self.get_session_id()
+
+        token_data = self.authenticate_with_tan(on_progress)
+        self._store_token(token_data)
+
+    def _current_token(self):
+        """The token held by this instance, else the one from the disk cache"""
+        if self.token is None:
+            self.token = self.token_cache.load()
+        return self.token
+
+    def _store_token(self, token_data):
+        self.access_token = token_data['access_token']
+        self.token = self.token_cache.save(token_data, session_id=self.session_id)
+
+    def refresh(self, refresh_token):
+        """Exchange a refresh token for a new access token"""
+        with self.client.phase('auth.refresh'):
+            token_data = self.client.request(
+                'POST',
+                f"{self.base_url}/oauth/token",
+                self._auth_headers(),
+                data={
+                    'client_id': self.client_id,
+                    'client_secret': self.client_secret,
+                    'grant_type': 'refresh_token',
+                    'refresh_token': refresh_token
+                }
+            )
+        self._store_token(token_data)
+
+    def keep_alive(self, within):
+        """Refresh the token now if it would expire within `within` seconds"""
+        token = self._current_token()
+        if token and token.get('refresh_token') and \
+                token['expires_at'] - time.time() <= within + TOKEN_REFRESH_MARGIN:
+            self.session_id = token.get('session_id', self.session_id)
+            self.refresh(token['refresh_token'])
+
+    def authenticate_with_tan(self, on_progress=None):
+        """Run the full password grant and 2FA flow"""
         auth_data = {
             'client_id': self.client_id,
             'client_secret': self.client_secret,
@@ -49,16 +159,9 @@ class ComdirectAPI(BankAPIBase):
             'grant_type': 'password'
         }
 
-        auth_headers = {
-            'Accept': 'application/json',
-            'Content-Type': 'application/x-www-form-urlencoded',
-            'X-Request-ID': self.get_request_id(),
-            'Authorization': 'Basic ' + base64.b64encode(
-                f"{self.client_id}:{self.client_secret}".encode()
-            ).decode()
-        }
+        auth_headers = self._auth_headers()
 
-        token_data = make_request(
+        token_data = self.client.request(
             'POST',
             f"{self.base_url}/oauth/token",
             auth_headers,
@@ -74,13 +177,13 @@ class ComdirectAPI(BankAPIBase):
             )
 
             client_id = token_data['kdnr']
-            session_data = make_request(
+            session_data = self.client.request(
                 'GET',
                 f'{self.base_url}/api/session/clients/{client_id}/v1/sessions',
                 session_headers
             )[0]
 
-            challenge = make_request(
+            challenge = self.client.request(
                 'POST',
                 f'{self.base_url}/api/session/clients/{client_id}/v1/sessions/{
                     session_data["identifier"]}/validate',
@@ -100,42 +203,40 @@ class ComdirectAPI(BankAPIBase):
             if challenge_info.get('typ') == 'P_TAN_PUSH':
                 auth_status_url = self.base_url + \
                     challenge_info['link']['href']
-                start_time = time.time()
-                timeout = 120
-
-                while (time.time() - start_time) < timeout:
-                    status_response = requests.get(
-                        auth_status_url,
-                        headers=session_headers
-                    )
-
-                    if status_response.status_code == 200:
-                        status_data = status_response.json()
-                        if status_data.get('status') == 'AUTHENTICATED':
-                            activation_headers = session_headers.copy()
-                            activation_headers['x-once-authentication-info'] = json.dumps(
-                                {'id': challenge_id})
-
-                            session_activate = requests.patch(
-                                f'{self.base_url}/api/session/clients/{
-                                    client_id}/v1/sessions/{session_data["identifier"]}',
-                                headers=activation_headers,
-                                json={
-                                    'identifier': session_data['identifier'],
-                                    'sessionTanActive': True,
-                                    'activated2FA': True
-                                }
-                            )
-                            session_activate.raise_for_status()
-                            break
-                    time.sleep(2)
-                else:
-                    raise TimeoutError(
-                        "Push notification confirmation timed out")
+                poller = ChallengePoller(
+                    self.client,
+                    auth_status_url,
+                    session_headers,
+                    lambda status: status.get('status') == 'AUTHENTICATED',
+                    on_progress=on_progress,
+                    cancelled=self.auth_cancelled
+                )
+                try:
+                    with self.client.phase('auth.tan_wait'):
+                        poller.poll()
+                finally:
+                    self.auth_cancelled.clear()
+
+                activation_headers = session_headers.copy()
+                activation_headers['x-once-authentication-info'] = json.dumps(
+                    {'id': challenge_id})
+
+                self.client.request(
+                    'PATCH',
+                    f'{self.base_url}/api/session/clients/{
+                        client_id}/v1/sessions/{session_data["identifier"]}',
+                    activation_headers,
+                    json_data={
+                        'identifier': session_data['identifier'],
+                        'sessionTanActive': True,
+                        'activated2FA': True
+                    }
+                )
 
-        final_auth = requests.post(
+        token_data = self.client.request(
+            'POST',
             f'{self.base_url}/oauth/token',
-            headers=auth_headers,
+            auth_headers,
             data={
                 'client_id': self.client_id,
                 'client_secret': self.client_secret,
@@ -143,66 +244,146 @@ class ComdirectAPI(BankAPIBase):
                 'token': self.access_token
             }
         )
-        final_auth.raise_for_status()
-        token_data = final_auth.json()
         self.access_token = token_data['access_token']
+        return token_data
 
-    def get_accounts(self):
-        """Get all accounts"""
+    def get_accounts(self, force_refresh=False):
+        """Get all accounts, cached for a day unless force_refresh is set"""
         headers = create_request_headers(
             self.access_token,
             self.session_id,
             self.get_request_id()
         )
-        return make_request(
+        return self.client.request(
             'GET',
             f"{self.base_url}/api/banking/clients/user/v2/accounts",
-            headers
+            headers,
+            cache_ttl=ACCOUNTS_CACHE_TTL,
+            force_refresh=force_refresh
         )
 
-    def get_transactions(self, account_id, from_date=None, to_date=None):
-        """Get transactions for a specific account"""
-        headers = create_request_headers(
-            self.access_token,
-            self.session_id,
-            self.get_request_id()
-        )
+    def iter_transactions(self, account_id, from_date=None, to_date=None,
+                          page_size=DEFAULT_PAGE_SIZE, prefetch=False, stream=False):
+        """Yield transactions for a specific account one page at a time
+
+        With prefetch enabled the next page is requested on a background
+        thread while the caller is still consuming the current one. With
+        stream each page is decoded while it downloads instead (prefetch
+        is then ignored).
+        """
         params = {
             'with-attr': 'account',
-            'bookingStatus': 'BOTH'
+            'bookingStatus': 'BOTH',
+            'paging-count': page_size
         }
         if from_date:
             params['min-bookingDate'] = from_date
+        if to_date:
+            params['max-bookingDate'] = to_date
+        if stream:
+            yield from self._iter_transactions_streamed(account_id, params, page_size)
+            return
+
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            first = 0
+            page = self._get_transactions_page(account_id, params, first)
+            while page:
+                values = page.get('values') or []
+                matches = page.get('paging', {}).get('matches')
+                first += len(values)
+                if matches is not None:
+                    has_more = bool(values) and first < matches
+                else:
+                    has_more = len(values) >= page_size
 
-        return make_request(
+                next_page = None
+                if has_more and executor:
+                    next_page = executor.submit(
+                        self._get_transactions_page, account_id, params, first)
+
+                yield from values
+
+                if not has_more:
+                    break
+                page = next_page.result() if next_page else \
+                    self._get_transactions_page(account_id, params, first)
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def _iter_transactions_streamed(self, account_id, params, page_size):
+        first = 0
+        while True:
+            headers = create_request_headers(
+                self.access_token,
+                self.session_id,
+                self.get_request_id()
+            )
+            meta = {}
+            count = 0
+            for transaction in self.client.iter_json(
+                    'GET',
+                    f"{self.base_url}/api/banking/v1/accounts/{account_id}/transactions",
+                    headers,
+                    params={**params, 'paging-first': first},
+                    meta=meta):
+                count += 1
+                yield transaction
+
+            first += count
+            matches = (meta.get('paging') or {}).get('matches')
+            if not count or (first >= matches if matches is not None else count < page_size):
+                return
+
+    def _get_transactions_page(self, account_id, params, first):
+        headers = create_request_headers(
+            self.access_token,
+            self.session_id,
+            self.get_request_id()
+        )
+        return self.client.request(
             'GET',
             f"{self.base_url}/api/banking/v1/accounts/{account_id}/transactions",
             headers,
-            params=params
+            params={**params, 'paging-first': first}
         )
 
-    def get_all_balances(self):
+    def get_transactions(self, account_id, from_date=None, to_date=None):
+        """Get transactions for a specific account"""
+        values = list(self.iter_transactions(
+            account_id, from_date, to_date, prefetch=True))
+        return {
+            'paging': {'index': 0, 'matches': len(values)},
+            'values': values
+        }
+
+    def get_all_balances(self, force_refresh=False):
         """Get balances for all accounts including cash balance and buying power"""
         headers = create_request_headers(
             self.access_token,
             self.session_id,
             self.get_request_id()
         )
-        return make_request(
+        return self.client.request(
             'GET',
             f"{self.base_url}/api/banking/clients/user/v2/accounts/balances",
-            headers
+            headers,
+            cache_ttl=BALANCES_CACHE_TTL,
+            force_refresh=force_refresh
         )
 
-    def get_account_balance(self, account_id):
+    def get_account_balance(self, account_id, force_refresh=False):
         """Get balance information for a specific account"""
         headers = create_request_headers(
             self.access_token,
             self.session_id,
             self.get_request_id()
         )
-        return make_request(
+        return self.client.request(
             'GET',
             f"{self.base_url}/api/banking/v2/accounts/{account_id}/balances",
-            headers
+            headers,
+            cache_ttl=BALANCES_CACHE_TTL,
+            force_refresh=force_refresh
         )
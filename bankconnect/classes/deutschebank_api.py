@@ -1,8 +1,7 @@
 #!/usr/bin/env python3
 from .api_base import BankAPIBase
-from utils.api import create_request_headers, make_request
+from utils.api import create_request_headers
 from utils.credentials import get_credential
-import requests
 import base64
 import json
 import time
@@ -20,6 +19,7 @@ class DeutscheBankAPI(BankAPIBase):
         self.client_secret = self.get_client_secret()
         self.username = self.get_username()
         self.pin = self.get_pin()
+        self._setup_http_cache('DEUTSCHEBANK')
 
     def get_pin(self):
         return get_credential('PIN', 'DEUTSCHEBANK', use_getpass=True)
@@ -39,11 +39,11 @@ class DeutscheBankAPI(BankAPIBase):
     def get_request_id(self):
         return str(uuid.uuid4())
 
-    def authenticate(self):
+    def authenticate(self, on_progress=None):
         """Authenticate with Deutsche Bank"""
         pass
 
-    def get_accounts(self):
+    def get_accounts(self, force_refresh=False):
         """Get all accounts"""
         pass
 
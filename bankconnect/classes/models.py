@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+import sys
+from dataclasses import asdict, dataclass, is_dataclass
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@lru_cache(maxsize=8192)
+def _date(value):
+    """Parse an ISO date once; equal dates share one object"""
+    return date.fromisoformat(value) if value else None
+
+
+def _decimal(value):
+    return Decimal(value) if value not in (None, '') else None
+
+
+def _amount(data, key):
+    """Split a {'value', 'unit'} object into (Decimal, interned unit)"""
+    amount = data.get(key) or {}
+    return _decimal(amount.get('value')), _intern(amount.get('unit'))
+
+
+def _party(data, key):
+    party = data.get(key) or {}
+    return party.get('holderName'), party.get('iban'), party.get('bic')
+
+
+def _extra(data, known):
+    """Fields an adapter does not map, kept so exports can still show them"""
+    extra = {key: value for key, value in data.items() if key not in known}
+    return extra or None
+
+
+def to_dict(item):
+    """Plain dict (recursively) of a model, e.g. for JSON output"""
+    return asdict(item) if is_dataclass(item) else item
+
+
+@dataclass(slots=True)
+class Account:
+    """A bank account, normalized from the bank's raw record"""
+
+    account_id: str
+    display_id: str | None = None
+    iban: str | None = None
+    currency: str | None = None
+    account_type: str | None = None
+    account_type_text: str | None = None
+    client_id: str | None = None
+    credit_limit: Decimal | None = None
+
+    @classmethod
+    def from_comdirect(cls, data):
+        account_type = data.get('accountType') or {}
+        return cls(
+            data['accountId'],
+            data.get('accountDisplayId'),
+            data.get('iban'),
+            _intern(data.get('currency')),
+            _intern(account_type.get('key')),
+            _intern(account_type.get('text')),
+            data.get('clientId'),
+            _amount(data, 'creditLimit')[0],
+        )
+
+
+@dataclass(slots=True)
+class Balance:
+    """Balance of one account; amounts are Decimals in `currency`"""
+
+    account_id: str
+    balance: Decimal | None = None
+    currency: str | None = None
+    balance_eur: Decimal | None = None
+    available_cash: Decimal | None = None
+    available_cash_eur: Decimal | None = None
+    account: Account | None = None
+
+    @classmethod
+    def from_comdirect(cls, data):
+        balance, currency = _amount(data, 'balance')
+        account = data.get('account')
+        return cls(
+            data.get('accountId'),
+            balance,
+            currency,
+            _amount(data, 'balanceEUR')[0],
+            _amount(data, 'availableCashAmount')[0],
+            _amount(data, 'availableCashAmountEUR')[0],
+            Account.from_comdirect(account) if account else None,
+        )
+
+
+COMDIRECT_TRANSACTION_KEYS = frozenset((
+    'reference', 'bookingStatus', 'bookingDate', 'valutaDate', 'amount',
+    'transactionType', 'remitter', 'creditor', 'deptor', 'remittanceInfo',
+    'endToEndReference', 'directDebitCreditorId', 'directDebitMandateId',
+    'newTransaction',
+))
+
+
+@dataclass(slots=True)
+class Transaction:
+    """One booking with Decimal amount and parsed dates
+
+    Slotted and flat (counterparties are inlined), with status, type and
+    currency strings interned, so long histories stay compact. Fields the
+    adapter does not map are kept in `extra`.
+    """
+
+    reference: str
+    account_id: str | None = None
+    booking_status: str | None = None
+    booking_date: date | None = None
+    valuta_date: date | None = None
+    amount: Decimal | None = None
+    currency: str | None = None
+    transaction_type: str | None = None
+    transaction_type_text: str | None = None
+    remitter_name: str | None = None
+    remitter_iban: str | None = None
+    remitter_bic: str | None = None
+    creditor_name: str | None = None
+    creditor_iban: str | None = None
+    creditor_bic: str | None = None
+    deptor_name: str | None = None
+    deptor_iban: str | None = None
+    deptor_bic: str | None = None
+    remittance_info: str | None = None
+    end_to_end_reference: str | None = None
+    direct_debit_creditor_id: str | None = None
+    direct_debit_mandate_id: str | None = None
+    new_transaction: bool | None = None
+    extra: dict | None = None
+
+    @classmethod
+    def from_comdirect(cls, data, account_id=None):
+        amount, currency = _amount(data, 'amount')
+        transaction_type = data.get('transactionType') or {}
+        return cls(
+            data.get('reference'),
+            _intern(account_id),
+            _intern(data.get('bookingStatus')),
+            _date(data.get('bookingDate')),
+            _date(data.get('valutaDate')),
+            amount,
+            currency,
+            _intern(transaction_type.get('key')),
+            _intern(transaction_type.get('text')),
+            *_party(data, 'remitter'),
+            *_party(data, 'creditor'),
+            *_party(data, 'deptor'),
+            data.get('remittanceInfo'),
+            data.get('endToEndReference'),
+            data.get('directDebitCreditorId'),
+            data.get('directDebitMandateId'),
+            data.get('newTransaction'),
+            _extra(data, COMDIRECT_TRANSACTION_KEYS),
+        )
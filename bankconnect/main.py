@@ -1,15 +1,29 @@
 #!/usr/bin/env python3
 from classes.comdirect_api import ComdirectAPI
 from classes.deutschebank_api import DeutscheBankAPI
-from utils.output import print_to_stdout, save_to_csv, save_to_pdf, display_data
+from utils.poller import PollCancelled
+from utils.output import print_to_stdout, save_to_csv, save_to_pdf, display_data, save_to_parquet, save_to_arrow
+from utils.statement import booking_order, opening_balance
+from utils.store import TransactionStore
+from utils.scheduler import DEFAULT_INTERVAL, DEFAULT_JITTER, DEFAULT_KEEP_ALIVE_INTERVAL, LockBusy, RunLock, Scheduler
+from utils.sync import sync_accounts
 from rich.console import Console
 from rich.panel import Panel
 from rich.prompt import Prompt, IntPrompt
 from rich.table import Table
-import json
+import argparse
+import asyncio
+import os
+import signal
+import sys
 
 console = Console()
 
+BANKS = {
+    'comdirect': (ComdirectAPI, 'COMDIRECT'),
+    'deutschebank': (DeutscheBankAPI, 'DEUTSCHEBANK'),
+}
+
 
 def display_menu(title, options):
     """Display a menu with rich formatting"""
@@ -21,48 +35,42 @@ def display_menu(title, options):
 
 
 def choose_account(accounts):
-    """Choose an account from the list of accounts"""
-    if isinstance(accounts, dict) and 'values' in accounts:
-        try:
-            accounts_list = json.loads(accounts['values']) if isinstance(
-                accounts['values'], str) else accounts['values']
-
-            console.print("\n[bold]Available accounts:[/bold]")
-            table = Table(show_header=True)
-            table.add_column("Number", style="green")
-            table.add_column("Account Type", style="blue")
-            table.add_column("IBAN", style="yellow")
-
-            for i, account in enumerate(accounts_list, 1):
-                table.add_row(
-                    str(i),
-                    account['accountType']['text'],
-                    account['iban']
-                )
-
-            console.print(table)
+    """Choose an account from a list of Account models"""
+    if not accounts:
+        return None
 
-            while True:
-                choice = IntPrompt.ask(
-                    "\nEnter the number of the account", show_choices=False)
-                index = choice - 1
-                if 0 <= index < len(accounts_list):
-                    return accounts_list[index]['accountId']
-                console.print("[red]Invalid choice. Please try again.[/red]")
-        except Exception as e:
-            console.print(f"[red]Error processing accounts: {e}[/red]")
-            return None
-    return None
-
-
-def choose_output_format(data, bank_type):
-    """Choose an output format for the data"""
+    console.print("\n[bold]Available accounts:[/bold]")
+    table = Table(show_header=True)
+    table.add_column("Number", style="green")
+    table.add_column("Account Type", style="blue")
+    table.add_column("IBAN", style="yellow")
+
+    for i, account in enumerate(accounts, 1):
+        table.add_row(str(i), account.account_type_text, account.iban)
+
+    console.print(table)
+
+    while True:
+        choice = IntPrompt.ask(
+            "\nEnter the number of the account", show_choices=False)
+        index = choice - 1
+        if 0 <= index < len(accounts):
+            return accounts[index].account_id
+        console.print("[red]Invalid choice. Please try again.[/red]")
+
+
+def choose_output_format(data, bank_type, opening_balance=None):
+    """Choose an output format for the data
+
+    opening_balance starts the running balance of a PDF statement.
+    """
     output_options = ["Print to stdout", "Save as CSV",
-                      "Save as PDF", "Display as Table"]
+                      "Save as PDF", "Display as Table",
+                      "Save as Parquet", "Save as Arrow IPC"]
     display_menu("Choose an output format", output_options)
 
     output_choice = Prompt.ask(
-        "Enter your choice", choices=["1", "2", "3", "4"])
+        "Enter your choice", choices=["1", "2", "3", "4", "5", "6"])
 
     if output_choice == '1':
         print_to_stdout(data)
@@ -75,9 +83,190 @@ def choose_output_format(data, bank_type):
         filename = Prompt.ask("Enter PDF file name")
         if not filename.endswith('.pdf'):
             filename += '.pdf'
-        save_to_pdf(data, filename)
+        save_to_pdf(data, filename, bank_type, opening_balance=opening_balance)
     elif output_choice == '4':
         display_data(data, bank_type)
+    elif output_choice == '5':
+        filename = Prompt.ask("Enter Parquet file name")
+        if not filename.endswith('.parquet'):
+            filename += '.parquet'
+        save_to_parquet(data, filename, bank_type)
+    elif output_choice == '6':
+        filename = Prompt.ask("Enter Arrow file name")
+        if not filename.endswith('.arrow'):
+            filename += '.arrow'
+        save_to_arrow(data, filename, bank_type)
+
+
+EXPORTERS = {
+    'csv': save_to_csv,
+    'parquet': save_to_parquet,
+    'arrow': save_to_arrow,
+    'pdf': save_to_pdf,
+}
+
+
+def stored_transactions(bank, store, account_id):
+    return (bank.transaction_model(transaction, account_id)
+            for transaction in store.iter_transactions(account_id))
+
+
+def export_synced(bank, store, bank_type, results, export_format):
+    """Export the stored history of every account that changed in a sync
+
+    PDF statements start from the balance before the first stored
+    booking, derived from the account's current balance.
+    """
+    balances = None
+    for account_id, counts in results.items():
+        filename = f"{bank_type.lower()}_{account_id}.{export_format}"
+        if counts['inserted'] or counts['updated'] or counts['removed'] or \
+                not os.path.exists(os.path.join('downloads', filename)):
+            transactions = stored_transactions(bank, store, account_id)
+            if export_format == 'pdf':
+                if balances is None:
+                    balances = {balance.account_id: balance
+                                for balance in bank.get_balance_models()}
+                opening = opening_balance(balances.get(account_id),
+                                          stored_transactions(bank, store, account_id))
+                save_to_pdf(transactions, filename, bank_type, opening_balance=opening)
+            else:
+                EXPORTERS[export_format](transactions, filename, bank_type)
+
+
+def sync_bank(bank, bank_type, export_format=None):
+    """Incrementally sync all accounts into the local transaction store"""
+    store = TransactionStore()
+    try:
+        results = sync_accounts(bank, store, bank_type)
+        if export_format:
+            export_synced(bank, store, bank_type, results, export_format)
+        return results
+    finally:
+        store.close()
+
+
+def print_sync_results(results):
+    table = Table(show_header=True)
+    table.add_column("Account", style="green")
+    table.add_column("Inserted", style="blue")
+    table.add_column("Updated", style="yellow")
+    table.add_column("Skipped")
+    table.add_column("Removed")
+    for account_id, counts in results.items():
+        table.add_row(account_id, str(counts['inserted']), str(counts['updated']),
+                      str(counts['skipped']), str(counts['removed']))
+    console.print(table)
+
+
+def run_sync(bank, bank_type, export_format=None):
+    print_sync_results(sync_bank(bank, bank_type, export_format))
+
+
+def create_banks(bank_names):
+    """Instantiate the named banks once, loading their credentials"""
+    banks = {}
+    for name in bank_names or ['comdirect']:
+        if name not in BANKS:
+            console.print(f"[red]Unknown bank: {name}[/red]")
+            continue
+        bank_class, bank_type = BANKS[name]
+        banks[name] = (bank_class(), bank_type)
+    return banks
+
+
+def authenticate(bank, status=None):
+    """Authenticate, showing the TAN wait in status; Ctrl-C cancels the wait
+
+    Returns False when the user cancelled.
+    """
+    if status is None:
+        with console.status("[bold green]Authenticating...") as status:
+            return authenticate(bank, status)
+    try:
+        # asyncio.run turns Ctrl-C into cancelling the task, which stops the poll
+        asyncio.run(bank.authenticate_async(
+            on_progress=lambda elapsed, attempt: status.update(
+                f"[bold green]Waiting for TAN confirmation... ({int(elapsed)}s)")))
+    except (KeyboardInterrupt, PollCancelled):
+        status.stop()
+        console.print("\n[yellow]Authentication cancelled.[/yellow]")
+        return False
+    return True
+
+
+def sync_main(bank_names, export_format=None):
+    """Non-menu entry point: bankconnect/main.py sync [--banks ...] [--format ...]"""
+    try:
+        with RunLock():
+            for name, (bank, bank_type) in create_banks(bank_names).items():
+                if not authenticate(bank):
+                    continue
+                with console.status(f"[bold green]Syncing {name}..."):
+                    run_sync(bank, bank_type, export_format)
+    except LockBusy as e:
+        console.print(f"[yellow]{e}, skipping this run[/yellow]")
+        return 1
+    return 0
+
+
+def daemon_main(bank_names, export_format=None, interval=DEFAULT_INTERVAL,
+                jitter=DEFAULT_JITTER, keep_alive_interval=DEFAULT_KEEP_ALIVE_INTERVAL):
+    """Long-running scheduler: periodic incremental syncs with warm sessions
+
+    Banks are created and authenticated once at startup, so the 2FA
+    confirmation is only needed again when a session cannot be renewed.
+    """
+    banks = create_banks(bank_names)
+    for name, (bank, _) in banks.items():
+        token_cache = getattr(bank, 'token_cache', None)
+        if token_cache is not None and not token_cache.enabled:
+            console.print(f"[bold red]Warning: {name} tokens are not cached on disk "
+                          f"(is 'cryptography' installed?). Sessions are kept warm in "
+                          f"memory, but restarting the daemon needs a new 2FA "
+                          f"confirmation.[/bold red]")
+        if not authenticate(bank):
+            return 1
+
+    def sync_all():
+        for name, (bank, bank_type) in banks.items():
+            bank.authenticate()
+            results = sync_bank(bank, bank_type, export_format)
+            inserted = sum(counts['inserted'] for counts in results.values())
+            updated = sum(counts['updated'] for counts in results.values())
+            console.log(f"{name}: {inserted} new, {updated} updated transactions "
+                        f"in {len(results)} accounts")
+
+    def keep_alive():
+        for bank, _ in banks.values():
+            bank.keep_alive(keep_alive_interval)
+
+    scheduler = Scheduler(
+        sync_all, interval, jitter, keep_alive, keep_alive_interval,
+        on_error=lambda e: console.log(f"[red]{type(e).__name__}: {e}[/red]"))
+    signal.signal(signal.SIGTERM, lambda *args: scheduler.stop())
+    console.log(f"Syncing {', '.join(banks)} every {interval}s (+/- {jitter}s)")
+    scheduler.run()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Bank connection tool")
+    commands = parser.add_subparsers(dest='command')
+    for command in ('sync', 'daemon'):
+        subparser = commands.add_parser(command)
+        subparser.add_argument('bank', nargs='*', help='Banks to sync')
+        subparser.add_argument('--banks', type=lambda value: value.split(','), default=[],
+                               help='Comma separated banks to sync')
+        subparser.add_argument('--format', choices=list(EXPORTERS),
+                               help='Also export changed accounts to downloads/')
+    daemon = commands.choices['daemon']
+    daemon.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help='Seconds between syncs')
+    daemon.add_argument('--jitter', type=float, default=DEFAULT_JITTER,
+                        help='Random +/- seconds added to every interval')
+    daemon.add_argument('--keep-alive', type=float, default=DEFAULT_KEEP_ALIVE_INTERVAL,
+                        help='Seconds between session renewals')
+    return parser.parse_args(argv)
 
 
 def main():
@@ -106,29 +295,31 @@ def main():
                     "Get Transactions",
                     "Get All Balances",
                     "Get Account Balance",
+                    "Sync Transactions",
                     "Back to Bank Selection"
                 ]
                 display_menu("Choose an action", action_options)
 
                 action_choice = Prompt.ask("Enter your choice", choices=[
-                    "1", "2", "3", "4", "5"])
+                    "1", "2", "3", "4", "5", "6"])
 
-                if action_choice in ['1', '2', '3', '4']:
+                if action_choice in ['1', '2', '3', '4', '5']:
                     with console.status("[bold green]Authenticating...") as status:
-                        bank.authenticate()
+                        if not authenticate(bank, status):
+                            continue
                         status.update(
                             "[bold green]Waiting for TAN confirmation...")
                         status.stop()
 
                         if action_choice == '1':
-                            accounts = bank.get_accounts()
+                            accounts = bank.get_account_models()
                             status.update(
                                 "[bold green]Accounts retrieved successfully!")
                             status.stop()
                             choose_output_format(accounts, bank_type)
 
                         elif action_choice == '2':
-                            accounts = bank.get_accounts()
+                            accounts = bank.get_account_models()
                             status.update(
                                 "[bold green]Accounts retrieved successfully!")
                             status.stop()
@@ -144,19 +335,22 @@ def main():
                                     "[bold green]Retrieving transactions...")
                                 status.stop()
 
-                                transactions = bank.get_transactions(
-                                    account_id, from_date)
+                                # The bank returns the newest bookings first
+                                transactions = sorted(bank.iter_transaction_models(
+                                    account_id, from_date), key=booking_order)
+                                balance = bank.get_account_balance_model(account_id)
                                 status.update(
                                     "[bold green]Transactions retrieved successfully!")
                                 status.stop()
 
-                                choose_output_format(transactions, bank_type)
+                                choose_output_format(transactions, bank_type,
+                                                     opening_balance(balance, transactions))
                             else:
                                 console.print(
                                     "[red]No valid account selected.[/red]")
 
                         elif action_choice == '3':
-                            balances = bank.get_all_balances()
+                            balances = bank.get_balance_models()
                             status.update(
                                 "[bold green]Balances retrieved successfully!")
                             status.stop()
@@ -164,7 +358,7 @@ def main():
                             choose_output_format(balances, bank_type)
 
                         elif action_choice == '4':
-                            accounts = bank.get_accounts()
+                            accounts = bank.get_account_models()
                             status.update(
                                 "[bold green]Accounts retrieved successfully!")
                             status.stop()
@@ -173,7 +367,7 @@ def main():
                             if account_id:
                                 status.update(
                                     "[bold green]Retrieving balance...")
-                                balance = bank.get_account_balance(account_id)
+                                balance = bank.get_account_balance_model(account_id)
                                 status.update(
                                     "[bold green]Balance retrieved successfully!")
                                 status.stop()
@@ -183,7 +377,13 @@ def main():
                                 console.print(
                                     "[red]No valid account selected.[/red]")
 
-                elif action_choice == '5':
+                        elif action_choice == '5':
+                            status.update(
+                                "[bold green]Syncing transactions...")
+                            run_sync(bank, bank_type)
+                            status.stop()
+
+                elif action_choice == '6':
                     break
 
     except KeyboardInterrupt:
@@ -193,7 +393,14 @@ def main():
 
 if __name__ == '__main__':
     try:
-        main()
+        args = parse_args(sys.argv[1:])
+        if args.command == 'sync':
+            sys.exit(sync_main(args.bank + args.banks, args.format))
+        elif args.command == 'daemon':
+            sys.exit(daemon_main(args.bank + args.banks, args.format, args.interval,
+                                 args.jitter, args.keep_alive))
+        else:
+            main()
     except KeyboardInterrupt:
         console.print("\n[yellow]Program terminated by user.[/yellow]")
         exit(0)
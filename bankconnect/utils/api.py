@@ -1,6 +1,23 @@
 #!/usr/bin/env python3
 import json
+from contextlib import contextmanager
+import threading
+import time
 import requests
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from utils.cassette import REPLAY
+from utils.http_cache import CacheEntry, ResponseCache, cache_key
+from utils.json_stream import DEFAULT_CHUNK_SIZE, iter_json_array
+from utils.metrics import endpoint_label
+from utils.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, TokenBucket
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_RATE_LIMIT = 10
 
 
 def create_request_headers(access_token, session_id, request_id):
@@ -20,15 +37,261 @@ def create_request_headers(access_token, session_id, request_id):
     }
 
 
-def make_request(method, url, headers, params=None, data=None, json_data=None, return_full_response=False):
+def parse_retry_after(value):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ApiClient:
+    """Rate-limited, retrying HTTP client with a pooled session for one bank"""
+
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, verify=True,
+                 retry_policy=None, rate_limit=DEFAULT_RATE_LIMIT,
+                 circuit_breaker=None, cassette=None, cache=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.verify = verify
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limit = rate_limit
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.cassette = cassette
+        self.cache = cache or ResponseCache()
+        self.cache_namespace = ''
+        self.rate_limiters = {}
+        self.stats = Counter()
+        self.hooks = []
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
+        })
+
+    def count(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+    @property
+    def replaying(self):
+        return self.cassette is not None and self.cassette.mode == REPLAY
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def emit(self, event):
+        for hook in self.hooks:
+            hook(event)
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block, e.g. waiting for TAN approval, and report it to the hooks"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.hooks:
+                self.emit({'type': 'phase', 'name': name,
+                           'seconds': time.perf_counter() - start})
+
+    def _record(self, method, url, start, retries, response=None, error=None, stream=False):
+        """Report a finished request to the hooks
+
+        Streamed bodies are not read yet, so their size follows in a
+        'body' event once iter_json has consumed them.
+        """
+        if not self.hooks:
+            return
+        event = {'type': 'request', 'method': method, 'endpoint': endpoint_label(url),
+                 'seconds': time.perf_counter() - start, 'retries': retries}
+        if response is not None:
+            event['status'] = response.status_code
+            if not stream:
+                event['bytes'] = len(response.content)
+        if error is not None:
+            event['error'] = type(error).__name__
+        self.emit(event)
+
+    def _rate_limiter(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self.rate_limiters:
+                self.rate_limiters[host] = TokenBucket(self.rate_limit)
+            return self.rate_limiters[host]
+
+    def _send_once(self, method, url, headers, params, data, json_data, stream=False):
+        if self.rate_limit:
+            waited = self._rate_limiter(url).acquire()
+            if waited:
+                self.count('rate_limited')
+                self.count('rate_limited_seconds', waited)
+        self.count('requests')
+        return self.session.request(
+            method,
+            url,
+            headers=headers,
+            params=params,
+            data=data,
+            json=json_data,
+            timeout=self.timeout,
+            verify=self.verify,
+            stream=stream
+        )
+
+    def send(self, method, url, headers=None, params=None, data=None, json_data=None, stream=False):
+        """Send a request over the pooled session and return the raw response
+
+        Retryable failures are retried here; the last response is returned
+        as-is, so callers still decide how to treat its status code. With
+        stream the body is left unread for iter_content().
+        """
+        start = time.perf_counter()
+        if self.replaying:
+            self.count('replayed')
+            response = self.cassette.replay(method, url, params, data)
+            self._record(method, url, start, 0, response=response, stream=stream)
+            return response
+
+        if not self.circuit_breaker.allow():
+            self.count('circuit_open')
+            error = CircuitOpenError(f"Circuit open, not calling {url}")
+            self._record(method, url, start, 0, error=error)
+            raise error
+
+        attempt = 0
+        # A call that ends without success or failure (e.g. Ctrl-C) must not
+        # keep the breaker's half-open trial slot forever
+        settled = False
+        try:
+            while True:
+                try:
+                    response = self._send_once(
+                        method, url, headers, params, data, json_data, stream)
+                except requests.RequestException as e:
+                    if not self.retry_policy.should_retry(method, attempt, error=e):
+                        self.count('failures')
+                        self.circuit_breaker.record_failure()
+                        settled = True
+                        self._record(method, url, start, attempt, error=e)
+                        raise
+                    delay = self.retry_policy.backoff(attempt)
+                else:
+                    status = response.status_code
+                    if not self.retry_policy.should_retry(method, attempt, status=status):
+                        if status >= 500:
+                            self.count('failures')
+                            self.circuit_breaker.record_failure()
+                        else:
+                            self.circuit_breaker.record_success()
+                        settled = True
+                        if self.cassette:
+                            self.cassette.record(method, url, params, data, response)
+                        self._record(method, url, start, attempt, response=response, stream=stream)
+                        return response
+                    delay = self.retry_policy.backoff(
+                        attempt, parse_retry_after(response.headers.get('Retry-After')))
+                    response.close()
+
+                attempt += 1
+                self.count('retries')
+                time.sleep(delay)
+        finally:
+            if not settled:
+                self.circuit_breaker.release()
+
+    def request(self, method, url, headers=None, params=None, data=None, json_data=None, return_full_response=False,
+                cache_ttl=None, force_refresh=False):
+        """Make HTTP request and handle common response processing
+
+        GET requests with a cache_ttl are answered from self.cache while
+        fresh and revalidated with If-None-Match/If-Modified-Since once
+        stale; force_refresh skips the freshness check.
+        """
+        if cache_ttl and method == 'GET' and not return_full_response:
+            return self._cached_request(url, headers, params, cache_ttl, force_refresh)
+        response = self.send(method, url, headers, params, data, json_data)
+        response.raise_for_status()
+        return response if return_full_response else (response.json() if response.content else None)
+
+    def iter_json(self, method, url, headers=None, params=None, key='values', meta=None,
+                  chunk_size=DEFAULT_CHUNK_SIZE):
+        """Stream a response and yield the items of its top-level `key` array
+
+        Items are decoded while the body is still downloading; the other
+        top-level fields end up in meta (see utils.json_stream).
+        """
+        response = self.send(method, url, headers, params, stream=True)
+        size = 0
+
+        def chunks():
+            nonlocal size
+            for chunk in response.iter_content(chunk_size):
+                size += len(chunk)
+                yield chunk
+
+        try:
+            response.raise_for_status()
+            yield from iter_json_array(chunks(), key, meta)
+        finally:
+            response.close()
+            if self.hooks:
+                self.emit({'type': 'body', 'method': method,
+                           'endpoint': endpoint_label(url), 'bytes': size})
+
+    def _cached_request(self, url, headers, params, cache_ttl, force_refresh):
+        key = cache_key(url, params, self.cache_namespace)
+        entry = self.cache.get(key)
+        if entry is not None and entry.fresh and not force_refresh:
+            self.count('cache_hits')
+            return json.loads(entry.body) if entry.body else None
+
+        self.count('cache_misses')
+        if entry is not None:
+            headers = {**(headers or {}), **entry.validators()}
+        response = self.send('GET', url, headers, params)
+        if response.status_code == 304 and entry is not None:
+            self.count('cache_revalidated')
+            entry = self.cache.touch(key, cache_ttl)
+            return json.loads(entry.body) if entry.body else None
+
+        response.raise_for_status()
+        self.cache.put(key, CacheEntry(
+            response.text,
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified'),
+            ttl=cache_ttl))
+        return response.json() if response.content else None
+
+    def close(self):
+        self.session.close()
+
+
+_default_client = None
+
+
+def get_default_client():
+    """Return the shared client used by module-level make_request calls"""
+    global _default_client
+    if _default_client is None:
+        _default_client = ApiClient()
+    return _default_client
+
+
+def make_request(method, url, headers, params=None, data=None, json_data=None, return_full_response=False, client=None):
     """Make HTTP request and handle common response processing"""
-    response = requests.request(
-        method,
-        url,
-        headers=headers,
-        params=params,
-        data=data,
-        json=json_data
-    )
-    response.raise_for_status()
-    return response if return_full_response else (response.json() if response.content else None)
+    client = client or get_default_client()
+    return client.request(method, url, headers, params=params, data=data,
+                          json_data=json_data, return_full_response=return_full_response)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import defaultdict, deque
+from urllib.parse import urlencode, urlsplit
+import requests
+from requests.structures import CaseInsensitiveDict
+
+RECORD = 'record'
+REPLAY = 'replay'
+CASSETTE_VERSION = 1
+
+# Response fields whose values are secrets; they are replaced everywhere
+# they show up later, including in request URLs
+SECRET_FIELDS = ('access_token', 'refresh_token', 'token', 'kdnr', 'kontaktId', 'identifier')
+MIN_SECRET_LENGTH = 6
+DROPPED_HEADERS = {'set-cookie', 'date', 'content-length', 'content-encoding',
+                   'transfer-encoding', 'connection', 'keep-alive'}
+
+iban_regex = re.compile(r'\b([A-Z]{2})(\d{2})([A-Z0-9]{11,30})\b')
+
+
+class CassetteMiss(requests.RequestException):
+    """Raised in replay mode for a request that was never recorded"""
+
+
+def fake_iban(match):
+    """Replace an IBAN by a stable fake of the same country and length"""
+    digest = hashlib.sha256(match.group(0).encode()).hexdigest()
+    digits = str(int(digest, 16))[:len(match.group(2) + match.group(3))]
+    return f'{match.group(1)}{digits}'
+
+
+class Sanitizer:
+    """Redact tokens, ids learned from responses and IBANs consistently"""
+
+    def __init__(self):
+        self.replacements = {}
+
+    def learn(self, value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                if key in SECRET_FIELDS and isinstance(item, (str, int)) and \
+                        len(str(item)) >= MIN_SECRET_LENGTH:
+                    self.replacements.setdefault(
+                        str(item), f'REDACTED-{key}-{len(self.replacements) + 1}')
+                else:
+                    self.learn(item)
+        elif isinstance(value, list):
+            for item in value:
+                self.learn(item)
+
+    def __call__(self, text):
+        for secret in sorted(self.replacements, key=len, reverse=True):
+            if secret in text:
+                text = text.replace(secret, self.replacements[secret])
+        return iban_regex.sub(fake_iban, text)
+
+
+def request_key(method, url, params=None, data=None):
+    """Host-independent identity of a request; form bodies only by grant_type"""
+    parts = urlsplit(url)
+    key = f'{method} {parts.path}'
+    query = sorted((str(k), str(v)) for k, v in (params or {}).items())
+    if parts.query:
+        query = sorted(query + [tuple(item.split('=', 1)) for item in parts.query.split('&')])
+    if query:
+        key += '?' + urlencode(query)
+    if isinstance(data, dict) and 'grant_type' in data:
+        key += f" grant_type={data['grant_type']}"
+    return key
+
+
+class Cassette:
+    """Sanitized request/response pairs stored as gzip-compressed JSON
+
+    In record mode ApiClient passes every final response to record(); in
+    replay mode it asks replay() instead of touching the network. Repeated
+    identical requests (e.g. TAN status polls) are answered in recorded
+    order, the last answer repeating once the recording runs out.
+    """
+
+    def __init__(self, path, mode=REPLAY):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.interactions = []
+        self.sanitizer = Sanitizer()
+        self._index = defaultdict(deque)
+        self._last = {}
+        self._lock = threading.Lock()
+        if mode == REPLAY:
+            self.load()
+
+    def load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            cassette = json.load(f)
+        if cassette.get('version') != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version in {self.path}")
+        self.interactions = cassette['interactions']
+        for interaction in self.interactions:
+            self._index[interaction['key']].append(interaction)
+
+    def record(self, method, url, params, data, response):
+        body = response.text
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        headers = {key: value for key, value in response.headers.items()
+                   if key.lower() not in DROPPED_HEADERS}
+        with self._lock:
+            # Learned secrets are shared by all threads recording responses
+            self.sanitizer.learn(payload)
+            sanitize = self.sanitizer
+            self.interactions.append({
+                'key': sanitize(request_key(method, url, params, data)),
+                'status': response.status_code,
+                'reason': response.reason,
+                'headers': {key: sanitize(value) for key, value in headers.items()},
+                'body': sanitize(body),
+            })
+
+    def replay(self, method, url, params=None, data=None):
+        key = request_key(method, url, params, data)
+        with self._lock:
+            queue = self._index.get(key)
+            if queue:
+                interaction = self._last[key] = queue.popleft()
+            elif key in self._last:
+                interaction = self._last[key]
+            else:
+                raise CassetteMiss(f"No recorded response for {key} in {self.path}")
+
+        response = requests.Response()
+        response.status_code = interaction['status']
+        response.reason = interaction['reason']
+        response.headers = CaseInsensitiveDict(interaction['headers'])
+        response._content = interaction['body'].encode('utf-8')
+        response._content_consumed = True
+        response.encoding = 'utf-8'
+        response.url = url
+        return response
+
+    def save(self):
+        """Write the recording atomically; a no-op in replay mode"""
+        if self.mode != RECORD:
+            return
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            cassette = {'version': CASSETTE_VERSION, 'interactions': self.interactions}
+        with tempfile.NamedTemporaryFile('wb', dir=directory, delete=False) as f:
+            with gzip.open(f, 'wt', encoding='utf-8') as compressed:
+                json.dump(cassette, compressed)
+        os.replace(f.name, self.path)
@@ -2,6 +2,7 @@
 from dotenv import load_dotenv
 import os
 import getpass
+import sys
 
 
 def get_credential(credential_type, bank_name, use_getpass=False):
@@ -10,6 +11,8 @@ def get_credential(credential_type, bank_name, use_getpass=False):
     value = os.getenv(env_key)
 
     if not value:
+        if not sys.stdin.isatty():
+            raise RuntimeError(f"{env_key} is not set and there is no terminal to ask for it")
         prompt = f"Enter your {bank_name} {credential_type}: "
         if use_getpass:
             value = getpass.getpass(prompt)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+from dataclasses import fields, is_dataclass
+from operator import attrgetter
+
+
+def is_amount(value):
+    return isinstance(value, dict) and 'value' in value and 'unit' in value
+
+
+def format_amount(value):
+    return f"{value['value']} {value['unit']}"
+
+
+def iter_paths(item, max_depth=None, combine_amounts=True, prefix=()):
+    """Yield the key path of every leaf in a nested record"""
+    for key, value in item.items():
+        path = prefix + (key,)
+        if isinstance(value, dict) and not (combine_amounts and is_amount(value)) \
+                and (max_depth is None or len(path) <= max_depth):
+            yield from iter_paths(value, max_depth, combine_amounts, path)
+        else:
+            yield path
+
+
+class FlattenPlan:
+    """Column accessors compiled once from a record schema
+
+    Each column is a tuple of keys into the nested record, so keys that
+    contain underscores resolve correctly. With combine_amounts, objects
+    shaped like {'value', 'unit'} become one preformatted column.
+    """
+
+    def __init__(self, paths, max_depth=None, combine_amounts=True):
+        self.paths = sorted(set(paths), key=lambda path: '_'.join(path))
+        self.known = frozenset(self.paths)
+        self.max_depth = max_depth
+        self.combine_amounts = combine_amounts
+        self.fieldnames = ['_'.join(path) for path in self.paths]
+        self.children = {}
+        for path in self.paths:
+            for depth in range(len(path)):
+                self.children.setdefault(path[:depth], set()).add(path[depth])
+
+    @classmethod
+    def from_sample(cls, sample, max_depth=None, combine_amounts=True, extra_paths=()):
+        paths = set(extra_paths)
+        for item in sample:
+            paths.update(iter_paths(item, max_depth, combine_amounts))
+        return cls(paths, max_depth, combine_amounts)
+
+    def _get(self, item, path):
+        value = item
+        for key in path:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key)
+        if self.combine_amounts and is_amount(value):
+            return format_amount(value)
+        return value
+
+    def row(self, item):
+        """Return the column values of a record in fieldnames order"""
+        return [self._get(item, path) for path in self.paths]
+
+    def row_dict(self, item):
+        return dict(zip(self.fieldnames, self.row(item)))
+
+    def _covered(self, item, prefix=()):
+        children = self.children.get(prefix)
+        if children is None or not children.issuperset(item.keys()):
+            return False
+        for key, value in item.items():
+            path = prefix + (key,)
+            if path not in self.known and not (
+                    isinstance(value, dict) and self._covered(value, path)):
+                return False
+        return True
+
+    def extras(self, item):
+        """Return flattened fields of a record that are not in the plan"""
+        if self._covered(item):
+            return {}
+        return {
+            '_'.join(path): self._get(item, path)
+            for path in iter_paths(item, self.max_depth, self.combine_amounts)
+            if path not in self.known
+        }
+
+
+def _is_model_type(annotation):
+    """True for a model annotation such as `Account | None`"""
+    return any(is_dataclass(arg) for arg in getattr(annotation, '__args__', (annotation,)))
+
+
+class ModelPlan:
+    """Column accessors for slotted model records (see classes.models)
+
+    Offers the FlattenPlan interface: one column per scalar field, nested
+    models are left out and `extra` becomes the extras of a record.
+    """
+
+    def __init__(self, model):
+        self.fieldnames = [field.name for field in fields(model)
+                           if field.name != 'extra' and not _is_model_type(field.type)]
+        self._getter = attrgetter(*self.fieldnames)
+
+    def row(self, item):
+        return list(self._getter(item))
+
+    def row_dict(self, item):
+        return dict(zip(self.fieldnames, self.row(item)))
+
+    def extras(self, item):
+        return getattr(item, 'extra', None) or {}
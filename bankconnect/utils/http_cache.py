@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from utils.token_cache import EncryptedFile
+
+DEFAULT_MAX_ENTRIES = 256
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(url, params=None, namespace=''):
+    """Key a GET by URL, params and (hashed) user namespace"""
+    query = json.dumps(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+    return hashlib.sha256(f'{namespace}\0{url}\0{query}'.encode()).hexdigest()
+
+
+class CacheEntry:
+    __slots__ = ('body', 'etag', 'last_modified', 'stored_at', 'ttl')
+
+    def __init__(self, body, etag=None, last_modified=None, stored_at=None, ttl=0):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = time.time() if stored_at is None else stored_at
+        self.ttl = ttl
+
+    @property
+    def fresh(self):
+        return time.time() - self.stored_at < self.ttl
+
+    def validators(self):
+        """Conditional request headers for revalidating this entry"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """LRU cache of GET response bodies with TTL and ETag/Last-Modified
+
+    Entries are fresh for the TTL given when they were stored; stale
+    entries are kept for conditional revalidation. With a path the cache
+    is persisted after every change, encrypted with a key derived from
+    secret like the token cache (utils.token_cache.EncryptedFile), as
+    the bodies hold IBANs and balances. Without a secret or the
+    'cryptography' package it stays in memory.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, path=None, secret=None):
+        self.max_entries = max_entries
+        self.file = None
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            self.file = EncryptedFile(path, secret)
+            if self.file.enabled:
+                self.load()
+            else:
+                logger.warning("Not persisting the HTTP cache to %s, it can only be "
+                               "stored encrypted", path)
+                self.file = None
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        self.save()
+
+    def touch(self, key, ttl):
+        """Mark a revalidated (304) entry fresh again"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            entry.stored_at = time.time()
+            entry.ttl = ttl
+        self.save()
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+        self.save()
+
+    def load(self):
+        content = self.file.read()
+        if content is None:
+            return
+        try:
+            stored = json.loads(content)
+        except ValueError:
+            return
+        for key, values in stored.items():
+            self.entries[key] = CacheEntry(**values)
+
+    def save(self):
+        if self.file is None:
+            return
+        with self._lock:
+            stored = {key: {name: getattr(entry, name) for name in CacheEntry.__slots__}
+                      for key, entry in self.entries.items()}
+            self.file.write(json.dumps(stored).encode())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import codecs
+import json
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+# Characters that can follow a complete value inside an object or array
+DELIMITERS = WHITESPACE + ',]}'
+
+_decoder = json.JSONDecoder()
+
+
+class _Buffer:
+    """Decoded text of a byte stream with a read position"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read one more chunk; returns False at the end of the stream"""
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            self.text += self.decoder.decode(b'', final=True)
+        else:
+            self.text = self.text[self.pos:] + self.decoder.decode(chunk)
+            self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character, or '' at the end"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos} of JSON stream")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value, reading more input as needed"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+                # A number cut by the end of a chunk may continue in the next
+                # one, e.g. "98." + "76", so it is only complete at a delimiter
+                if self.eof or end < len(self.text) and (
+                        not isinstance(value, (int, float)) or self.text[end] in DELIMITERS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def _iter_array(chunks, key, meta):
+    """Walk the top-level object, decoding `key` array items one at a time"""
+    buffer = _Buffer(chunks)
+    buffer.expect('{')
+    while buffer.peek() != '}':
+        name = buffer.value()
+        buffer.expect(':')
+        if name == key and buffer.peek() == '[':
+            buffer.expect('[')
+            while buffer.peek() != ']':
+                yield buffer.value()
+                if buffer.peek() == ',':
+                    buffer.expect(',')
+            buffer.expect(']')
+        else:
+            meta[name] = buffer.value()
+        if buffer.peek() == ',':
+            buffer.expect(',')
+
+
+def iter_json_array(chunks, key='values', meta=None):
+    """Yield the items of the top-level `key` array of a streamed JSON object
+
+    chunks is an iterator of bytes, e.g. response.iter_content(). Each
+    item is decoded by the C-accelerated json scanner as soon as it is
+    complete, so only one item and one chunk are held at a time. All
+    other top-level fields are stored in meta once they have been read,
+    e.g. meta['paging'] is complete when the generator is exhausted.
+    """
+    return _iter_array(chunks, key, {} if meta is None else meta)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+id_segment_regex = re.compile(r'^(?!v\d+$).*\d')
+
+
+def endpoint_label(url):
+    """Collapse a URL to its path with id-like segments replaced by {id}"""
+    path = re.sub(r'^[a-z]+://[^/]+', '', url).split('?', 1)[0]
+    return '/'.join('{id}' if id_segment_regex.match(segment) else segment
+                    for segment in path.split('/'))
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """Yield (upper bound, cumulative count) pairs ending with +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+
+class Metrics:
+    """Request and phase metrics collected from ApiClient events
+
+    Register an instance with ApiClient.add_hook(). Requests are keyed by
+    (method, endpoint) with a latency histogram, response bytes, statuses
+    and retries; phases (e.g. auth.tan_wait) keep their total duration.
+    The size of streamed bodies arrives separately in 'body' events.
+    """
+
+    def __init__(self):
+        self.latency = defaultdict(Histogram)
+        self.bytes = defaultdict(int)
+        self.retries = defaultdict(int)
+        self.statuses = defaultdict(int)
+        self.phases = defaultdict(Histogram)
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            if event['type'] == 'phase':
+                self.phases[event['name']].observe(event['seconds'])
+                return
+            key = (event['method'], event['endpoint'])
+            if event['type'] == 'body':
+                self.bytes[key] += event['bytes']
+                return
+            self.latency[key].observe(event['seconds'])
+            self.bytes[key] += event.get('bytes') or 0
+            self.retries[key] += event['retries']
+            self.statuses[key + (str(event.get('status') or event.get('error')),)] += 1
+
+    def summary(self):
+        """Return {'requests': [...], 'phases': [...]} sorted by total time"""
+        with self._lock:
+            requests = [
+                {'method': method, 'endpoint': endpoint, 'count': histogram.count,
+                 'seconds': histogram.sum, 'bytes': self.bytes[(method, endpoint)],
+                 'retries': self.retries[(method, endpoint)]}
+                for (method, endpoint), histogram in self.latency.items()
+            ]
+            phases = [{'phase': name, 'count': histogram.count, 'seconds': histogram.sum}
+                      for name, histogram in self.phases.items()]
+        return {
+            'requests': sorted(requests, key=lambda row: -row['seconds']),
+            'phases': sorted(phases, key=lambda row: -row['seconds']),
+        }
+
+    def prometheus(self, prefix='bankconnect'):
+        """Render all metrics in the Prometheus text exposition format"""
+        def labels(**values):
+            return '{' + ','.join(f'{key}="{value}"' for key, value in values.items()) + '}'
+
+        lines = [f'# TYPE {prefix}_request_duration_seconds histogram']
+        with self._lock:
+            for (method, endpoint), histogram in sorted(self.latency.items()):
+                for bound, count in histogram.cumulative():
+                    le = '+Inf' if bound == float('inf') else bound
+                    lines.append(f'{prefix}_request_duration_seconds_bucket'
+                                 f'{labels(method=method, endpoint=endpoint, le=le)} {count}')
+                key = labels(method=method, endpoint=endpoint)
+                lines.append(f'{prefix}_request_duration_seconds_sum{key} {histogram.sum}')
+                lines.append(f'{prefix}_request_duration_seconds_count{key} {histogram.count}')
+
+            lines.append(f'# TYPE {prefix}_response_bytes_total counter')
+            for (method, endpoint), size in sorted(self.bytes.items()):
+                lines.append(f'{prefix}_response_bytes_total'
+                             f'{labels(method=method, endpoint=endpoint)} {size}')
+
+            lines.append(f'# TYPE {prefix}_retries_total counter')
+            for (method, endpoint), retries in sorted(self.retries.items()):
+                lines.append(f'{prefix}_retries_total'
+                             f'{labels(method=method, endpoint=endpoint)} {retries}')
+
+            lines.append(f'# TYPE {prefix}_requests_total counter')
+            for (method, endpoint, status), count in sorted(self.statuses.items()):
+                lines.append(f'{prefix}_requests_total'
+                             f'{labels(method=method, endpoint=endpoint, status=status)} {count}')
+
+            lines.append(f'# TYPE {prefix}_phase_duration_seconds summary')
+            for name, histogram in sorted(self.phases.items()):
+                lines.append(f'{prefix}_phase_duration_seconds_sum{labels(phase=name)} {histogram.sum}')
+                lines.append(f'{prefix}_phase_duration_seconds_count{labels(phase=name)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path, prefix='bankconnect'):
+        """Atomically write a textfile for node_exporter's textfile collector"""
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False) as f:
+            f.write(self.prometheus(prefix))
+        os.replace(f.name, path)
+
+
+class JsonLinesTrace:
+    """ApiClient hook appending every event as one JSON line to a file"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'a', buffering=1)
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps({'time': time.time(), **event})
+        with self._lock:
+            self.file.write(line + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+def read_trace(path):
+    """Load a JSON-lines trace back into a Metrics instance"""
+    metrics = Metrics()
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                metrics(json.loads(line))
+    return metrics
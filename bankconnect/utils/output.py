@@ -1,21 +1,97 @@
 #!/usr/bin/env python3
 import csv
+import itertools
 import json
 import os
-from fpdf import FPDF
+import tempfile
+from dataclasses import is_dataclass
+from datetime import date, datetime
+from decimal import ROUND_HALF_EVEN, Context, Decimal, InvalidOperation
+from utils.flatten import FlattenPlan, ModelPlan
 
 
 def print_to_stdout(data):
     """Print data to stdout using rich formatting"""
     from rich.json import JSON
     from rich.console import Console
+    from classes.models import to_dict
 
+    if is_dataclass(data):
+        data = to_dict(data)
+    elif isinstance(data, (list, tuple)):
+        data = [to_dict(item) for item in data]
     console = Console()
-    console.print(JSON.from_data(data))
+    console.print(JSON.from_data(data, default=str))
+
+
+# Flattened columns of a Comdirect transaction, so optional fields that
+# only show up late in a long export still get their own column
+COMDIRECT_TRANSACTION_PATHS = (
+    ('amount', 'unit'), ('amount', 'value'), ('bookingDate',),
+    ('bookingStatus',), ('creditor', 'bic'), ('creditor', 'holderName'),
+    ('creditor', 'iban'), ('deptor', 'bic'), ('deptor', 'holderName'),
+    ('deptor', 'iban'), ('directDebitCreditorId',), ('directDebitMandateId',),
+    ('endToEndReference',), ('newTransaction',), ('reference',),
+    ('remittanceInfo',), ('remitter', 'bic'), ('remitter', 'holderName'),
+    ('remitter', 'iban'), ('transactionType', 'key'),
+    ('transactionType', 'text'), ('valutaDate',)
+)
+SCHEMA_SAMPLE_SIZE = 100
+DISPLAY_PAGE_SIZE = 50
+EXTRA_FIELD = 'extra'
+COLUMNAR_ROW_GROUP_SIZE = 64 * 1024
+DICTIONARY_COLUMNS = ('bookingStatus', 'transactionType_key', 'booking_status',
+                      'transaction_type', 'transaction_type_text', 'currency', 'account_id')
+
+
+def iter_items(data, bank_type=None):
+    """Yield the individual records of an API response, list or iterator"""
+    if isinstance(data, dict):
+        if bank_type == 'COMDIRECT' and 'values' in data:
+            yield from data['values']
+        else:
+            yield data
+    elif isinstance(data, (list, tuple)) or hasattr(data, '__next__'):
+        yield from data
+    else:
+        yield data
+
+
+def sample_items(data, bank_type=None, size=SCHEMA_SAMPLE_SIZE):
+    """Split records into a schema sample and an iterator over all of them"""
+    items = iter_items(data, bank_type)
+    sample = list(itertools.islice(items, size))
+    return sample, itertools.chain(sample, items)
+
+
+def build_plan(sample, bank_type=None, for_export=False):
+    """Compile the flattening plan shared by all output formats
+
+    Exports keep the one level of nesting and separate amount value/unit
+    columns they always had; displays flatten fully and show amounts as
+    "value unit". Exports of other banks' records get one column per
+    top-level key of any sampled record.
+    Model records (classes.models) map one field to one column.
+    """
+    if sample and is_dataclass(sample[0]):
+        return ModelPlan(type(sample[0]))
+    if not all(isinstance(item, dict) for item in sample):
+        return None
+    if bank_type != 'COMDIRECT' and for_export:
+        return FlattenPlan.from_sample(sample, max_depth=0)
+    if bank_type == 'COMDIRECT' and for_export:
+        extra_paths = COMDIRECT_TRANSACTION_PATHS if any(
+            'bookingDate' in item for item in sample) else ()
+        return FlattenPlan.from_sample(sample, max_depth=1, combine_amounts=False,
+                                      extra_paths=extra_paths)
+    return FlattenPlan.from_sample(sample)
 
 
 def save_to_csv(data, filename, bank_type=None):
-    """Save data to CSV"""
+    """Save data to CSV; fields first seen after the sample go to the 'extra' column
+
+    Other banks' exports have no 'extra' column and fail on such fields.
+    """
     if not data:
         print("No data to save.")
         return
@@ -23,61 +99,195 @@ def save_to_csv(data, filename, bank_type=None):
     filename = os.path.join('downloads', filename)
 
     try:
-        if bank_type == 'COMDIRECT':
-            if isinstance(data, dict) and 'values' in data:
-                items = data['values']
-            else:
-                items = [data]
-
-            flattened_data = []
-            all_fields = set()
+        sample, items = sample_items(data, bank_type)
+        plan = build_plan(sample, bank_type, for_export=True)
+        if not sample or plan is None:
+            print("[yellow]No data to write to CSV[/yellow]")
+            return
 
+        spill = bank_type == 'COMDIRECT'
+        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(plan.fieldnames + [EXTRA_FIELD] if spill else plan.fieldnames)
             for item in items:
-                flat_item = {}
-                for key, value in item.items():
-                    if key == 'amount':
-                        flat_item['amount_value'] = value.get('value')
-                        flat_item['amount_unit'] = value.get('unit')
-                        all_fields.add('amount_value')
-                        all_fields.add('amount_unit')
-                    elif key == 'transactionType':
-                        flat_item['transactionType_key'] = value.get('key')
-                        flat_item['transactionType_text'] = value.get('text')
-                        all_fields.add('transactionType_key')
-                        all_fields.add('transactionType_text')
-                    elif isinstance(value, dict):
-                        for nested_key, nested_value in value.items():
-                            field_name = f"{key}_{nested_key}"
-                            flat_item[field_name] = nested_value
-                            all_fields.add(field_name)
-                    else:
-                        flat_item[key] = value
-                        all_fields.add(key)
-                flattened_data.append(flat_item)
-
-            for item in flattened_data:
-                for field in all_fields:
-                    if field not in item:
-                        item[field] = None
-        else:
-            flattened_data = data if isinstance(data, list) else [data]
-            all_fields = set(
-                flattened_data[0].keys()) if flattened_data else set()
-
-        if flattened_data:
-            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=sorted(all_fields))
-                writer.writeheader()
-                for item in flattened_data:
-                    writer.writerow(item)
-            print(f"[green]Data saved to {filename}[/green]")
-        else:
-            print("[yellow]No data to write to CSV[/yellow]")
+                row = plan.row(item)
+                extras = plan.extras(item)
+                if spill:
+                    row.append(json.dumps(extras, default=str) if extras else None)
+                elif extras:
+                    raise ValueError(f"fields {', '.join(sorted(extras))} are missing from "
+                                     f"the first {len(sample)} records")
+                writer.writerow(row)
+        print(f"[green]Data saved to {filename}[/green]")
 
     except Exception as e:
         print(f"[red]Error saving to CSV: {e}[/red]")
 
 
+DECIMAL_PRECISION = 38
+MIN_DECIMAL_SCALE = 4
+MAX_DECIMAL_SCALE = 18
+
+
+def _text(value):
+    """String column value; nested values are written as JSON"""
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, default=str, sort_keys=True)
+    return str(value)
+
+
+def _scale(value):
+    exponent = Decimal(str(value)).as_tuple().exponent
+    return -exponent if isinstance(exponent, int) else 0
+
+
+def _to_decimal(scale):
+    quantum = Decimal(1).scaleb(-scale)
+    context = Context(prec=DECIMAL_PRECISION, rounding=ROUND_HALF_EVEN, traps=[InvalidOperation])
+
+    def convert(value):
+        if isinstance(value, (bool, dict, list)):
+            raise TypeError(f"Not a decimal: {value!r}")
+        number = Decimal(str(value))
+        if not number.is_finite():
+            raise ValueError(f"Not a finite decimal: {value!r}")
+        return number.quantize(quantum, context=context)
+    return convert
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+
+def _to_bool(value):
+    if not isinstance(value, bool):
+        raise TypeError(f"Not a boolean: {value!r}")
+    return value
+
+
+def _arrow_column(name, sample_values):
+    """Pick an Arrow type and a strict value converter for a flattened column
+
+    Converters raise TypeError/ValueError for values that do not fit the
+    type inferred from the sample. Decimal columns get the largest scale
+    in the sample (at least MIN_DECIMAL_SCALE, at most MAX_DECIMAL_SCALE);
+    later values with more decimal places are rounded half-even to it.
+    """
+    import pyarrow as pa
+
+    present = [value for value in sample_values if value is not None]
+    if name.endswith('_unit') or name in DICTIONARY_COLUMNS:
+        return pa.dictionary(pa.int32(), pa.string()), _text
+    if name.endswith('_value') or (present and all(isinstance(value, Decimal) for value in present)):
+        try:
+            scale = max([MIN_DECIMAL_SCALE] + [_scale(value) for value in present if value != ''])
+        except ArithmeticError:
+            return pa.string(), _text
+        scale = min(scale, MAX_DECIMAL_SCALE)
+        return pa.decimal128(DECIMAL_PRECISION, scale), _to_decimal(scale)
+    if present and all(isinstance(value, date) for value in present):
+        return pa.date32(), _to_date
+    if name.endswith('Date'):
+        return pa.date32(), _to_date
+    if present and all(isinstance(value, bool) for value in present):
+        return pa.bool_(), _to_bool
+    return pa.string(), _text
+
+
+def save_columnar(data, filename, bank_type=None, file_format='parquet',
+                  row_group_size=COLUMNAR_ROW_GROUP_SIZE):
+    """Save data as typed columns to a Parquet or Arrow IPC file (needs pyarrow)
+
+    Values that do not fit their column's type are kept in the 'extra' column.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("[red]Saving as Parquet/Arrow requires pyarrow: pip install pyarrow[/red]")
+        return
+
+    if not data:
+        print("No data to save.")
+        return
+
+    filename = os.path.join('downloads', filename)
+    temp_name = None
+
+    try:
+        sample, items = sample_items(data, bank_type)
+        plan = build_plan(sample, bank_type, for_export=True)
+        if not sample or plan is None:
+            print("[yellow]No data to write[/yellow]")
+            return
+
+        sample_rows = [plan.row(item) for item in sample]
+        columns = [_arrow_column(name, [row[i] for row in sample_rows])
+                   for i, name in enumerate(plan.fieldnames)]
+        fields = [pa.field(name, arrow_type)
+                  for name, (arrow_type, _) in zip(plan.fieldnames, columns)]
+        schema = pa.schema(fields + [pa.field(EXTRA_FIELD, pa.string())])
+        converters = [convert for _, convert in columns]
+
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(filename) or '.',
+                                         prefix='.', suffix='.tmp', delete=False) as f:
+            temp_name = f.name
+        if file_format == 'parquet':
+            writer = pq.ParquetWriter(temp_name, schema)
+        else:
+            writer = pa.ipc.new_file(temp_name, schema)
+
+        def flush(batch):
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type)
+                 for values, field in zip(batch, schema)],
+                schema=schema
+            ), **({'row_group_size': len(batch[0])} if file_format == 'parquet' else {}))
+
+        with writer:
+            batch = [[] for _ in schema]
+            for item in items:
+                mismatched = {}
+                for values, convert, name, value in zip(
+                        batch, converters, plan.fieldnames, plan.row(item)):
+                    if value is None or value == '':
+                        values.append(None)
+                        continue
+                    try:
+                        values.append(convert(value))
+                    except (TypeError, ValueError, ArithmeticError):
+                        values.append(None)
+                        mismatched[name] = value
+                extras = {**plan.extras(item), **mismatched}
+                batch[-1].append(json.dumps(extras, default=str) if extras else None)
+                if len(batch[-1]) >= row_group_size:
+                    flush(batch)
+                    batch = [[] for _ in schema]
+            if batch[-1]:
+                flush(batch)
+        os.replace(temp_name, filename)
+        temp_name = None
+        print(f"[green]Data saved to {filename}[/green]")
+
+    except Exception as e:
+        print(f"[red]Error saving to {file_format}: {e}[/red]")
+    finally:
+        if temp_name:
+            os.unlink(temp_name)
+
+
+def save_to_parquet(data, filename, bank_type=None):
+    save_columnar(data, filename, bank_type, 'parquet')
+
+
+def save_to_arrow(data, filename, bank_type=None):
+    save_columnar(data, filename, bank_type, 'arrow')
+
+
 def save_to_text(data, filename):
     filename = os.path.join('downloads', filename)
 
@@ -85,29 +295,71 @@ def save_to_text(data, filename):
         file.write(json.dumps(data, indent=2))
 
 
-def save_to_pdf(data, filename):
+def _pdf_transactions(sample, items, bank_type):
+    """Transaction models for a statement, or None for other records"""
+    from classes.models import Transaction
+
+    if all(isinstance(item, Transaction) for item in sample):
+        return items
+    if bank_type == 'COMDIRECT' and all(
+            isinstance(item, dict) and 'bookingDate' in item for item in sample):
+        return (Transaction.from_comdirect(item) for item in items)
+    return None
+
+
+def save_to_pdf(data, filename, bank_type=None, title=None, opening_balance=None):
+    """Save data as a tabular PDF; transactions become a utils.statement.Statement"""
+    from utils.statement import Statement, TablePDF, latin1, table_columns
+
+    if not data:
+        print("No data to save.")
+        return
+
     filename = os.path.join('downloads', filename)
 
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
+    try:
+        sample, items = sample_items(data, bank_type)
+        if not sample:
+            print("[yellow]No data to write to PDF[/yellow]")
+            return
 
-    for item in data:
-        if isinstance(item, dict):
-            for key, value in item.items():
-                pdf.cell(200, 10, txt=f"{key}: {value}", ln=True)
-            pdf.cell(200, 10, txt=" ", ln=True)
-        else:
-            pdf.cell(200, 10, txt=str(item), ln=True)
-            pdf.cell(200, 10, txt=" ", ln=True)
+        transactions = _pdf_transactions(sample, items, bank_type)
+        if transactions is not None:
+            account_id = getattr(sample[0], 'account_id', None)
+            title = title or ' '.join(filter(None, ('Account statement', account_id)))
+            statement = Statement(title, opening_balance)
+            for transaction in transactions:
+                statement.add(transaction)
+            statement.close(filename)
+            print(f"[green]Data saved to {filename}[/green]")
+            return
 
-    pdf.output(filename)
+        plan = build_plan(sample, bank_type)
+        fieldnames = plan.fieldnames if plan is not None else ['Value']
+        page_width = TablePDF.PAGE_WIDTH
+        columns = table_columns(fieldnames, page_width)
+        pdf = TablePDF(columns or [('Field', page_width / 4, 'L'),
+                                   ('Value', page_width * 3 / 4, 'L')], title or '')
+        for item in items:
+            values = plan.row(item) if plan is not None else [item]
+            if columns:
+                pdf.row([latin1(value) for value in values])
+            else:
+                for name, value in zip(fieldnames, values):
+                    pdf.row((latin1(name), latin1(value)))
+                pdf.ln(1)
+        pdf.output(filename, 'F')
+        print(f"[green]Data saved to {filename}[/green]")
 
+    except Exception as e:
+        print(f"[red]Error saving to PDF: {e}[/red]")
 
-def display_data(data, bank_type=None):
-    """Display data in a rich table format"""
+
+def display_data(data, bank_type=None, page_size=DISPLAY_PAGE_SIZE):
+    """Display data in a rich table format, one page of rows at a time"""
     from rich.table import Table
     from rich.console import Console
+    from rich.prompt import Prompt
 
     console = Console()
 
@@ -116,69 +368,39 @@ def display_data(data, bank_type=None):
         return
 
     try:
-        # Process data similar to CSV logic
-        if bank_type == 'COMDIRECT':
-            if isinstance(data, dict) and 'values' in data:
-                items = data['values']
-            else:
-                items = [data]
-        else:
-            items = data if isinstance(data, list) else [data]
-
-        if not items:
+        sample, items = sample_items(data, bank_type)
+        if not sample:
             console.print("[yellow]No items to display[/yellow]")
             return
 
-        # Create table
-        table = Table(show_header=True, header_style="bold blue")
-
-        # Flatten the first item to get all possible fields
-        sample_item = items[0]
-        all_fields = set()
-
-        def flatten_dict(d, prefix=''):
-            for key, value in d.items():
-                if isinstance(value, dict):
-                    if 'value' in value and 'unit' in value:
-                        # Special handling for amount-like objects
-                        field_name = f"{prefix}{key}" if prefix else key
-                        all_fields.add(field_name)
-                    else:
-                        flatten_dict(value, f"{prefix}{
-                                     key}_" if prefix else f"{key}_")
-                else:
-                    field_name = f"{prefix}{key}" if prefix else key
-                    all_fields.add(field_name)
-
-        if isinstance(sample_item, dict):
-            flatten_dict(sample_item)
-
-            # Add columns
-            for field in sorted(all_fields):
-                table.add_column(field)
-
-            # Add rows
-            for item in items:
-                row_data = []
-                for field in sorted(all_fields):
-                    # Navigate nested structure
-                    value = item
-                    for part in field.split('_'):
-                        if isinstance(value, dict):
-                            if 'value' in value and 'unit' in value:
-                                value = f"{value['value']} {value['unit']}"
-                            else:
-                                value = value.get(part, '')
-                        else:
-                            value = ''
-                    row_data.append(str(value))
-                table.add_row(*row_data)
-        else:
-            table.add_column("Value")
-            for item in items:
-                table.add_row(str(item))
-
-        console.print(table)
+        plan = build_plan(sample, bank_type)
+        shown = 0
+        while True:
+            page = list(itertools.islice(items, page_size))
+            if not page:
+                break
+
+            table = Table(show_header=True, header_style="bold blue")
+            if plan is not None:
+                for field in plan.fieldnames:
+                    table.add_column(field)
+                for item in page:
+                    table.add_row(*('' if value is None else str(value)
+                                    for value in plan.row(item)))
+            else:
+                table.add_column("Value")
+                for item in page:
+                    table.add_row(str(item))
+            console.print(table)
+            shown += len(page)
+
+            if len(page) < page_size or not console.is_terminal:
+                continue
+            answer = Prompt.ask(
+                f"Shown {shown} rows. Press Enter for more or 'q' to stop",
+                default='', show_default=False)
+            if answer.strip().lower() == 'q':
+                break
 
     except Exception as e:
         console.print(f"[red]Error displaying data: {e}[/red]")
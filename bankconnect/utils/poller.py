@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+import random
+import threading
+import time
+from utils.api import parse_retry_after
+
+
+class PollCancelled(Exception):
+    """Raised when a challenge poll is cancelled before it completes"""
+
+
+class ChallengePoller:
+    """Poll a 2FA challenge status URL until it is confirmed
+
+    The delay between polls grows exponentially with jitter and a
+    Retry-After header from the server takes precedence. on_progress is
+    called as on_progress(elapsed, attempt) before every wait. Setting
+    the `cancelled` event, e.g. from another thread, stops the poll with
+    PollCancelled right away.
+    """
+
+    def __init__(self, client, url, headers, is_done, timeout=120,
+                 initial_delay=1.0, max_delay=10.0, multiplier=1.5,
+                 jitter=0.2, on_progress=None, cancelled=None):
+        self.client = client
+        self.url = url
+        self.headers = headers
+        self.is_done = is_done
+        self.timeout = timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.on_progress = on_progress
+        self._cancelled = cancelled or threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _check(self):
+        """Issue one status request; returns (data or None, retry_after)"""
+        response = self.client.send('GET', self.url, headers=self.headers)
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if response.status_code == 200:
+            data = response.json()
+            if self.is_done(data):
+                return data, retry_after
+        return None, retry_after
+
+    def _next_wait(self, start, attempt, delay, retry_after):
+        """Return (seconds to wait, next backoff delay) after a pending check"""
+        elapsed = time.monotonic() - start
+        if elapsed >= self.timeout:
+            raise TimeoutError("Push notification confirmation timed out")
+        if self.on_progress:
+            self.on_progress(elapsed, attempt)
+
+        if self.client.replaying:
+            return 0.0, delay
+        if retry_after is not None:
+            wait = retry_after
+        else:
+            wait = delay * (1 + random.uniform(-self.jitter, self.jitter))
+            delay = min(delay * self.multiplier, self.max_delay)
+        return min(wait, self.timeout - elapsed), delay
+
+    def poll(self):
+        """Block until the challenge is confirmed and return its status data"""
+        start = time.monotonic()
+        delay = self.initial_delay
+        attempt = 0
+        while not self._cancelled.is_set():
+            attempt += 1
+            data, retry_after = self._check()
+            if data is not None:
+                return data
+            wait, delay = self._next_wait(start, attempt, delay, retry_after)
+            if self._cancelled.wait(wait):
+                break
+        raise PollCancelled("Challenge polling was cancelled")
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import random
+import threading
+import time
+import requests
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised without a network call while the circuit breaker is open"""
+
+
+class RetryPolicy:
+    """Decide whether and how long to wait before retrying a request
+
+    429 and 503 mean the server did not process the request, so they are
+    retried for every method. Other 5xx responses and connection errors
+    are only retried for idempotent methods.
+    """
+
+    def __init__(self, max_retries=3, backoff_factor=0.5, max_backoff=30.0, jitter=0.2):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+    def should_retry(self, method, attempt, status=None, error=None):
+        if attempt >= self.max_retries:
+            return False
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        if error is not None:
+            return idempotent and isinstance(
+                error, (requests.ConnectionError, requests.Timeout))
+        if status in (429, 503):
+            return True
+        return idempotent and status in RETRY_STATUSES
+
+    def backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        delay = min(self.backoff_factor * (2 ** attempt), self.max_backoff)
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class TokenBucket:
+    """Client-side rate limiter allowing `rate` requests/s with bursts"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until one is available; returns the wait"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class CircuitBreaker:
+    """Fail fast after repeated failures until the API had time to recover
+
+    After failure_threshold consecutive failures the circuit opens and
+    calls are rejected for reset_timeout seconds. Then a single trial
+    call is let through; its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def release(self):
+        """End a call that recorded no outcome, freeing the trial slot"""
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
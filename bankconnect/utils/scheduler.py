@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import fcntl
+import os
+import random
+import threading
+import time
+
+DEFAULT_LOCK_PATH = os.path.join('data', 'bankconnect.lock')
+DEFAULT_INTERVAL = 6 * 60 * 60
+DEFAULT_JITTER = 10 * 60
+DEFAULT_KEEP_ALIVE_INTERVAL = 4 * 60
+
+
+class LockBusy(Exception):
+    """Raised when another sync run already holds the lock"""
+
+
+class RunLock:
+    """Exclusive advisory file lock so batch runs and the daemon never overlap"""
+
+    def __init__(self, path=DEFAULT_LOCK_PATH):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, 'a+')
+        try:
+            fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.file.close()
+            raise LockBusy(f"Another sync is running ({self.path})")
+        self.file.truncate(0)
+        self.file.write(str(os.getpid()))
+        self.file.flush()
+        return self
+
+    def __exit__(self, *exc_info):
+        fcntl.flock(self.file, fcntl.LOCK_UN)
+        self.file.close()
+
+
+class Scheduler:
+    """Run a job periodically and keep bank sessions warm in between
+
+    job() runs every interval seconds, shifted by up to +/- jitter so
+    several installations do not hit the bank at the same moment, and
+    always under RunLock. keep_alive() is called every
+    keep_alive_interval seconds between runs. Exceptions from either are
+    passed to on_error and never stop the loop; stop() does.
+    """
+
+    def __init__(self, job, interval=DEFAULT_INTERVAL, jitter=DEFAULT_JITTER,
+                 keep_alive=None, keep_alive_interval=DEFAULT_KEEP_ALIVE_INTERVAL,
+                 lock_path=DEFAULT_LOCK_PATH, on_error=None):
+        self.job = job
+        self.interval = interval
+        self.jitter = jitter
+        self.keep_alive = keep_alive
+        self.keep_alive_interval = keep_alive_interval
+        self.lock_path = lock_path
+        self.on_error = on_error
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def next_delay(self):
+        return max(0.0, self.interval + random.uniform(-self.jitter, self.jitter))
+
+    def _call(self, func):
+        try:
+            func()
+        except Exception as e:
+            if self.on_error:
+                self.on_error(e)
+
+    def _run_job(self):
+        with RunLock(self.lock_path):
+            self.job()
+
+    def run(self, run_immediately=True):
+        """Loop until stop() is called"""
+        now = time.monotonic()
+        next_run = now if run_immediately else now + self.next_delay()
+        next_keep_alive = now + self.keep_alive_interval
+
+        while not self._stopped.is_set():
+            now = time.monotonic()
+            if now >= next_run:
+                self._call(self._run_job)
+                next_run = time.monotonic() + self.next_delay()
+                next_keep_alive = time.monotonic() + self.keep_alive_interval
+            elif self.keep_alive and now >= next_keep_alive:
+                self._call(self.keep_alive)
+                next_keep_alive = time.monotonic() + self.keep_alive_interval
+
+            wake = next_run if not self.keep_alive else min(next_run, next_keep_alive)
+            self._stopped.wait(max(0.0, wake - time.monotonic()))
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+from fpdf import FPDF
+
+FONT = 'Arial'
+FONT_SIZE = 7
+TITLE_SIZE = 10
+ROW_HEIGHT = 4
+MARGIN = 10
+CELL_MARGIN = 1
+ELLIPSIS = '..'
+MIN_COLUMN_WIDTH = 22
+HEADER_FILL = (220, 228, 240)
+SUBTOTAL_FILL = (240, 240, 240)
+
+# (header, width in mm, align); the widths fill an A4 landscape page
+STATEMENT_COLUMNS = (
+    ('Booking date', 18, 'L'),
+    ('Valuta date', 18, 'L'),
+    ('Type', 26, 'L'),
+    ('Counterparty', 52, 'L'),
+    ('Description', 107, 'L'),
+    ('Amount', 27, 'R'),
+    ('Balance', 29, 'R'),
+)
+
+# Character widths per font (name with style), and the widest character,
+# taken from the first document that selects the font
+_char_widths = {}
+_widest = {}
+
+
+def latin1(value):
+    """Text for the PDF core fonts, which only cover Latin-1"""
+    if value is None:
+        return ''
+    return str(value).encode('latin-1', 'replace').decode('latin-1')
+
+
+def fit_text(text, width, font_key, size=FONT_SIZE):
+    """Cut text to fit a column width (mm), ending it with ELLIPSIS
+
+    font_key is a font selected by a TablePDF before, e.g. its font_key.
+    """
+    # Glyph widths are in 1/1000 of the font size
+    limit = (width - 2 * CELL_MARGIN) * 1000 / (size * 25.4 / 72)
+    if len(text) * _widest[font_key] <= limit:
+        return text
+    return _cut_text(text, limit, font_key)
+
+
+@lru_cache(maxsize=16384)
+def _cut_text(text, limit, font_key):
+    """Measure text glyph by glyph; cached, as counterparties repeat a lot"""
+    widths = _char_widths[font_key]
+    used = 0
+    for index, char in enumerate(text):
+        used += widths.get(char, 0)
+        if used > limit:
+            break
+    else:
+        return text
+    limit -= sum(widths[char] for char in ELLIPSIS)
+    while index and used > limit:
+        index -= 1
+        used -= widths.get(text[index], 0)
+    return text[:index] + ELLIPSIS
+
+
+def format_amount(value):
+    return '' if value is None else f'{value:,.2f}'
+
+
+class DocumentBuffer:
+    """Stand-in for FPDF's document string that appends in constant time
+
+    FPDF 1.7 assembles the finished file with `self.buffer += ...`, which
+    copies the whole document for every object written and made output
+    quadratic in the number of pages. It only ever appends to, measures
+    and encodes the buffer, so a list of parts is enough. TablePDF does
+    the same for the content of the page being drawn.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def __iadd__(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        return self
+
+    def __len__(self):
+        return self.size
+
+    def encode(self, encoding):
+        return ''.join(self.parts).encode(encoding)
+
+
+class TablePDF(FPDF):
+    """A4 landscape table that repeats its title and column header per page"""
+
+    PAGE_WIDTH = 297 - 2 * MARGIN
+
+    def __init__(self, columns, title=''):
+        super().__init__('L', 'mm', 'A4')
+        self.buffer = DocumentBuffer()
+        self.columns = tuple(columns)
+        self.title_text = latin1(title)
+        self.set_margins(MARGIN, MARGIN)
+        self.set_auto_page_break(False)
+        self.alias_nb_pages()
+        self.set_font(FONT, '', FONT_SIZE)
+        self.bottom = self.h - MARGIN - ROW_HEIGHT
+        self.add_page()
+
+    def _beginpage(self, orientation):
+        self.page_parts = []
+        super()._beginpage(orientation)
+
+    def _out(self, s):
+        if self.state != 2:
+            return super()._out(s)
+        self.page_parts.append(s.decode('latin-1') if isinstance(s, bytes) else s)
+        self.page_parts.append('\n')
+
+    def _endpage(self):
+        self.pages[self.page] = ''.join(self.page_parts)
+        super()._endpage()
+
+    def set_font(self, family, style='', size=0):
+        super().set_font(family, style, size)
+        self.font_key = self.current_font['name'].lower()
+        if self.font_key not in _char_widths:
+            _char_widths[self.font_key] = self.current_font['cw']
+            _widest[self.font_key] = max(self.current_font['cw'].values())
+
+    def header(self):
+        self.set_font(FONT, 'B', TITLE_SIZE)
+        self.cell(0, ROW_HEIGHT + 2, self.title_text, 0, 1)
+        self.set_font(FONT, 'B', FONT_SIZE)
+        self.set_fill_color(*HEADER_FILL)
+        for name, width, align in self.columns:
+            self.cell(width, ROW_HEIGHT + 1, name, 'B', 0, align, 1)
+        self.ln()
+        self.set_font(FONT, '', FONT_SIZE)
+
+    def footer(self):
+        self.set_y(-MARGIN)
+        self.set_font(FONT, '', FONT_SIZE)
+        self.cell(0, ROW_HEIGHT, f'Page {self.page_no()}/{{nb}}', 0, 0, 'R')
+
+    def row(self, values, bold=False, fill=False):
+        """Draw one table row; values are already strings, one per column"""
+        if self.y > self.bottom:
+            self.add_page()
+        if bold:
+            self.set_font(FONT, 'B', FONT_SIZE)
+        if fill:
+            self.set_fill_color(*SUBTOTAL_FILL)
+        for (_, width, align), text in zip(self.columns, values):
+            if text:
+                text = fit_text(text, width, self.font_key, self.font_size_pt)
+            self.cell(width, ROW_HEIGHT, text, 0, 0, align, fill)
+        self.ln()
+        if bold:
+            self.set_font(FONT, '', FONT_SIZE)
+
+
+def counterparty(transaction):
+    return transaction.remitter_name or transaction.creditor_name or transaction.deptor_name
+
+
+def booking_order(transaction):
+    """Sort key for a statement: by booking date, not yet booked ones last"""
+    booked = transaction.booking_date
+    return (booked is None, booked or date.min)
+
+
+def opening_balance(balance, transactions):
+    """Balance before the first of the transactions
+
+    balance is the account's current classes.models.Balance, which only
+    covers booked transactions; returns None when it is not known.
+    """
+    if balance is None or balance.balance is None:
+        return None
+    return balance.balance - sum(
+        (transaction.amount or 0 for transaction in transactions if transaction.booking_date),
+        Decimal(0))
+
+
+class Statement:
+    """Account statement: transactions with per-month subtotals and a running balance
+
+    Transactions (classes.models.Transaction) must come in booking_order,
+    as the local store yields them; add() raises ValueError otherwise.
+    The running balance starts at opening_balance, or at zero when the
+    opening balance is not known. Not yet booked transactions have no
+    booking date and are subtotalled as their own group at the end.
+    """
+
+    def __init__(self, title='Account statement', opening_balance=None):
+        self.pdf = TablePDF(STATEMENT_COLUMNS, title)
+        self.balance = Decimal(opening_balance or 0)
+        self.opening_balance = self.balance
+        self.month = None
+        self.month_in = self.month_out = Decimal(0)
+        self.month_count = 0
+        self.count = 0
+        self.last = None
+        if opening_balance is not None:
+            self.pdf.row(('', '', '', 'Opening balance', '', '',
+                          format_amount(self.balance)), bold=True)
+
+    def add(self, transaction):
+        key = booking_order(transaction)
+        if self.last is not None and key < self.last:
+            raise ValueError(f"Transaction {transaction.reference} is out of booking date order")
+        self.last = key
+        booked = transaction.booking_date
+        month = booked.strftime('%Y-%m') if booked else 'not booked'
+        if month != self.month:
+            self.subtotal()
+            self.month = month
+
+        amount = transaction.amount or 0
+        self.balance += amount
+        if amount >= 0:
+            self.month_in += amount
+        else:
+            self.month_out += amount
+        self.month_count += 1
+        self.count += 1
+
+        self.pdf.row((
+            booked.isoformat() if booked else '',
+            transaction.valuta_date.isoformat() if transaction.valuta_date else '',
+            latin1(transaction.transaction_type_text or transaction.transaction_type),
+            latin1(counterparty(transaction)),
+            latin1(transaction.remittance_info),
+            format_amount(transaction.amount),
+            format_amount(self.balance),
+        ))
+
+    def subtotal(self):
+        if not self.month_count:
+            return
+        self.pdf.row((
+            '', '', '', f'Subtotal {self.month} ({self.month_count} bookings)',
+            f'in {format_amount(self.month_in)}   out {format_amount(self.month_out)}',
+            format_amount(self.month_in + self.month_out),
+            format_amount(self.balance),
+        ), bold=True, fill=True)
+        self.month_in = self.month_out = Decimal(0)
+        self.month_count = 0
+
+    def close(self, filename):
+        self.subtotal()
+        self.pdf.row(('', '', '', f'Closing balance ({self.count} bookings)', '',
+                      format_amount(self.balance - self.opening_balance),
+                      format_amount(self.balance)), bold=True)
+        self.pdf.output(filename, 'F')
+
+
+def table_columns(fieldnames, page_width):
+    """Equal-width columns for the fields, or None if they do not fit"""
+    if not fieldnames or len(fieldnames) * MIN_COLUMN_WIDTH > page_width:
+        return None
+    width = page_width / len(fieldnames)
+    return [(latin1(name), width, 'L') for name in fieldnames]
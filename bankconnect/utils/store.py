@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+DEFAULT_DB_PATH = os.path.join('data', 'transactions.db')
+BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    account_id TEXT NOT NULL,
+    tx_hash TEXT NOT NULL,
+    bank TEXT NOT NULL,
+    booking_date TEXT,
+    booking_status TEXT,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (account_id, tx_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_booking_date
+    ON transactions (account_id, booking_date);
+CREATE TABLE IF NOT EXISTS watermarks (
+    account_id TEXT PRIMARY KEY,
+    bank TEXT NOT NULL,
+    last_booking_date TEXT,
+    synced_at TEXT NOT NULL
+);
+"""
+
+
+def transaction_hash(transaction):
+    """Stable identity of a transaction across repeated downloads"""
+    reference = transaction.get('reference')
+    if reference:
+        return reference
+    identity = {key: transaction.get(key) for key in (
+        'bookingDate', 'valutaDate', 'amount', 'remitter', 'creditor',
+        'deptor', 'remittanceInfo', 'transactionType')}
+    canonical = json.dumps(identity, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class TransactionStore:
+    """Local SQLite store of downloaded transactions with sync watermarks"""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def get_watermark(self, account_id):
+        row = self.conn.execute(
+            "SELECT last_booking_date FROM watermarks WHERE account_id = ?",
+            (account_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def upsert_transactions(self, bank, account_id, transactions):
+        """Bulk upsert transactions in a single database transaction
+
+        Not yet booked transactions have no reference and get one once
+        they book, so their hash changes. The account's stored NOTBOOKED
+        rows are therefore replaced by the ones in this download; pending
+        rows that did not come back (booked since, or cancelled) are
+        removed. Returns a dict with inserted/updated/skipped/removed
+        counts.
+        """
+        counts = {'inserted': 0, 'updated': 0, 'skipped': 0, 'removed': 0}
+        watermark = self.get_watermark(account_id)
+
+        with self.conn:
+            pending = dict(self.conn.execute(
+                "SELECT tx_hash, payload FROM transactions "
+                "WHERE account_id = ? AND booking_status = 'NOTBOOKED'",
+                (account_id,)
+            ))
+            self.conn.execute(
+                "DELETE FROM transactions "
+                "WHERE account_id = ? AND booking_status = 'NOTBOOKED'",
+                (account_id,)
+            )
+            batch = []
+            for transaction in transactions:
+                batch.append(transaction)
+                if len(batch) >= BATCH_SIZE:
+                    watermark = self._upsert_batch(
+                        bank, account_id, batch, counts, watermark, pending)
+                    batch = []
+            if batch:
+                watermark = self._upsert_batch(
+                    bank, account_id, batch, counts, watermark, pending)
+            counts['removed'] = len(pending)
+
+            self.conn.execute(
+                "INSERT INTO watermarks (account_id, bank, last_booking_date, synced_at) "
+                "VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (account_id) DO UPDATE SET "
+                "last_booking_date = excluded.last_booking_date, "
+                "synced_at = excluded.synced_at",
+                (account_id, bank, watermark, datetime.now().isoformat())
+            )
+        return counts
+
+    def _upsert_batch(self, bank, account_id, batch, counts, watermark, pending):
+        rows = {}
+        for transaction in batch:
+            rows[transaction_hash(transaction)] = transaction
+
+        placeholders = ','.join('?' * len(rows))
+        existing = dict(self.conn.execute(
+            f"SELECT tx_hash, payload FROM transactions "
+            f"WHERE account_id = ? AND tx_hash IN ({placeholders})",
+            (account_id, *rows)
+        ))
+
+        changed = []
+        for tx_hash, transaction in rows.items():
+            payload = json.dumps(transaction, sort_keys=True)
+            # Pending rows were deleted up front and have to be written again
+            stored = pending.pop(tx_hash, None)
+            if stored is not None:
+                counts['skipped' if stored == payload else 'updated'] += 1
+            elif tx_hash not in existing:
+                counts['inserted'] += 1
+            elif existing[tx_hash] != payload:
+                counts['updated'] += 1
+            else:
+                counts['skipped'] += 1
+                continue
+
+            booking_date = transaction.get('bookingDate')
+            booking_status = transaction.get('bookingStatus')
+            changed.append((account_id, tx_hash, bank, booking_date,
+                            booking_status, payload))
+            if booking_date and booking_status != 'NOTBOOKED' and \
+                    (watermark is None or booking_date > watermark):
+                watermark = booking_date
+
+        counts['skipped'] += len(batch) - len(rows)
+        self.conn.executemany(
+            "INSERT INTO transactions "
+            "(account_id, tx_hash, bank, booking_date, booking_status, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (account_id, tx_hash) DO UPDATE SET "
+            "booking_date = excluded.booking_date, "
+            "booking_status = excluded.booking_status, "
+            "payload = excluded.payload",
+            changed
+        )
+        return watermark
+
+    def iter_transactions(self, account_id, from_date=None):
+        """Yield stored transactions for an account in booking date order
+
+        Not yet booked transactions have no booking date and come last.
+        """
+        query = "SELECT payload FROM transactions WHERE account_id = ?"
+        params = [account_id]
+        if from_date:
+            query += " AND booking_date >= ?"
+            params.append(from_date)
+        query += " ORDER BY booking_date IS NULL, booking_date"
+        for (payload,) in self.conn.execute(query, params):
+            yield json.loads(payload)
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+DEFAULT_OVERLAP_DAYS = 3
+# Transactions buffered per account while the store is busy with another one
+QUEUE_SIZE = 1000
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+def _from_date(store, account_id, overlap_days):
+    watermark = store.get_watermark(account_id)
+    if watermark:
+        return (date.fromisoformat(watermark) - timedelta(days=overlap_days)).isoformat()
+    return None
+
+
+def sync_account(bank, store, bank_type, account_id, overlap_days=DEFAULT_OVERLAP_DAYS):
+    """Fetch only the transactions newer than the stored watermark"""
+    from_date = _from_date(store, account_id, overlap_days)
+    # Streamed, so rows reach the store before each page has finished downloading
+    transactions = bank.iter_transactions(account_id, from_date, stream=True)
+    return store.upsert_transactions(bank_type, account_id, transactions)
+
+
+def _produce(bank, account_id, from_date, buffer, stop):
+    """Download an account into its buffer; runs on a pool thread"""
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    try:
+        for transaction in bank.iter_transactions(account_id, from_date, stream=True):
+            if not put(transaction):
+                return
+    except BaseException as e:
+        put(_Failed(e))
+    else:
+        put(_DONE)
+
+
+def _consume(buffer):
+    while True:
+        item = buffer.get()
+        if item is _DONE:
+            return
+        if isinstance(item, _Failed):
+            raise item.error
+        yield item
+
+
+def sync_accounts(bank, store, bank_type, overlap_days=DEFAULT_OVERLAP_DAYS, max_workers=None):
+    """Incrementally sync every account of an authenticated bank
+
+    Accounts download concurrently on up to bank.max_workers threads
+    while the store, whose connection belongs to the calling thread,
+    takes them in account order. The pool starts downloads in that
+    order too, so the account being stored is always downloading.
+    """
+    account_ids = bank.get_account_ids()
+    buffers = {account_id: queue.Queue(QUEUE_SIZE) for account_id in account_ids}
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max_workers or bank.max_workers)
+    try:
+        for account_id in account_ids:
+            executor.submit(_produce, bank, account_id,
+                            _from_date(store, account_id, overlap_days),
+                            buffers[account_id], stop)
+        return {
+            account_id: store.upsert_transactions(
+                bank_type, account_id, _consume(buffers[account_id]))
+            for account_id in account_ids
+        }
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+import base64
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+DEFAULT_CACHE_DIR = os.path.join('data', 'tokens')
+KDF_ITERATIONS = 200_000
+
+logger = logging.getLogger(__name__)
+_warned = False
+
+
+def _warn_disabled():
+    global _warned
+    if not _warned:
+        _warned = True
+        logger.warning("The 'cryptography' package is not installed, OAuth tokens and "
+                       "HTTP responses are not cached on disk and every restart needs "
+                       "a new 2FA confirmation: pip install cryptography")
+
+
+class EncryptedFile:
+    """File encrypted with a key derived from a secret, e.g. the user's PIN
+
+    The key is derived with PBKDF2 from the secret and a random salt kept
+    at the start of the file. It is derived once per salt, so rewriting
+    the file does not pay for the derivation again. Requires the
+    'cryptography' package; without it the file is disabled, which is
+    logged once.
+    """
+
+    def __init__(self, path, secret):
+        self.path = path
+        self.secret = secret or ''
+        self._salt = self._cipher = None
+        try:
+            from cryptography.fernet import Fernet, InvalidToken
+            self._fernet = Fernet
+            self._invalid_token = InvalidToken
+        except ImportError:
+            self._fernet = None
+            _warn_disabled()
+
+    @property
+    def enabled(self):
+        return self._fernet is not None and bool(self.secret)
+
+    def _cipher_for(self, salt):
+        if salt != self._salt:
+            key = hashlib.pbkdf2_hmac(
+                'sha256', self.secret.encode(), salt, KDF_ITERATIONS)
+            self._salt, self._cipher = salt, self._fernet(base64.urlsafe_b64encode(key))
+        return self._cipher
+
+    def read(self):
+        """Return the decrypted content, or None if missing or unreadable"""
+        if not self.enabled:
+            return None
+        try:
+            with open(self.path, 'rb') as f:
+                salt, content = f.read(16), f.read()
+            return self._cipher_for(salt).decrypt(content)
+        except (OSError, ValueError, self._invalid_token):
+            return None
+
+    def write(self, content):
+        """Atomically replace the file (mode 0600) with the encrypted content"""
+        salt = self._salt or os.urandom(16)
+        token = self._cipher_for(salt).encrypt(content)
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('wb', dir=directory, delete=False) as f:
+            os.chmod(f.name, 0o600)
+            f.write(salt + token)
+        os.replace(f.name, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class TokenCache:
+    """Encrypted on-disk OAuth token cache keyed by bank and username
+
+    Tokens are encrypted with a key derived from the user's PIN (see
+    EncryptedFile), so the cache is only readable by someone who can
+    also log in.
+    """
+
+    def __init__(self, bank, username, secret, directory=DEFAULT_CACHE_DIR):
+        key = hashlib.sha256(f"{bank}:{username}".encode()).hexdigest()
+        self.file = EncryptedFile(os.path.join(directory, f"{key}.bin"), secret)
+        self.path = self.file.path
+
+    @property
+    def enabled(self):
+        return self.file.enabled
+
+    def load(self):
+        """Return the cached token entry, or None if missing or unreadable"""
+        content = self.file.read()
+        if content is None:
+            return None
+        try:
+            return json.loads(content)
+        except ValueError:
+            return None
+
+    def save(self, token_data, **extra):
+        """Store an OAuth token response together with its absolute expiry
+
+        Returns the stored entry, also when the cache is disabled, so
+        callers can keep it in memory.
+        """
+        entry = {
+            'access_token': token_data['access_token'],
+            'refresh_token': token_data.get('refresh_token'),
+            'expires_at': time.time() + token_data.get('expires_in', 0),
+            **extra
+        }
+        if self.enabled:
+            self.file.write(json.dumps(entry).encode())
+        return entry
+
+    def clear(self):
+        self.file.remove()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Stream a synthetic Comdirect transaction export through save_to_csv.
+
+Transactions are generated lazily, so peak RSS reflects the exporter
+itself rather than the input data.
+
+    python benchmarks/bench_csv.py [rows]
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bankconnect'))
+from utils.output import save_to_csv  # noqa: E402
+
+
+def synthetic_transactions(n):
+    for i in range(n):
+        transaction = {
+            'reference': f'REF{i:010d}',
+            'bookingStatus': 'BOOKED',
+            'bookingDate': f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}',
+            'valutaDate': f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}',
+            'amount': {'value': f'{(i % 5000) - 2500}.{i % 100:02d}', 'unit': 'EUR'},
+            'remitter': {'holderName': f'Remitter {i % 977}'},
+            'remittanceInfo': f'01Payment {i} for invoice {i * 7 % 100000}',
+            'transactionType': {'key': 'TRANSFER', 'text': 'Überweisung'},
+            'newTransaction': False,
+        }
+        if i % 10 == 0:
+            transaction['creditor'] = {'holderName': 'Creditor', 'iban': 'DE00123456780000000000'}
+        yield transaction
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        os.mkdir('downloads')
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        save_to_csv(synthetic_transactions(n), 'bench.csv', 'COMDIRECT')
+        elapsed = time.perf_counter() - start
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        size = os.path.getsize(os.path.join('downloads', 'bench.csv'))
+
+    print(f"{n} transactions in {elapsed:.2f} s ({n / elapsed:,.0f} rows/s), "
+          f"{size / 1e6:.1f} MB written, peak RSS growth {(rss_after - rss_before) / 1024:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Import generated Deutsche Bank Kontoumsaetze exports of several sizes.
+
+For each size the streaming iter_extract() is consumed without keeping
+entries, then extract() builds the full list as bean-extract does.
+
+    python benchmarks/bench_deutschebank.py [rows ...]
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from lib.deutschebank import DeutscheBankImporter, Target  # noqa: E402
+
+PREAMBLE = [
+    'Kontoumsätze Girokonto;;;;;;;;;;;;;;;;;\n',
+    'Kunde;Max Mustermann;;;;;;;;;;;;;;;;\n',
+    'Umsätze ab;01.01.2020;bis;31.12.2024;;;;;;;;;;;;;;\n',
+    ';;;;;;;;;;;;;;;;;\n',
+    'Buchungstag;Wert;Umsatzart;Begünstigter / Auftraggeber;Verwendungszweck;'
+    'IBAN;BIC;Kundenreferenz;Mandatsreferenz;Gläubiger ID;Fremde Gebühren;'
+    'Betrag;Abweichende Empfänger;Anzahl der Aufträge;Anzahl der Schecks;'
+    'Soll;Haben;Währung\n',
+]
+PAYEES = ['Walmart Store', 'Salary Foo Company', 'Rent', 'Bakery', 'Fuel Station']
+
+
+def write_export(path, rows):
+    with open(path, 'w', encoding='iso-8859-1') as f:
+        f.writelines(PREAMBLE)
+        for i in range(rows):
+            payee = PAYEES[i % len(PAYEES)]
+            debit = f'-{i % 900},{i % 100:02d}' if i % 5 else ''
+            credit = '' if i % 5 else f'{i % 4000}.{i % 1000:03d},00'
+            f.write(f'{i % 28 + 1:02d}.{i % 12 + 1:02d}.2024;{i % 28 + 1:02d}.{i % 12 + 1:02d}.2024;'
+                    f'Lastschrift;{payee};{payee} Ref {i};DE00;DEUTDEXX;;;;;;;;;{credit};{debit};EUR\n')
+        f.write('Kontostand;31.12.2024;;;;;;;;;;;;;;;;EUR\n')
+
+
+def run(importer, path, rows):
+    memo = SimpleNamespace(name=path)
+
+    start = time.perf_counter()
+    count = sum(1 for _ in importer.iter_extract(memo))
+    streamed = time.perf_counter() - start
+    assert count == rows, count
+    rss_streamed = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    entries = importer.extract(memo)
+    listed = time.perf_counter() - start
+    rss_listed = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    del entries
+
+    print(f"{rows:>9} rows  iter_extract {streamed:7.2f} s (peak RSS {rss_streamed / 1024:7.1f} MB)  "
+          f"extract {listed:7.2f} s (peak RSS {rss_listed / 1024:7.1f} MB)")
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    importer = DeutscheBankImporter('Assets:Checking', 'Expenses:ReplaceMe', {
+        'Salary': Target('Income:Salary', 'Foo Company'),
+        'Walmart': Target('Expenses:Food:Groceries'),
+    })
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for rows in sorted(sizes):
+            path = os.path.join(tmpdir, f'Kontoumsaetze_100_{rows}_20240101_000000.csv')
+            write_export(path, rows)
+            run(importer, path, rows)
+
+
+if __name__ == '__main__':
+    main()
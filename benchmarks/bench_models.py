@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Compare the memory of raw Comdirect transaction dicts and Transaction models.
+
+Transactions are decoded from JSON pages like the API returns them, then
+kept either as the decoded dicts or converted to slotted models.
+
+    python benchmarks/bench_models.py [rows]
+"""
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bankconnect'))
+from classes.models import Transaction  # noqa: E402
+from mock_comdirect import transaction  # noqa: E402
+
+PAGE_SIZE = 500
+
+
+def decoded_pages(n):
+    for first in range(0, n, PAGE_SIZE):
+        page = [transaction(0, i) for i in range(first, min(first + PAGE_SIZE, n))]
+        yield json.loads(json.dumps({'values': page}))['values']
+
+
+def measure(n, convert):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    kept = []
+    for page in decoded_pages(n):
+        kept.extend(convert(page))
+    elapsed = time.perf_counter() - start
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return current, elapsed
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    dicts, dict_seconds = measure(n, lambda page: page)
+    models, model_seconds = measure(
+        n, lambda page: [Transaction.from_comdirect(item, 'ACC0000') for item in page])
+
+    print(f"{n} transactions")
+    print(f"  dicts:  {dicts / 2**20:8.1f} MiB ({dicts / n:.0f} B/row), {dict_seconds:.2f} s")
+    print(f"  models: {models / 2**20:8.1f} MiB ({models / n:.0f} B/row), {model_seconds:.2f} s")
+    print(f"  reduction: {1 - models / dicts:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Time PDF statements of synthetic transaction histories.
+
+Transactions are generated oldest first (as the local store yields
+them) and handed to save_to_pdf as a generator, so rows are never held
+in a list. Peak memory is the resident set size of the process.
+
+    python benchmarks/bench_pdf.py [rows ...]
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bankconnect'))
+from classes.models import Transaction  # noqa: E402
+from utils.output import save_to_pdf  # noqa: E402
+from mock_comdirect import transaction  # noqa: E402
+
+DEFAULT_SIZES = (10_000, 100_000)
+
+
+def transactions(n):
+    for index in reversed(range(n)):
+        yield Transaction.from_comdirect(transaction(0, index), 'ACC0000')
+
+
+def measure(n, workdir):
+    filename = f'statement_{n}.pdf'
+    start = time.perf_counter()
+    save_to_pdf(transactions(n), filename, 'COMDIRECT')
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux and never goes down, so run sizes ascending
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    size = os.path.getsize(os.path.join(workdir, 'downloads', filename))
+    return elapsed, peak, size
+
+
+def main():
+    sizes = sorted(int(arg) for arg in sys.argv[1:]) or DEFAULT_SIZES
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.makedirs('downloads')
+        for n in sizes:
+            elapsed, peak, size = measure(n, workdir)
+            print(f"{n:>8} rows: {elapsed:6.2f} s, {n / elapsed:8.0f} rows/s, "
+                  f"peak RSS {peak / 2**20:6.1f} MiB, file {size / 2**20:5.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
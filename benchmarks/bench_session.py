@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Compare per-request latency of one-shot requests vs the pooled ApiClient.
+
+Runs against a local HTTPS stub server with a throwaway self-signed
+certificate, so the TLS handshake cost is part of what is measured.
+
+    python benchmarks/bench_session.py [requests]
+"""
+import json
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib3
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bankconnect'))
+from utils.api import ApiClient  # noqa: E402
+
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+BODY = json.dumps({'values': [{'accountId': str(i)} for i in range(20)]}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(tmpdir):
+    cert = os.path.join(tmpdir, 'cert.pem')
+    key = os.path.join(tmpdir, 'key.pem')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes',
+         '-keyout', key, '-out', cert, '-days', '1', '-subj', '/CN=localhost'],
+        check=True, capture_output=True
+    )
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(call, n):
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(label, timings):
+    print(f"{label:<24} mean {statistics.mean(timings):7.2f} ms  "
+          f"median {statistics.median(timings):7.2f} ms  "
+          f"p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:7.2f} ms")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as tmpdir:
+        server = start_server(tmpdir)
+        url = f"https://127.0.0.1:{server.server_address[1]}/accounts"
+
+        before = measure(lambda: requests.request(
+            'GET', url, verify=False).json(), n)
+
+        client = ApiClient(verify=False, rate_limit=None)
+        after = measure(lambda: client.request('GET', url), n)
+        client.close()
+        server.shutdown()
+
+    print(f"{n} GET requests against {url}")
+    report("requests.request", before)
+    report("ApiClient (pooled)", after)
+    print(f"speedup: {statistics.mean(before) / statistics.mean(after):.1f}x")
+
+
+if __name__ == '__main__':
+    main()
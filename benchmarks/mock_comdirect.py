@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Comdirect REST API.
+
+Emulates the OAuth token, session/validate, push-TAN status, accounts,
+balances and paged transactions endpoints with configurable latency,
+page size limits, error and 429 rates. GET responses carry an ETag and
+answer If-None-Match with 304. Transactions are generated
+deterministically per account and page, so any history size is cheap.
+
+    python benchmarks/mock_comdirect.py --port 8765 --transactions 10000
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+KDNR = '1234567890'
+SESSION_ID = 'SESSION-1'
+CHALLENGE_ID = 'CHALLENGE-1'
+LATEST_BOOKING = date(2024, 12, 31)
+PER_DAY = 3
+
+
+class MockConfig:
+    def __init__(self, accounts=5, transactions=1000, max_page_size=500,
+                 latency=0.0, error_rate=0.0, throttle_rate=0.0,
+                 tan_polls=1, seed=0):
+        self.accounts = accounts
+        self.transactions = transactions
+        self.max_page_size = max_page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.tan_polls = tan_polls
+        self.random = random.Random(seed)
+
+
+def account(index):
+    return {
+        'accountId': f'ACC{index:04d}',
+        'accountDisplayId': f'{index:010d}',
+        'currency': 'EUR',
+        'clientId': KDNR,
+        'accountType': {'key': 'CA', 'text': 'Girokonto'},
+        'iban': f'DE{index:02d}200411330{index:010d}',
+        'creditLimit': {'value': '0', 'unit': 'EUR'}
+    }
+
+
+def booking_date(index):
+    """Newest first, like the real API: PER_DAY bookings per day going back"""
+    return (LATEST_BOOKING - timedelta(days=index // PER_DAY)).isoformat()
+
+
+def matching(total, min_date):
+    """Number of transactions booked on or after min_date"""
+    if not min_date:
+        return total
+    days = (LATEST_BOOKING - date.fromisoformat(min_date)).days
+    return max(0, min(total, (days + 1) * PER_DAY))
+
+
+def transaction(account_index, index):
+    booked = booking_date(index)
+    return {
+        'reference': f'R{account_index:04d}{index:09d}',
+        'bookingStatus': 'BOOKED',
+        'bookingDate': booked,
+        'amount': {'value': f'{(index * 37) % 5000 - 2500}.{index % 100:02d}', 'unit': 'EUR'},
+        'remitter': {'holderName': f'Counterparty {index % 211}'},
+        'deptor': None,
+        'creditor': None,
+        'valutaDate': booked,
+        'directDebitCreditorId': None,
+        'directDebitMandateId': None,
+        'endToEndReference': None,
+        'newTransaction': False,
+        'remittanceInfo': f'01Payment {index} account {account_index}',
+        'transactionType': {'key': 'TRANSFER', 'text': 'Überweisung'}
+    }
+
+
+def balance(index):
+    return {
+        'account': account(index),
+        'accountId': f'ACC{index:04d}',
+        'balance': {'value': f'{index * 1000}.00', 'unit': 'EUR'},
+        'balanceEUR': {'value': f'{index * 1000}.00', 'unit': 'EUR'},
+        'availableCashAmount': {'value': f'{index * 1000}.00', 'unit': 'EUR'},
+        'availableCashAmountEUR': {'value': f'{index * 1000}.00', 'unit': 'EUR'}
+    }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    config = MockConfig()
+    polls = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        if self.command == 'GET' and status == 200:
+            etag = '"%s"' % hashlib.sha256(payload).hexdigest()[:16]
+            headers = {**(headers or {}), 'ETag': etag}
+            if self.headers.get('If-None-Match') == etag:
+                status, payload = 304, b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length).decode() if length else ''
+
+    def disrupted(self):
+        """Apply latency and injected 429/500 responses; True if handled"""
+        config = self.config
+        if config.latency:
+            time.sleep(config.latency)
+        with self.lock:
+            roll = config.random.random()
+        if roll < config.throttle_rate:
+            self.send_json(429, {'code': 'TOO_MANY_REQUESTS'}, {'Retry-After': '0.05'})
+            return True
+        if roll < config.throttle_rate + config.error_rate:
+            self.send_json(500, {'code': 'INTERNAL_ERROR'})
+            return True
+        return False
+
+    def do_POST(self):
+        body = self.read_body()
+        if self.disrupted():
+            return
+        path = urlsplit(self.path).path
+        if path == '/oauth/token':
+            grant = parse_qs(body).get('grant_type', [''])[0]
+            token = {'access_token': str(uuid.uuid4()), 'token_type': 'bearer',
+                     'refresh_token': str(uuid.uuid4()), 'expires_in': 599,
+                     'kdnr': KDNR, 'bpid': 1, 'kontaktId': 1}
+            token['scope'] = 'TWO_FACTOR' if grant == 'password' else 'BANKING_RO'
+            self.send_json(200, token)
+        elif path.endswith('/validate'):
+            MockHandler.polls = 0
+            info = {'id': CHALLENGE_ID, 'typ': 'P_TAN_PUSH',
+                    'link': {'href': f'/api/session/v1/authentications/{CHALLENGE_ID}'}}
+            self.send_json(201, {'identifier': SESSION_ID, 'sessionTanActive': True,
+                                 'activated2FA': True},
+                           {'x-once-authentication-info': json.dumps(info)})
+        else:
+            self.send_json(404, {'code': 'NOT_FOUND'})
+
+    def do_PATCH(self):
+        self.read_body()
+        if self.disrupted():
+            return
+        self.send_json(200, {'identifier': SESSION_ID, 'sessionTanActive': True,
+                             'activated2FA': True})
+
+    def do_GET(self):
+        if self.disrupted():
+            return
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        config = self.config
+        path = url.path
+
+        if path.endswith('/v1/sessions'):
+            self.send_json(200, [{'identifier': SESSION_ID, 'sessionTanActive': False,
+                                  'activated2FA': False}])
+        elif path.startswith('/api/session/v1/authentications/'):
+            with self.lock:
+                MockHandler.polls += 1
+                done = MockHandler.polls >= config.tan_polls
+            self.send_json(200, {'status': 'AUTHENTICATED' if done else 'PENDING'})
+        elif path == '/api/banking/clients/user/v2/accounts':
+            values = [account(i) for i in range(config.accounts)]
+            self.send_json(200, {'paging': {'index': 0, 'matches': len(values)},
+                                 'values': values})
+        elif path == '/api/banking/clients/user/v2/accounts/balances':
+            values = [balance(i) for i in range(config.accounts)]
+            self.send_json(200, {'paging': {'index': 0, 'matches': len(values)},
+                                 'values': values})
+        elif match := re.fullmatch(r'/api/banking/v2/accounts/ACC(\d+)/balances', path):
+            self.send_json(200, balance(int(match.group(1))))
+        elif match := re.fullmatch(r'/api/banking/v1/accounts/ACC(\d+)/transactions', path):
+            account_index = int(match.group(1))
+            first = int(query.get('paging-first', ['0'])[0])
+            count = min(int(query.get('paging-count', ['20'])[0]), config.max_page_size)
+            total = matching(config.transactions, query.get('min-bookingDate', [None])[0])
+            values = [transaction(account_index, i)
+                      for i in range(first, min(first + count, total))]
+            self.send_json(200, {'paging': {'index': first, 'matches': total},
+                                 'values': values})
+        else:
+            self.send_json(404, {'code': 'NOT_FOUND'})
+
+
+def start_mock_server(config=None, port=0):
+    """Start the mock in a background thread; returns (server, base_url)"""
+    handler = type('ConfiguredMockHandler', (MockHandler,), {'config': config or MockConfig()})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--accounts', type=int, default=5)
+    parser.add_argument('--transactions', type=int, default=1000)
+    parser.add_argument('--max-page-size', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--tan-polls', type=int, default=1)
+    args = parser.parse_args()
+
+    config = MockConfig(args.accounts, args.transactions, args.max_page_size,
+                        args.latency, args.error_rate, args.throttle_rate,
+                        args.tan_polls)
+    server, url = start_mock_server(config, args.port)
+    print(f"Mock Comdirect API listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Offline benchmark suite for ComdirectAPI against the local mock API.
+
+Measures authentication (push-TAN and cached token), full and
+incremental sync, multi-account fetch and every export format at several
+history sizes, and writes a JSON report that can be diffed between
+versions. A run can be recorded to a cassette and replayed later
+without the mock server.
+
+    python benchmarks/run.py --sizes 1000 10000 --output bench.json
+    python benchmarks/run.py --sizes 1000 --record bench.cassette.gz
+    python benchmarks/run.py --sizes 1000 --replay bench.cassette.gz
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'bankconnect'))
+
+from classes.comdirect_api import ComdirectAPI  # noqa: E402
+from utils.cassette import RECORD, REPLAY  # noqa: E402
+from utils.output import save_to_arrow, save_to_csv, save_to_parquet, save_to_pdf  # noqa: E402
+from utils.store import TransactionStore  # noqa: E402
+from utils.sync import sync_accounts  # noqa: E402
+from utils.token_cache import TokenCache  # noqa: E402
+from mock_comdirect import MockConfig, start_mock_server  # noqa: E402
+
+EXPORTS = {
+    'csv': save_to_csv,
+    'parquet': save_to_parquet,
+    'arrow': save_to_arrow,
+    'pdf': save_to_pdf,
+}
+
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_bank(base_url, workdir, cassette=None, cassette_mode=None):
+    for key in ('CLIENT_ID', 'CLIENT_SECRET', 'USERNAME', 'PIN'):
+        os.environ[f'COMDIRECT_{key}'] = 'bench'
+    os.environ['COMDIRECT_RATE_LIMIT'] = '0'
+    if cassette:
+        os.environ['COMDIRECT_CASSETTE'] = cassette
+        os.environ['COMDIRECT_CASSETTE_MODE'] = cassette_mode
+    with contextlib.redirect_stdout(io.StringIO()):
+        bank = ComdirectAPI()
+    bank.base_url = base_url
+    bank.token_cache = TokenCache('COMDIRECT', 'bench', 'bench',
+                                  os.path.join(workdir, 'tokens'))
+    return bank
+
+
+def authenticate_from_disk(bank):
+    """Authenticate like a restarted process, from the disk token cache"""
+    bank.token = None
+    bank.authenticate()
+
+
+class Suite:
+    def __init__(self, workdir):
+        self.workdir = workdir
+        self.results = []
+
+    def measure(self, scenario, size, func, bank=None):
+        before = dict(bank.client.stats) if bank else {}
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        seconds = time.perf_counter() - start
+        result = {'scenario': scenario, 'size': size, 'seconds': round(seconds, 4)}
+        if bank:
+            for key in ('requests', 'retries'):
+                result[key] = bank.client.stats[key] - before.get(key, 0)
+        self.results.append(result)
+        print(f"{scenario:<24} {size:>9}  {seconds:9.3f} s")
+
+    def run_size(self, size, args):
+        config = MockConfig(accounts=args.accounts, transactions=size,
+                            max_page_size=args.page_size, latency=args.latency,
+                            error_rate=args.error_rate, throttle_rate=args.throttle_rate)
+        if args.replay:
+            server, url = None, 'https://replay.invalid'
+        else:
+            server, url = start_mock_server(config)
+        workdir = os.path.join(self.workdir, str(size))
+        os.makedirs(os.path.join(workdir, 'downloads'))
+        os.chdir(workdir)
+        try:
+            if args.replay:
+                bank = make_bank(url, workdir, args.replay, REPLAY)
+            elif args.record:
+                bank = make_bank(url, workdir, args.record, RECORD)
+            else:
+                bank = make_bank(url, workdir)
+            self.measure('authenticate_tan', size, bank.authenticate, bank)
+            self.measure('authenticate_cached', size, lambda: authenticate_from_disk(bank), bank)
+
+            store = TransactionStore(os.path.join(workdir, 'transactions.db'))
+            self.measure('sync_full', size,
+                         lambda: sync_accounts(bank, store, 'COMDIRECT'), bank)
+            self.measure('sync_incremental', size,
+                         lambda: sync_accounts(bank, store, 'COMDIRECT'), bank)
+            store.close()
+
+            self.measure('fetch_all', size, bank.fetch_all, bank)
+
+            account_id = bank.get_account_ids()[0]
+            transactions = bank.get_transactions(account_id)
+            for name, export in EXPORTS.items():
+                if name in args.skip:
+                    continue
+                self.measure(f'export_{name}', size, lambda: export(
+                    transactions, f'bench.{name}', 'COMDIRECT'))
+            if bank.client.cassette:
+                bank.client.cassette.save()
+        finally:
+            if server:
+                server.shutdown()
+
+    def report(self, args):
+        return {
+            'version': git_version(),
+            'python': platform.python_version(),
+            'timestamp': datetime.now().isoformat(),
+            'config': {'accounts': args.accounts, 'page_size': args.page_size,
+                       'latency': args.latency, 'error_rate': args.error_rate,
+                       'throttle_rate': args.throttle_rate},
+            'results': self.results,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                        help='Transactions per account')
+    parser.add_argument('--accounts', type=int, default=5)
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added per request')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--skip', nargs='*', default=[], choices=list(EXPORTS),
+                        help='Export formats to leave out')
+    parser.add_argument('--output', default='bench_report.json')
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument('--record', help='Record the run to this cassette file')
+    cassette.add_argument('--replay', help='Replay the run from this cassette file')
+    args = parser.parse_args()
+    if (args.record or args.replay) and len(args.sizes) > 1:
+        parser.error('--record and --replay take a single --sizes value')
+    args.record = args.record and os.path.abspath(args.record)
+    args.replay = args.replay and os.path.abspath(args.replay)
+    output = os.path.abspath(args.output)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        suite = Suite(workdir)
+        for size in args.sizes:
+            suite.run_size(size, args)
+        os.chdir(ROOT)
+
+    with open(output, 'w') as f:
+        json.dump(suite.report(args), f, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == '__main__':
+    main()
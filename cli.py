@@ -1,19 +1,79 @@
 #!/usr/bin/env python3
 
 import click
+import os
 import subprocess
 import sys
-from datetime import datetime
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
 from rich.console import Console
 from rich.panel import Panel
 from rich.prompt import Prompt
+from rich.table import Table
+from beancount.parser import printer
+from bankconnect.utils.metrics import read_trace
+from lib.aggregates import refresh_aggregates
+from lib.checker import check_file
+from lib.pipeline import import_downloads
 
 console = Console()
 
 
-def run_bankconnect():
+class Profile:
+    """Per-phase timings of a run, including the bank tool's request trace
+
+    The bank tool runs in a subprocess, so its requests and auth phases
+    are collected through the JSON-lines trace it writes when
+    BANKCONNECT_TRACE_FILE is set.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.timings = defaultdict(float)
+        self.trace_file = None
+        if enabled:
+            fd, self.trace_file = tempfile.mkstemp(prefix='bankconnect-', suffix='.jsonl')
+            os.close(fd)
+            os.environ['BANKCONNECT_TRACE_FILE'] = self.trace_file
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def print_summary(self):
+        if not self.enabled:
+            return
+        summary = read_trace(self.trace_file).summary()
+        os.unlink(self.trace_file)
+
+        table = Table(title="Phase timings")
+        table.add_column("Phase")
+        table.add_column("Seconds", justify="right")
+        for name, seconds in self.timings.items():
+            table.add_row(name, f"{seconds:.3f}")
+        for row in sorted(summary['phases'], key=lambda row: row['phase']):
+            table.add_row(f"bank: {row['phase']}", f"{row['seconds']:.3f}")
+        console.print(table)
+
+        if summary['requests']:
+            table = Table(title="Requests")
+            for column in ("Endpoint", "Calls", "Seconds", "Bytes", "Retries"):
+                table.add_column(column, justify="left" if column == "Endpoint" else "right")
+            for row in summary['requests']:
+                table.add_row(f"{row['method']} {row['endpoint']}", str(row['count']),
+                              f"{row['seconds']:.3f}", str(row['bytes']), str(row['retries']))
+            console.print(table)
+
+
+def run_bankconnect(args=()):
     try:
-        subprocess.run([sys.executable, "bankconnect/main.py"], check=True)
+        subprocess.run([sys.executable, "bankconnect/main.py", *args], check=True)
     except subprocess.CalledProcessError:
         console.print("[red]Error running bankconnect[/red]")
     except KeyboardInterrupt:
@@ -21,8 +81,12 @@ def run_bankconnect():
 
 
 def run_fava(beancount_file):
+    # The ledger loads the lib.fava_aggregates extension from this checkout
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        filter(None, [root, os.environ.get('PYTHONPATH')])))
     try:
-        subprocess.run(["fava", beancount_file], check=True)
+        subprocess.run(["fava", beancount_file], check=True, env=env)
     except subprocess.CalledProcessError:
         console.print("[red]Error running fava. Is it installed?[/red]")
         console.print("[yellow]Try: pip install fava[/yellow]")
@@ -30,53 +94,65 @@ def run_fava(beancount_file):
         console.print("\n[yellow]Fava server terminated by user.[/yellow]")
 
 
+def sync_banks(banks, export_format=None):
+    """Headless incremental sync of the given banks, no menus or prompts"""
+    args = ["sync", "--banks", banks]
+    if export_format:
+        args += ["--format", export_format]
+    run_bankconnect(args)
+
+
 def check_beancount_file(file_path):
     """Validate beancount file syntax"""
-    try:
-        result = subprocess.run(
-            ["bean-check", file_path],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        console.print("[green]No errors found![/green]")
-    except subprocess.CalledProcessError as e:
+    errors, timings, parsed = check_file(file_path)
+
+    phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items())
+    console.print(f"[blue]{phases} ({len(parsed)} files re-parsed)[/blue]")
+    if errors:
         console.print("[red]Errors found:[/red]")
-        console.print(e.stderr)
+        for error in errors:
+            console.print(printer.format_error(error), markup=False)
+    else:
+        console.print("[green]No errors found![/green]")
 
 
 def import_transactions():
-    """Import transactions using bean-extract"""
-    try:
-        # First identify the files
-        result = subprocess.run(
-            ["bean-identify", "lib/import_config.py", "downloads"],
-            capture_output=True,
-            text=True
-        )
-
-        if not result.stdout.strip():
+    """Import new transactions from the downloads directory"""
+    result = import_downloads('downloads', 'ledgers')
+
+    if not result['files']:
+        if result['skipped_files']:
+            console.print(f"[yellow]All {result['skipped_files']} files in downloads were already imported[/yellow]")
+        else:
             console.print(
                 "[yellow]No files to import in downloads directory[/yellow]")
-            return
+        return
 
-        # Extract the transactions
-        result = subprocess.run(
-            ["bean-extract", "lib/import_config.py", "downloads"],
-            capture_output=True,
-            text=True
-        )
-
-        if result.stdout.strip():
-            filename = f"ledgers/imported_{
-                datetime.now().strftime('%Y%m%d')}.beancount"
-            with open(filename, 'w') as f:
-                f.write(result.stdout)
-            console.print(f"[green]Transactions imported to {
-                          filename}[/green]")
-    except subprocess.CalledProcessError as e:
-        console.print("[red]Error during import:[/red]")
-        console.print(e.stderr)
+    if result['outputs']:
+        console.print(f"[green]{result['entries']} transactions from {result['files']} files imported to {
+                      ', '.join(result['outputs'])}[/green]")
+    else:
+        console.print(f"[yellow]No new transactions in {result['files']} files[/yellow]")
+    if result['outputs']:
+        update_aggregates('ledgers/main.beancount')
+    if result['dropped']:
+        console.print(f"[yellow]Skipped {len(result['dropped'])} transactions already in the ledger:[/yellow]")
+        for entry in result['dropped']:
+            amounts = ", ".join(str(posting.units) for posting in entry.postings
+                                if posting.units is not None)
+            console.print(f"  {entry.date} {entry.payee or ''} {entry.narration or ''} {amounts}",
+                          markup=False)
+    if result['unused_rules']:
+        console.print(f"[yellow]{len(result['unused_rules'])} mapping rules matched no transaction:[/yellow]")
+        for rule in result['unused_rules']:
+            console.print(f"  {rule.field} {'~' if rule.regex else 'contains'} {rule.pattern!r}"
+                          f" -> {rule.target.account}", markup=False)
+
+
+def update_aggregates(file_path):
+    """Refresh the precomputed dashboard aggregates for changed months"""
+    touched = refresh_aggregates(file_path)
+    console.print(f"[green]Dashboard aggregates updated for {len(touched)} months[/green]")
 
 
 @click.command()
@@ -85,9 +161,23 @@ def import_transactions():
 @click.option('--file', default='ledgers/main.beancount', help='Beancount file for Fava')
 @click.option('--check', is_flag=True, help='Check beancount file syntax')
 @click.option('--import', 'import_', is_flag=True, help='Import new transactions')
-def main(fava, bank, file, check, import_):
+@click.option('--sync', is_flag=True, help='Sync banks without the interactive menu')
+@click.option('--banks', default='comdirect', help='Comma separated banks for --sync')
+@click.option('--format', 'export_format', type=click.Choice(['csv', 'parquet', 'arrow', 'pdf']),
+              help='Also export synced accounts to downloads/ in this format')
+@click.option('--aggregate', is_flag=True, help='Refresh precomputed dashboard aggregates')
+@click.option('--profile', is_flag=True, help='Print a per-phase timing summary at the end')
+def main(fava, bank, file, check, import_, sync, banks, export_format, aggregate, profile):
     """Beancount Tools CLI"""
-    if not any([fava, bank, check, import_]):
+    profile = Profile(profile)
+    try:
+        run(profile, fava, bank, file, check, import_, sync, banks, export_format, aggregate)
+    finally:
+        profile.print_summary()
+
+
+def run(profile, fava, bank, file, check, import_, sync, banks, export_format, aggregate):
+    if not any([fava, bank, check, import_, sync, aggregate]):
         options = [
             "Run Bank Connection Tool",
             "Run Fava",
@@ -104,24 +194,36 @@ def main(fava, bank, file, check, import_):
                                 str(i) for i in range(1, len(options) + 1)])
 
             if choice == "1":
-                run_bankconnect()
+                with profile.phase("bank"):
+                    run_bankconnect()
             elif choice == "2":
                 run_fava(file)
             elif choice == "3":
-                check_beancount_file(file)
+                with profile.phase("check"):
+                    check_beancount_file(file)
             elif choice == "4":
-                import_transactions()
+                with profile.phase("import"):
+                    import_transactions()
             else:
                 break
     else:
         if bank:
-            run_bankconnect()
+            with profile.phase("bank"):
+                run_bankconnect()
+        if sync:
+            with profile.phase("sync"):
+                sync_banks(banks, export_format)
         if fava:
             run_fava(file)
         if check:
-            check_beancount_file(file)
+            with profile.phase("check"):
+                check_beancount_file(file)
         if import_:
-            import_transactions()
+            with profile.phase("import"):
+                import_transactions()
+        if aggregate:
+            with profile.phase("aggregate"):
+                update_aggregates(file)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+import click
+import hashlib
+import os
+import re
+import sqlite3
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from beancount.core import amount, convert, data, prices
+from beancount.parser import booking
+from .checker import DEFAULT_CACHE_PATH, CheckCache, parse_recursive
+
+DEFAULT_STORE_PATH = os.path.join('data', 'aggregates.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS months (
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (year, month)
+);
+CREATE TABLE IF NOT EXISTS monthly (
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    account TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    date TEXT NOT NULL,
+    value TEXT NOT NULL,
+    value_currency TEXT NOT NULL,
+    PRIMARY KEY (year, month, account, tags, currency)
+);
+"""
+
+
+def month_fingerprints(entries):
+    """Hash the transactions of every month to detect which ones changed"""
+    digests = defaultdict(hashlib.sha256)
+    for entry in entries:
+        if isinstance(entry, data.Transaction):
+            postings = [(p.account, str(p.units)) for p in entry.postings]
+            digests[(entry.date.year, entry.date.month)].update(repr(
+                (entry.date, entry.payee, entry.narration, sorted(entry.tags or ()),
+                 postings)).encode())
+    return {month: digest.hexdigest() for month, digest in digests.items()}
+
+
+def _complete(posting):
+    return isinstance(posting.units, amount.Amount) and isinstance(posting.units.number, Decimal)
+
+
+def book_months(entries, months, options_map):
+    """Transactions of the given months with every posting's units filled in
+
+    Only transactions with an elided amount are booked, on their own, so
+    the rest of the ledger is never re-booked.
+    """
+    transactions = sorted((entry for entry in entries
+                           if isinstance(entry, data.Transaction)
+                           and (entry.date.year, entry.date.month) in months),
+                          key=data.entry_sortkey)
+    incomplete = [entry for entry in transactions
+                  if not all(map(_complete, entry.postings))]
+    if incomplete:
+        booked, _ = booking.book(incomplete, options_map)
+        replaced = dict(zip(map(id, incomplete), booked))
+        transactions = [replaced.get(id(entry), entry) for entry in transactions]
+    return transactions
+
+
+def _matches(row, account, exclude_account, tags, exclude_tags):
+    row_tags = set(row[1].split())
+    # Like BQL's ~, which matches case-insensitively
+    return ((not account or re.search(account, row[0], re.IGNORECASE))
+            and not (exclude_account and re.search(exclude_account, row[0], re.IGNORECASE))
+            and row_tags.issuperset(tags) and row_tags.isdisjoint(exclude_tags))
+
+
+class AggregateStore:
+    """Monthly per-account sums of a ledger, refreshed incrementally
+
+    Rows are keyed by month, account, tag set and currency. Each keeps
+    its sum in native units and its value in the operating currency at
+    the price of the row's last posting date, like the dashboards'
+    CONVERT(SUM(position), ccy, LAST(date)). Only months whose
+    transactions changed are re-summed; values are re-converted on every
+    refresh so new prices are picked up.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def refresh(self, ledger_file, cache_path=DEFAULT_CACHE_PATH):
+        """Re-sum the months touched since the last refresh; returns them"""
+        cache = CheckCache(cache_path)
+        entries, _, options_map = parse_recursive(ledger_file, cache)
+        cache.save()
+        fingerprints = month_fingerprints(entries)
+        stored = {(year, month): fingerprint for year, month, fingerprint
+                  in self.conn.execute("SELECT year, month, fingerprint FROM months")}
+
+        touched = {month for month, fingerprint in fingerprints.items()
+                   if stored.get(month) != fingerprint}
+        removed = stored.keys() - fingerprints.keys()
+
+        sums = defaultdict(Decimal)
+        dates = {}
+        for entry in book_months(entries, touched, options_map):
+            tags = ' '.join(sorted(entry.tags or ()))
+            for posting in entry.postings:
+                if not _complete(posting):
+                    continue
+                key = (entry.date.year, entry.date.month, posting.account, tags,
+                       posting.units.currency)
+                sums[key] += posting.units.number
+                dates[key] = max(dates.get(key, entry.date), entry.date)
+
+        with self.conn:
+            for year, month in touched | removed:
+                self.conn.execute(
+                    "DELETE FROM monthly WHERE year = ? AND month = ?", (year, month))
+                self.conn.execute(
+                    "DELETE FROM months WHERE year = ? AND month = ?", (year, month))
+            self.conn.executemany(
+                "INSERT INTO monthly VALUES (?, ?, ?, ?, ?, ?, ?, '', '')",
+                (key + (str(number), dates[key].isoformat())
+                 for key, number in sums.items()))
+            self.conn.executemany(
+                "INSERT INTO months VALUES (?, ?, ?)",
+                (month + (fingerprints[month],) for month in touched))
+            self.convert(entries, options_map)
+        return sorted(touched | removed)
+
+    def convert(self, entries, options_map):
+        """Update the rows whose value in the operating currency changed"""
+        operating_currency = (options_map['operating_currency'] or [None])[0]
+        price_map = prices.build_price_map(entries)
+        updates = []
+        for rowid, currency, number, last_date, value, value_currency in self.conn.execute(
+                "SELECT rowid, currency, amount, date, value, value_currency FROM monthly"):
+            units = amount.Amount(Decimal(number), currency)
+            converted = units
+            if operating_currency:
+                converted = convert.convert_amount(
+                    units, operating_currency, price_map, date.fromisoformat(last_date))
+            if (str(converted.number), converted.currency) != (value, value_currency):
+                updates.append((str(converted.number), converted.currency, rowid))
+        self.conn.executemany(
+            "UPDATE monthly SET value = ?, value_currency = ? WHERE rowid = ?", updates)
+
+    def totals(self, by='month', account=None, exclude_account=None, tags=(), exclude_tags=()):
+        """Sum converted values per month or year over the matching rows
+
+        Rows match with all of `tags` and none of `exclude_tags`.
+        Returns rows shaped like the dashboards' BQL results, e.g.
+        {'year': 2024, 'month': 1, 'value': {'EUR': Decimal('-12.50')}}.
+        """
+        groups = defaultdict(lambda: defaultdict(Decimal))
+        for row in self.conn.execute(
+                "SELECT account, tags, year, month, value, value_currency FROM monthly"):
+            if _matches(row, account, exclude_account, tags, exclude_tags):
+                key = row[2:4] if by == 'month' else row[2:3]
+                groups[key][row[5]] += Decimal(row[4])
+        return [dict(zip(('year', 'month'), key), value=dict(value))
+                for key, value in sorted(groups.items())]
+
+    def close(self):
+        self.conn.close()
+
+
+def refresh_aggregates(ledger_file, store_path=DEFAULT_STORE_PATH):
+    """Refresh the store; returns the months that were re-summed"""
+    store = AggregateStore(store_path)
+    try:
+        return store.refresh(ledger_file)
+    finally:
+        store.close()
+
+
+@click.command()
+@click.option('--file', default='ledgers/main.beancount', help='Beancount file to aggregate')
+def main(file):
+    """Refresh the precomputed monthly/yearly aggregates"""
+    touched = refresh_aggregates(file)
+    click.echo(f"Recomputed {len(touched)} months")
+
+
+if __name__ == '__main__':
+    main()
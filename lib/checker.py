@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+import copy
+import glob
+import hashlib
+import importlib.util
+import os
+import pickle
+import time
+import beancount
+from beancount import loader
+from beancount.core import data
+from beancount.ops import validation
+from beancount.parser import booking, options, parser
+
+DEFAULT_CACHE_PATH = os.path.join('data', 'check_cache.pickle')
+CACHE_VERSION = 2
+
+# Options that only describe the parsed files, which are hashed anyway
+FILE_OPTIONS = ('filename', 'include', 'input_hash', 'dcontext', 'commodities')
+
+
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class CheckCache:
+    """Per-file parse results keyed by mtime, size and content hash
+
+    Persisted as a single pickle so unchanged include files are never
+    re-parsed across runs, and the final check result is reused when no
+    file changed at all.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        self.files = {}
+        self.result = None
+        try:
+            with open(path, 'rb') as f:
+                version, self.files, self.result = pickle.load(f)
+            if version != CACHE_VERSION:
+                self.files, self.result = {}, None
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError):
+            pass
+        self.parsed = []
+
+    def parse(self, filename):
+        """Return (entries, errors, options_map) for a file, parsing only on change"""
+        stat = os.stat(filename)
+        cached = self.files.get(filename)
+        if cached and (cached['mtime'], cached['size']) == (stat.st_mtime, stat.st_size):
+            return cached['result']
+
+        sha256 = file_sha256(filename)
+        if cached and cached['sha256'] == sha256:
+            cached['mtime'] = stat.st_mtime
+            return cached['result']
+
+        result = parser.parse_file(filename)
+        self.files[filename] = {'mtime': stat.st_mtime, 'size': stat.st_size,
+                                'sha256': sha256, 'result': result}
+        self.parsed.append(filename)
+        return result
+
+    def fingerprint(self, filenames):
+        return tuple((name, self.files[name]['sha256']) for name in sorted(filenames))
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'wb') as f:
+            pickle.dump((CACHE_VERSION, self.files, self.result), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def plugin_fingerprint(name):
+    """Hash of a plugin module's source, or None if it is not a plain file"""
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or not spec.origin or not os.path.isfile(spec.origin):
+        return None
+    return file_sha256(spec.origin)
+
+
+def result_key(cache, options_map):
+    """Key of a check result: the files, their options, plugins and beancount
+
+    Plugin code and the beancount version can change the result without
+    any ledger file changing, so both are part of the key.
+    """
+    settings = {name: value for name, value in options_map.items()
+                if name not in FILE_OPTIONS}
+    plugins = tuple((name, config, plugin_fingerprint(name))
+                    for name, config in options_map['plugin'])
+    return (cache.fingerprint(options_map['include']), beancount.__version__,
+            repr(sorted(settings.items())), plugins)
+
+
+def parse_recursive(filename, cache):
+    """Parse a ledger and its includes like beancount's loader, via the cache"""
+    entries, errors = [], []
+    options_map = None
+    stack = [os.path.normpath(os.path.abspath(filename))]
+    seen = set()
+
+    while stack:
+        filename = stack.pop(0)
+        if filename in seen:
+            errors.append(loader.LoadError(
+                data.new_metadata("<load>", 0),
+                f'Duplicate filename parsed: "{filename}"', None))
+            continue
+        if not os.path.exists(filename):
+            errors.append(loader.LoadError(
+                data.new_metadata("<load>", 0),
+                f'File "{filename}" does not exist', None))
+            continue
+        seen.add(filename)
+
+        src_entries, src_errors, src_options_map = cache.parse(filename)
+        entries.extend(src_entries)
+        errors.extend(src_errors)
+        if options_map is None:
+            # Copied because it is updated below and the cache keeps it
+            options_map = copy.deepcopy(src_options_map)
+        else:
+            loader.aggregate_options_map(options_map, src_options_map)
+
+        cwd = os.path.dirname(filename)
+        for include in src_options_map['include']:
+            matched = glob.glob(os.path.join(cwd, include), recursive=True)
+            if not matched:
+                errors.append(loader.LoadError(
+                    data.new_metadata("<load>", 0),
+                    f'File glob "{include}" does not match any files', None))
+            stack.extend(os.path.normpath(name) for name in matched)
+
+    if options_map is None:
+        options_map = options.OPTIONS_DEFAULTS.copy()
+    options_map['include'] = sorted(seen)
+    return entries, errors, options_map
+
+
+def check_file(filename, cache_path=DEFAULT_CACHE_PATH):
+    """Load and validate a ledger in-process, reusing cached parses
+
+    Returns (errors, timings, parsed_files) where timings maps each phase
+    to seconds and parsed_files lists the files that had to be re-parsed.
+    """
+    cache = CheckCache(cache_path)
+    timings = {}
+
+    start = time.perf_counter()
+    entries, errors, options_map = parse_recursive(filename, cache)
+    timings['parse'] = time.perf_counter() - start
+
+    fingerprint = result_key(cache, options_map)
+    if cache.result and cache.result[0] == fingerprint:
+        cache.save()
+        return cache.result[1], timings, cache.parsed
+
+    start = time.perf_counter()
+    entries.sort(key=data.entry_sortkey)
+    entries, booking_errors = booking.book(entries, options_map)
+    errors.extend(booking_errors)
+    timings['booking'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    entries, errors = loader.run_transformations(entries, errors, options_map, None)
+    timings['plugins'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    errors.extend(validation.validate(entries, options_map))
+    timings['validation'] = time.perf_counter() - start
+
+    cache.result = (fingerprint, errors)
+    cache.save()
+    return errors, timings, cache.parsed
@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 import os
 import re
-import codecs
 import csv
 import datetime
+import itertools
 from beancount.core import number, data, amount
 from beancount.ingest import importer
+from .matcher import Matcher, LAST_MATCH
 
 
 class Target(object):
@@ -16,10 +17,11 @@ class Target(object):
 
 
 class DeutscheBankImporter(importer.ImporterProtocol):
-    def __init__(self, account, default, mapping):
+    def __init__(self, account, default, mapping, match_mode=LAST_MATCH):
         self.account = account
         self.default = default
         self.mapping = mapping
+        self.matcher = Matcher(mapping, match_mode)
 
     def identify(self, fname):
         return re.match(r"Kontoumsaetze_\d+_\d+_\d+_\d+.csv",
@@ -29,18 +31,21 @@ class DeutscheBankImporter(importer.ImporterProtocol):
         return self.account
 
     def extract(self, fname):
-        fp = codecs.open(fname.name, 'r', 'iso-8859-1')
-        lines = fp.readlines()
+        return list(self.iter_extract(fname))
 
-        # drop top and bottom stuff
-        lines = lines[5:]
-        lines = lines[:-1]
-        entries = []
+    def iter_rows(self, fname):
+        """Read the export incrementally, skipping the 5-line preamble and
+        the trailing footer line without loading the whole file"""
+        with open(fname.name, 'r', encoding='iso-8859-1', newline='') as fp:
+            lines = drop_footer(itertools.islice(fp, 5, None))
+            yield from csv.reader(lines, delimiter=';')
 
+    def iter_extract(self, fname):
+        """Yield transactions one row at a time"""
         def fix_decimals(s):
             return s.replace('.', '').replace(',', '.')
 
-        for index, row in enumerate(csv.reader(lines, delimiter=';')):
+        for index, row in enumerate(self.iter_rows(fname)):
             meta = data.new_metadata(fname.name, index)
             date = datetime.datetime.strptime(row[0], '%d.%m.%Y').date()
             desc = row[4]
@@ -48,25 +53,24 @@ class DeutscheBankImporter(importer.ImporterProtocol):
             credit = fix_decimals(row[15]) if row[15] != '' else None
             debit = fix_decimals(row[16]) if row[16] != '' else None
             currency = row[17]
-            account = self.default
             num = number.D(credit if credit else debit)
             units = amount.Amount(num, currency)
 
-            for p, t in self.mapping.items():
-                if p in desc:
-                    account = t.account
-
-                    if t.narration:
-                        desc = t.narration
-
-                    if t.payee:
-                        payee = t.payee
+            account, payee, desc = self.matcher.resolve(
+                desc, payee, self.default)
 
             frm = data.Posting(self.account, units, None, None, None, None)
             to = data.Posting(account, -units, None, None, None, None)
             txn = data.Transaction(meta, date, "*", payee, desc,
                                    data.EMPTY_SET, data.EMPTY_SET, [frm, to])
 
-            entries.append(txn)
+            yield txn
+
 
-        return entries
+def drop_footer(lines):
+    """Yield all lines but the last one, holding back a single line"""
+    previous = None
+    for line in lines:
+        if previous is not None:
+            yield previous
+        previous = line
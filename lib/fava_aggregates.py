@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+import os
+from flask import jsonify, request
+from fava.ext import FavaExtensionBase, extension_endpoint
+from .aggregates import AggregateStore
+
+
+class FavaAggregates(FavaExtensionBase):
+    """Serve lib.aggregates totals to the fava_dashboards panels
+
+    Configured with the store path relative to the ledger, e.g.
+    custom "fava-extension" "lib.fava_aggregates" "{'store': '../data/aggregates.db'}"
+    """
+
+    @extension_endpoint
+    def totals(self):
+        """Answer like a dashboards BQL query grouped by year (and month)"""
+        config = self.config or {}
+        path = os.path.join(os.path.dirname(self.ledger.beancount_file_path),
+                            config.get('store', os.path.join('..', 'data', 'aggregates.db')))
+        store = AggregateStore(path)
+        try:
+            rows = store.totals(by=request.args.get('by', 'month'),
+                                account=request.args.get('account'),
+                                exclude_account=request.args.get('exclude_account'),
+                                tags=request.args.getlist('tag'),
+                                exclude_tags=request.args.getlist('exclude_tag'))
+        finally:
+            store.close()
+        for row in rows:
+            row['value'] = {currency: float(number) for currency, number in row['value'].items()}
+        return jsonify({'data': {'result': rows}})
@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
-from .deutschebank import DeutscheBankImporter
-from beancount.ingest.importers.config import Target
+from .deutschebank import DeutscheBankImporter, Target
 
 # Define your mappings
 mappings = {
@@ -8,6 +7,16 @@ mappings = {
     'Walmart': Target('Expenses:Food:Groceries'),
 }
 
+# Mappings can also be a list of rules, matching the payee field, using
+# regexes or priorities (pass match_mode='priority' to the importer), e.g.
+# from .matcher import Rule
+#
+# mappings = [
+#     Rule('Salary', Target('Assets:Income', 'Foo Company')),
+#     Rule('Walmart', Target('Expenses:Food:Groceries'), field='payee'),
+#     Rule(r'REWE|EDEKA', Target('Expenses:Food:Groceries'), regex=True),
+# ]
+
 # Configure the importer
 CONFIG = [
     DeutscheBankImporter('Assets:Checking', 'Expenses:ReplaceMe', mappings)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import glob
+import os
+import re
+from itertools import groupby
+from beancount.core import data
+from beancount.parser import printer
+from .moneymoney import date_regex, sort_file
+
+include_regex = re.compile(r'^include\s+"([^"]+)"')
+
+TAIL_BYTES = 64 * 1024
+
+
+def last_date(path):
+    """Return the date of the last dated line in a file, reading only its tail"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            offset = size
+            while offset > 0:
+                offset = max(0, offset - TAIL_BYTES)
+                f.seek(offset)
+                lines = f.read(size - offset).decode('utf-8', 'replace').splitlines()
+                if offset:
+                    lines = lines[1:]
+                for line in reversed(lines):
+                    match = date_regex.match(line)
+                    if match:
+                        return match.group(1)
+    except FileNotFoundError:
+        pass
+    return None
+
+
+class LedgerWriter:
+    """Route entries into per-year (optionally per-account) ledger shards
+
+    Shards are named like the existing yearly files, ledgers/2024.beancount,
+    or ledgers/2024/Assets-Checking.beancount when by_account is set. New
+    entries are appended when they are not older than the shard's last
+    entry; otherwise only that shard is re-sorted. The main file gets an
+    include line for every shard it does not include yet.
+    """
+
+    def __init__(self, ledger_dir='ledgers', main_file='main.beancount', by_account=False):
+        self.ledger_dir = ledger_dir
+        self.main_path = os.path.join(ledger_dir, main_file)
+        self.by_account = by_account
+
+    def shard_for(self, entry):
+        year = str(entry.date.year)
+        if self.by_account and isinstance(entry, data.Transaction) and entry.postings:
+            account = entry.postings[0].account.replace(':', '-')
+            return os.path.join(year, f'{account}.beancount')
+        return f'{year}.beancount'
+
+    def write(self, entries):
+        """Write entries to their shards; returns {shard path: entry count}"""
+        entries = sorted(entries, key=lambda entry: (self.shard_for(entry), entry.date))
+        written = {}
+        for shard, shard_entries in groupby(entries, key=self.shard_for):
+            shard_entries = list(shard_entries)
+            self.write_shard(os.path.join(self.ledger_dir, shard), shard_entries)
+            written[os.path.join(self.ledger_dir, shard)] = len(shard_entries)
+        self.update_includes(written)
+        return written
+
+    def write_shard(self, path, entries):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        previous = last_date(path)
+        text = ''.join('\n' + printer.format_entry(entry) for entry in entries)
+        with open(path, 'a') as f:
+            f.write(text)
+
+        if previous and entries[0].date.isoformat() < previous:
+            sort_file(path, path)
+
+    def update_includes(self, shards):
+        """Add include lines for shards the main file does not include yet
+
+        Glob includes such as include "2024/*.beancount" are expanded the
+        way beancount's loader does, so their files count as included.
+        """
+        try:
+            with open(self.main_path, 'r') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            lines = []
+
+        main_dir = os.path.dirname(self.main_path)
+        included = set()
+        for match in map(include_regex.match, lines):
+            if match:
+                pattern = os.path.join(main_dir, match.group(1))
+                included.add(os.path.normpath(pattern))
+                included.update(os.path.normpath(path)
+                                for path in glob.glob(pattern, recursive=True))
+        missing = sorted(os.path.relpath(shard, main_dir) for shard in shards
+                         if os.path.normpath(shard) not in included)
+        if not missing:
+            return
+
+        position = max((i + 1 for i, line in enumerate(lines) if include_regex.match(line)),
+                       default=len(lines))
+        if lines and not lines[position - 1].endswith('\n'):
+            lines[position - 1] += '\n'
+        lines[position:position] = [f'include "{shard}"\n' for shard in missing]
+        with open(self.main_path, 'w') as f:
+            f.writelines(lines)
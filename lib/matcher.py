@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import re
+from collections import deque
+
+FIRST_MATCH = 'first'
+LAST_MATCH = 'last'
+PRIORITY = 'priority'
+
+
+class Rule(object):
+    def __init__(self, pattern, target, field='narration', regex=False, priority=0):
+        self.pattern = pattern
+        self.target = target
+        self.field = field
+        self.regex = regex
+        self.priority = priority
+        self.hits = 0
+
+
+class AhoCorasick(object):
+    """Find all patterns occurring in a text in a single pass over it"""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append(index)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + \
+                    self.output[self.fail[child]]
+
+    def search(self, text):
+        """Return the set of indexes of all patterns found in text"""
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class Matcher(object):
+    """Mapping rules compiled into one automaton per matched field
+
+    mapping is either the classic {substring: Target} dict or a list of
+    Rule objects, which may also match the payee field or use regexes.
+    When several rules match, mode decides which one wins: 'first' and
+    'last' by definition order, 'priority' by the highest Rule.priority.
+    Only the winning rule is applied and counted in Rule.hits; payee and
+    narration it does not set are kept from the bank data.
+    """
+
+    def __init__(self, mapping, mode=LAST_MATCH):
+        if isinstance(mapping, dict):
+            mapping = [Rule(p, t) for p, t in mapping.items()]
+        self.rules = list(mapping)
+        self.mode = mode
+
+        self.automata = {}
+        self.regexes = []
+        for field in ('narration', 'payee'):
+            indexes = [i for i, rule in enumerate(self.rules)
+                       if rule.field == field and not rule.regex]
+            self.automata[field] = (indexes, AhoCorasick(
+                [self.rules[i].pattern for i in indexes]))
+        for i, rule in enumerate(self.rules):
+            if rule.regex:
+                self.regexes.append((i, rule.field, re.compile(rule.pattern)))
+
+    def match(self, narration, payee=''):
+        """Return the matching rules, from lowest to highest precedence"""
+        texts = {'narration': narration or '', 'payee': payee or ''}
+        matched = set()
+        for field, (indexes, automaton) in self.automata.items():
+            matched.update(indexes[i] for i in automaton.search(texts[field]))
+        for i, field, regex in self.regexes:
+            if regex.search(texts[field]):
+                matched.add(i)
+
+        if self.mode == PRIORITY:
+            order = sorted(matched, key=lambda i: (self.rules[i].priority, -i))
+        else:
+            order = sorted(matched, reverse=self.mode == FIRST_MATCH)
+        return [self.rules[i] for i in order]
+
+    def resolve(self, narration, payee, default_account):
+        """Apply the winning rule; returns (account, payee, narration)"""
+        matched = self.match(narration, payee)
+        if not matched:
+            return default_account, payee, narration
+        rule = matched[-1]
+        rule.hits += 1
+        return (rule.target.account, rule.target.payee or payee,
+                rule.target.narration or narration)
+
+    def unused(self):
+        """Rules that have not matched anything yet"""
+        return [rule for rule in self.rules if not rule.hits]
+
+    def report(self):
+        """Return (rule, hits) pairs, least used first, to spot dead rules"""
+        return sorted(((rule, rule.hits) for rule in self.rules),
+                      key=lambda pair: pair[1])
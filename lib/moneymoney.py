@@ -1,38 +1,145 @@
 #!/usr/bin/env python3
+import click
+import heapq
+import os
+import pickle
 import re
-from datetime import datetime
-
-with open('file.beancount', 'r') as file:
-    lines = file.readlines()
+import shutil
+import tempfile
 
 date_regex = re.compile(r'^(\d{4}-\d{2}-\d{2})')
 
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+
+def read_blocks(lines):
+    """Group lines into (date, lines) blocks
 
-def extract_date(transaction):
-    for line in transaction:
+    A dated line starts a dated block, any other top-level line (option,
+    include, plugin or org header) starts an undated block with date None.
+    Indented and blank lines belong to the current block. Comment lines
+    directly above a top-level line move with its block; comments
+    followed by a blank line stay in place as an undated block. Every
+    line ends in a newline, also the last one of a file without it, so
+    blocks can be moved around.
+    """
+    date, block, comments = None, [], []
+    for line in lines:
+        if not line.endswith('\n'):
+            line += '\n'
+        if line.startswith(';'):
+            comments.append(line)
+            continue
         match = date_regex.match(line)
-        if match:
-            return datetime.strptime(match.group(1), '%Y-%m-%d')
-    return datetime.min
+        if match or (line.strip() and not line[0].isspace()):
+            if block:
+                yield date, block
+            date, block = (match.group(1) if match else None), comments + [line]
+            comments = []
+            continue
+        if comments and not line.strip():
+            if block:
+                yield date, block
+            date, block = None, comments
+        else:
+            # A comment between the postings of an entry stays inside it
+            block.extend(comments)
+        comments = []
+        block.append(line)
+    if block:
+        yield date, block
+    if comments:
+        yield None, comments
+
+
+def write_run(blocks):
+    """Spill a sorted run of (date, seq, lines) blocks to a temp file"""
+    run = tempfile.TemporaryFile()
+    for block in sorted(blocks):
+        pickle.dump(block, run)
+    run.seek(0)
+    return run
+
+
+def read_run(run):
+    while True:
+        try:
+            yield pickle.load(run)
+        except EOFError:
+            return
+
+
+def sort_ledger(lines, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """Yield lines with dated blocks stably sorted by date
+
+    Undated blocks keep their position in the block sequence. Dated blocks
+    are collected up to memory_budget bytes, spilled as sorted runs to
+    temporary files and k-way merged.
+    """
+    undated = {}
+    runs = []
+    buffer, buffered = [], 0
+    slots = 0
+
+    for date, block in read_blocks(lines):
+        if date is None:
+            undated[slots] = block
+        else:
+            buffer.append((date, slots, block))
+            buffered += sum(len(line) for line in block)
+            if buffered >= memory_budget:
+                runs.append(write_run(buffer))
+                buffer, buffered = [], 0
+        slots += 1
+
+    try:
+        merged = heapq.merge(*(read_run(run) for run in runs), sorted(buffer))
+        for slot in range(slots):
+            if slot in undated:
+                yield from undated[slot]
+            else:
+                yield from next(merged)[2]
+    finally:
+        for run in runs:
+            run.close()
 
 
-transactions = []
-current_transaction = []
+def sort_file(input_file, output, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """Write the sorted input file to output, which may be the input itself
 
-for line in lines:
-    if date_regex.match(line) and current_transaction:
-        transactions.append(current_transaction)
-        current_transaction = [line]
-    else:
-        current_transaction.append(line)
+    output is replaced atomically and keeps the input's permissions; if
+    sorting fails it is left untouched and no temp file remains.
+    """
+    directory = os.path.dirname(os.path.abspath(output))
+    with open(input_file, 'r') as infile, \
+            tempfile.NamedTemporaryFile('w', dir=directory, delete=False) as outfile:
+        try:
+            outfile.writelines(sort_ledger(infile, memory_budget))
+            outfile.close()
+            # NamedTemporaryFile is created 0600, keep the ledger's permissions
+            shutil.copymode(input_file, outfile.name)
+            os.replace(outfile.name, output)
+        except BaseException:
+            outfile.close()
+            os.unlink(outfile.name)
+            raise
 
-if current_transaction:
-    transactions.append(current_transaction)
 
-transactions = [t for t in transactions if extract_date(t) != datetime.min]
+@click.command()
+@click.argument('input_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('-o', '--output', help='Output file (default: sorted_<input>)')
+@click.option('--in-place', is_flag=True, help='Replace the input file')
+@click.option('--memory-budget', default=DEFAULT_MEMORY_BUDGET, show_default=True,
+              help='Bytes of entries to sort in memory before spilling to disk')
+def main(input_file, output, in_place, memory_budget):
+    """Sort the entries of a beancount file by date"""
+    if in_place:
+        output = input_file
+    elif not output:
+        directory, name = os.path.split(input_file)
+        output = os.path.join(directory, f'sorted_{name}')
 
-transactions.sort(key=extract_date)
+    sort_file(input_file, output, memory_budget)
 
-with open('sorted_file.beancount', 'w') as file:
-    for transaction in transactions:
-        file.writelines(transaction)
+if __name__ == '__main__':
+    main()
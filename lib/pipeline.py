@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+import glob
+import hashlib
+import importlib
+import io
+import os
+import sqlite3
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+from beancount.core import amount, data
+from beancount.ingest import cache
+from beancount.parser import parser, printer
+from .ledger_writer import LedgerWriter
+
+DEFAULT_CONFIG = 'lib.import_config'
+DEFAULT_STATE_PATH = os.path.join('data', 'imports.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS imported_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    sha256 TEXT NOT NULL,
+    imported_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_imported_files_sha256 ON imported_files (sha256);
+CREATE TABLE IF NOT EXISTS ledger_files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ledger_hashes (
+    path TEXT NOT NULL,
+    tx_hash TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (path, tx_hash)
+);
+CREATE INDEX IF NOT EXISTS idx_ledger_hashes ON ledger_hashes (tx_hash);
+"""
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def entry_hash(entry):
+    """Identity of a transaction independent of where it was imported from
+
+    Uses date, payee, narration and the postings that carry an explicit
+    amount, so re-imports of the same bank line hash identically.
+    """
+    postings = sorted(
+        (p.account, str(p.units.number), p.units.currency)
+        for p in entry.postings
+        if isinstance(p.units, amount.Amount) and isinstance(p.units.number, Decimal)
+    )
+    key = repr((entry.date.isoformat(), entry.payee, entry.narration, postings))
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+_importers = None
+
+
+def _init_worker(config_module):
+    global _importers
+    _importers = importlib.import_module(config_module).CONFIG
+
+
+def _rule_hits(importer):
+    matcher = getattr(importer, 'matcher', None)
+    return [rule.hits for rule in matcher.rules] if matcher else []
+
+
+def _extract_file(path, importer_index):
+    """Extract a download; also returns the rule hits it added in this worker"""
+    importer = _importers[importer_index]
+    before = _rule_hits(importer)
+    entries = importer.extract(cache.get_file(path))
+    return entries, [after - hits for after, hits in zip(_rule_hits(importer), before)]
+
+
+class ImportState:
+    """Persisted fingerprints of imported downloads and ledger transactions"""
+
+    def __init__(self, path=DEFAULT_STATE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self._migrate()
+        self.conn.executescript(SCHEMA)
+
+    def _migrate(self):
+        """Drop ledger hashes stored without counts; they are rebuilt on refresh"""
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(ledger_hashes)")]
+        if columns and 'count' not in columns:
+            with self.conn:
+                self.conn.execute("DROP TABLE ledger_hashes")
+                self.conn.execute("DROP TABLE IF EXISTS ledger_files")
+
+    def is_imported(self, path):
+        """Check size+mtime first and fall back to the content hash"""
+        stat = os.stat(path)
+        row = self.conn.execute(
+            "SELECT size, mtime FROM imported_files WHERE path = ?", (path,)
+        ).fetchone()
+        if row and row == (stat.st_size, stat.st_mtime):
+            return True
+        return self.conn.execute(
+            "SELECT 1 FROM imported_files WHERE sha256 = ? AND size = ?",
+            (file_sha256(path), stat.st_size)
+        ).fetchone() is not None
+
+    def mark_imported(self, path):
+        stat = os.stat(path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO imported_files VALUES (?, ?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime, file_sha256(path),
+             datetime.now().isoformat())
+        )
+
+    def refresh_ledger(self, ledger_dir):
+        """Re-hash only ledger files that changed since the last run"""
+        known = dict(self.conn.execute("SELECT path, mtime FROM ledger_files"))
+        current = {path: os.stat(path).st_mtime for path in
+                   glob.glob(os.path.join(ledger_dir, '**', '*.beancount'), recursive=True)}
+
+        with self.conn:
+            for path in known.keys() - current.keys():
+                self.conn.execute("DELETE FROM ledger_files WHERE path = ?", (path,))
+                self.conn.execute("DELETE FROM ledger_hashes WHERE path = ?", (path,))
+            for path, mtime in current.items():
+                if known.get(path) == mtime:
+                    continue
+                entries, _, _ = parser.parse_file(path)
+                counts = Counter(entry_hash(entry) for entry in entries
+                                 if isinstance(entry, data.Transaction))
+                self.conn.execute("DELETE FROM ledger_hashes WHERE path = ?", (path,))
+                self.conn.executemany(
+                    "INSERT INTO ledger_hashes VALUES (?, ?, ?)",
+                    ((path, tx_hash, count) for tx_hash, count in counts.items())
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO ledger_files VALUES (?, ?)", (path, mtime))
+
+    def known_counts(self, hashes):
+        """How often each of the hashes occurs in the whole ledger"""
+        hashes = list(hashes)
+        found = Counter()
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            found.update(dict(self.conn.execute(
+                f"SELECT tx_hash, SUM(count) FROM ledger_hashes "
+                f"WHERE tx_hash IN ({','.join('?' * len(chunk))}) GROUP BY tx_hash",
+                chunk)))
+        return found
+
+    def close(self):
+        self.conn.close()
+
+
+def identify(importers, downloads_dir):
+    """Yield (path, importer index) for every download an importer accepts"""
+    for path in sorted(glob.glob(os.path.join(downloads_dir, '**', '*'), recursive=True)):
+        if not os.path.isfile(path):
+            continue
+        memo = cache.get_file(path)
+        for index, importer in enumerate(importers):
+            if importer.identify(memo):
+                yield path, index
+                break
+
+
+def import_downloads(downloads_dir='downloads', ledger_dir='ledgers',
+                     config_module=DEFAULT_CONFIG, output=None,
+                     state_path=DEFAULT_STATE_PATH, max_workers=None,
+                     by_account=False):
+    """Import new downloads into the ledger, skipping known files and entries
+
+    Transactions are deduplicated by count, not by presence: identical
+    bookings (same date, payee, narration and amounts) are imported as
+    often as the download holding most of them has them, minus how often
+    the ledger already has them. So two equal purchases on one day are
+    both kept, while overlapping downloads do not import anything twice.
+
+    New entries go to the yearly ledger shards (see LedgerWriter), or all
+    into `output` if given. Returns a dict with the written files,
+    files/new/duplicate counts, the skipped transactions in 'dropped' and
+    the mapping rules that matched nothing in 'unused_rules'.
+    """
+    importers = importlib.import_module(config_module).CONFIG
+    state = ImportState(state_path)
+    result = {'outputs': [], 'files': 0, 'skipped_files': 0,
+              'entries': 0, 'duplicates': 0, 'dropped': [], 'unused_rules': []}
+    try:
+        pending = []
+        for path, index in identify(importers, downloads_dir):
+            if state.is_imported(path):
+                result['skipped_files'] += 1
+            else:
+                pending.append((path, index))
+        if not pending:
+            return result
+
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                 initargs=(config_module,)) as executor:
+            extracted = []
+            for (_, index), (entries, hits) in zip(pending, executor.map(
+                    _extract_file, *zip(*pending))):
+                extracted.append(entries)
+                if hits:
+                    for rule, count in zip(importers[index].matcher.rules, hits):
+                        rule.hits += count
+        used = {index for _, index in pending}
+        result['unused_rules'] = [rule for index in sorted(used)
+                                  if getattr(importers[index], 'matcher', None)
+                                  for rule in importers[index].matcher.unused()]
+
+        state.refresh_ledger(ledger_dir)
+        new_entries, dropped = [], []
+        candidates = {}
+        for entries in extracted:
+            in_file = {}
+            for entry in entries:
+                if isinstance(entry, data.Transaction):
+                    in_file.setdefault(entry_hash(entry), []).append(entry)
+                else:
+                    new_entries.append(entry)
+            # Overlapping downloads repeat the same bookings, so per hash the
+            # file with the most occurrences stands for all of them
+            for tx_hash, found in in_file.items():
+                best = candidates.setdefault(tx_hash, found)
+                if len(found) > len(best):
+                    candidates[tx_hash], found = found, best
+                if found is not candidates[tx_hash]:
+                    dropped.extend(found)
+        known = state.known_counts(candidates)
+        for tx_hash, found in candidates.items():
+            keep = max(0, len(found) - known[tx_hash])
+            new_entries.extend(found[:keep])
+            dropped.extend(found[keep:])
+        dropped.sort(key=data.entry_sortkey)
+        result['dropped'] = dropped
+        result['duplicates'] = len(dropped)
+        new_entries.sort(key=data.entry_sortkey)
+
+        if new_entries and output:
+            buffer = io.StringIO()
+            printer.print_entries(new_entries, file=buffer)
+            with open(output, 'a') as f:
+                f.write(buffer.getvalue())
+            result['outputs'] = [output]
+        elif new_entries:
+            writer = LedgerWriter(ledger_dir, by_account=by_account)
+            result['outputs'] = sorted(writer.write(new_entries))
+
+        with state.conn:
+            for path, _ in pending:
+                state.mark_imported(path)
+        state.refresh_ledger(ledger_dir)
+
+        result['files'] = len(pending)
+        result['entries'] = len(new_entries)
+        return result
+    finally:
+        state.close()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# bankconnect/main.py runs with its own directory on sys.path ("from utils...")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bankconnect'))
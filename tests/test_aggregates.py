@@ -0,0 +1,112 @@
+from decimal import Decimal
+import pytest
+from beancount import loader
+from beancount.query import query
+from lib.aggregates import AggregateStore
+
+LEDGER = """option "operating_currency" "EUR"
+
+2024-01-01 open Assets:Bank
+2024-01-01 open Assets:Dollars
+2024-01-01 open Expenses:Food:Groceries
+2024-01-01 open Expenses:Travel
+2024-01-01 open Income:Salary
+
+2024-01-01 price USD 0.90 EUR
+2024-02-15 price USD 0.80 EUR
+
+2024-01-05 * "Employer" "Salary"
+  Income:Salary  -2000.00 EUR
+  Assets:Bank
+
+2024-01-10 * "REWE" "Groceries"
+  Expenses:Food:Groceries  45.10 EUR
+  Assets:Bank
+
+2024-01-20 * "Airline" "Flight" #travel
+  Expenses:Travel  300.00 USD
+  Assets:Dollars
+
+2024-02-20 * "Hotel" "Hotel" #travel
+  Expenses:Travel  100.00 USD
+  Assets:Dollars
+
+2024-02-21 * "EDEKA" "Groceries"
+  Expenses:Food:Groceries  30.00 EUR
+  Assets:Bank
+"""
+
+BQL = """SELECT year, month, CONVERT(SUM(position), 'EUR', LAST(date)) AS value
+WHERE account ~ '{account}' {tags} GROUP BY year, month"""
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    path = tmp_path / 'main.beancount'
+    path.write_text(LEDGER)
+    return path
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = AggregateStore(str(tmp_path / 'aggregates.db'))
+    yield store
+    store.close()
+
+
+def refresh(store, ledger):
+    return store.refresh(str(ledger), str(ledger.parent / 'cache.pickle'))
+
+
+def bql(ledger, account, tags=''):
+    entries, _, options_map = loader.load_file(str(ledger))
+    _, rows = query.run_query(entries, options_map, BQL.format(account=account, tags=tags))
+    return [{'year': row.year, 'month': row.month,
+             'value': {pos.units.currency: pos.units.number for pos in row.value}}
+            for row in rows]
+
+
+@pytest.mark.parametrize('account, tags, options', [
+    ('^Expenses:', "AND NOT 'travel' IN tags", {'exclude_tags': ['travel']}),
+    ('^Expenses:', "AND 'travel' IN tags", {'tags': ['travel']}),
+    ('^Income:', '', {}),
+])
+def test_totals_match_the_dashboard_queries(ledger, store, account, tags, options):
+    refresh(store, ledger)
+    assert store.totals(account=account, **options) == bql(ledger, account, tags)
+
+
+def test_elided_amounts_are_filled_in(ledger, store):
+    refresh(store, ledger)
+    assert store.totals(account='^Assets:Dollars') == [
+        {'year': 2024, 'month': 1, 'value': {'EUR': Decimal('-270.0000')}},
+        {'year': 2024, 'month': 2, 'value': {'EUR': Decimal('-80.0000')}},
+    ]
+
+
+def test_only_changed_months_are_recomputed(ledger, store):
+    assert refresh(store, ledger) == [(2024, 1), (2024, 2)]
+    assert refresh(store, ledger) == []
+
+    with open(ledger, 'a') as f:
+        f.write('\n2024-03-02 * "REWE" "Groceries"\n'
+                '  Expenses:Food:Groceries  12.00 EUR\n  Assets:Bank\n')
+    assert refresh(store, ledger) == [(2024, 3)]
+    assert store.totals(by='year', account='^Expenses:Food') == [
+        {'year': 2024, 'value': {'EUR': Decimal('87.10')}}]
+
+    ledger.write_text(LEDGER)
+    assert refresh(store, ledger) == [(2024, 3)]
+    assert [row['month'] for row in store.totals()] == [1, 2]
+
+
+def test_new_prices_reconvert_without_recomputing(ledger, store):
+    refresh(store, ledger)
+    with open(ledger, 'a') as f:
+        f.write('\n2024-01-15 price USD 0.50 EUR\n')
+
+    assert refresh(store, ledger) == []
+    assert store.totals(tags=['travel'], account='^Expenses:') == bql(
+        ledger, '^Expenses:', "AND 'travel' IN tags")
+    assert store.totals(tags=['travel'], account='^Expenses:')[0]['value'] == {
+        'EUR': Decimal('150.0000')}
@@ -0,0 +1,49 @@
+import io
+import json
+import requests
+from utils.api import ApiClient
+from utils.metrics import JsonLinesTrace, read_trace
+
+BODY = json.dumps({'paging': {'matches': 3}, 'values': [{'id': 1}, {'id': 2}, {'id': 3}]}).encode()
+
+
+def client_serving(body, headers=None):
+    client = ApiClient(rate_limit=0)
+
+    def request(method, url, stream=False, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.headers.update(headers or {})
+        response.raw = io.BytesIO(body)
+        if not stream:
+            response.content
+        return response
+
+    client.session.request = request
+    return client
+
+
+def test_streamed_body_is_counted_without_content_length(tmp_path):
+    client = client_serving(BODY)
+    trace = JsonLinesTrace(str(tmp_path / 'trace.jsonl'))
+    client.add_hook(trace)
+    meta = {}
+    items = list(client.iter_json('GET', 'https://bank.test/accounts/A1/transactions',
+                                  meta=meta, chunk_size=7))
+    trace.close()
+
+    assert [item['id'] for item in items] == [1, 2, 3]
+    assert meta['paging'] == {'matches': 3}
+    [row] = read_trace(str(tmp_path / 'trace.jsonl')).summary()['requests']
+    assert (row['endpoint'], row['count'], row['bytes']) == ('/accounts/{id}/transactions', 1, len(BODY))
+
+
+def test_plain_request_counts_decoded_body(tmp_path):
+    client = client_serving(BODY)
+    trace = JsonLinesTrace(str(tmp_path / 'trace.jsonl'))
+    client.add_hook(trace)
+    assert client.request('GET', 'https://bank.test/accounts')['paging'] == {'matches': 3}
+    trace.close()
+
+    [row] = read_trace(str(tmp_path / 'trace.jsonl')).summary()['requests']
+    assert (row['count'], row['bytes']) == (1, len(BODY))
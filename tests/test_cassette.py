@@ -0,0 +1,80 @@
+import json
+import pytest
+import requests
+from utils.api import ApiClient
+from utils.cassette import RECORD, REPLAY, Cassette, CassetteMiss
+
+TOKEN = {'access_token': 'secret-access-token', 'refresh_token': 'secret-refresh-token',
+         'expires_in': 599}
+ACCOUNTS = {'values': [{'accountId': 'ACCOUNT-123456', 'iban': 'DE89370400440532013000'}]}
+
+
+def response(status, payload):
+    result = requests.Response()
+    result.status_code = status
+    result.reason = 'OK'
+    result.headers['Content-Type'] = 'application/json'
+    result._content = json.dumps(payload).encode()
+    return result
+
+
+def record(path, answers):
+    cassette = Cassette(str(path), RECORD)
+    client = ApiClient(rate_limit=0, cassette=cassette)
+    client.session.request = lambda method, url, **kwargs: answers.pop(0)
+    client.request('POST', 'https://api.bank.test/oauth/token', data={'grant_type': 'password'})
+    client.request('GET', 'https://api.bank.test/accounts?paging-first=0')
+    for _ in range(2):
+        client.send('GET', 'https://api.bank.test/session/status')
+    client.request('GET', 'https://api.bank.test/sessions')
+    client.request('PATCH', 'https://api.bank.test/sessions/session-identifier-1')
+    cassette.save()
+
+
+@pytest.fixture
+def cassette_path(tmp_path):
+    path = tmp_path / 'cassettes' / 'session.json.gz'
+    record(path, [
+        response(200, TOKEN),
+        response(200, ACCOUNTS),
+        response(200, {'status': 'PENDING'}),
+        response(200, {'status': 'AUTHENTICATED'}),
+        response(200, [{'identifier': 'session-identifier-1'}]),
+        response(200, {'identifier': 'session-identifier-1', 'activated2FA': True}),
+    ])
+    return path
+
+
+def test_recording_is_sanitized(cassette_path):
+    text = json.dumps(Cassette(str(cassette_path), REPLAY).interactions)
+    for secret in ('secret-access-token', 'secret-refresh-token', 'session-identifier-1',
+                   'DE89370400440532013000'):
+        assert secret not in text
+    assert 'REDACTED-access_token-' in text
+
+
+def test_replay_answers_without_network(cassette_path):
+    client = ApiClient(rate_limit=0, cassette=Cassette(str(cassette_path), REPLAY))
+    client.session.request = None
+
+    token = client.request('POST', 'https://other.host/oauth/token',
+                           data={'grant_type': 'password', 'password': 'ignored'})
+    assert token['access_token'].startswith('REDACTED-access_token-')
+    accounts = client.request('GET', 'https://api.bank.test/accounts', params={'paging-first': 0})
+    assert accounts['values'][0]['iban'].startswith('DE') and \
+        len(accounts['values'][0]['iban']) == len('DE89370400440532013000')
+
+    # Repeated requests come back in recorded order, the last one repeating
+    statuses = [client.send('GET', 'https://api.bank.test/session/status').json()['status']
+                for _ in range(3)]
+    assert statuses == ['PENDING', 'AUTHENTICATED', 'AUTHENTICATED']
+
+    # Ids learned from earlier responses are redacted in later request URLs too
+    [session] = client.request('GET', 'https://api.bank.test/sessions')
+    assert session['identifier'].startswith('REDACTED-identifier-')
+    activated = client.request('PATCH', f"https://api.bank.test/sessions/{session['identifier']}")
+    assert activated['activated2FA'] is True
+
+    with pytest.raises(CassetteMiss):
+        client.request('GET', 'https://api.bank.test/unknown')
+    assert client.stats['replayed'] == 8
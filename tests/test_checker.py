@@ -0,0 +1,54 @@
+import sys
+import pytest
+from lib import checker
+from lib.checker import check_file
+
+LEDGER = """plugin "bc_test_plugin"
+option "operating_currency" "EUR"
+
+2024-01-01 open Assets:Bank
+"""
+
+PLUGIN = """import collections
+__plugins__ = ['run']
+Error = collections.namedtuple('Error', 'source message entry')
+
+
+def run(entries, options_map):
+    return entries, [Error(None, message, None) for message in MESSAGES]
+
+MESSAGES = {messages!r}
+"""
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    (tmp_path / 'bc_test_plugin.py').write_text(PLUGIN.format(messages=[]))
+    path = tmp_path / 'main.beancount'
+    path.write_text(LEDGER)
+    yield path
+    sys.modules.pop('bc_test_plugin', None)
+
+
+def check(ledger):
+    errors, timings, _ = check_file(str(ledger), str(ledger.parent / 'cache.pickle'))
+    return [error.message for error in errors], 'plugins' in timings
+
+
+def test_unchanged_ledger_reuses_the_result(ledger):
+    assert check(ledger) == ([], True)
+    assert check(ledger) == ([], False)
+
+
+def test_changed_plugin_code_invalidates_the_result(ledger):
+    check(ledger)
+    (ledger.parent / 'bc_test_plugin.py').write_text(PLUGIN.format(messages=['bad']))
+    sys.modules.pop('bc_test_plugin', None)
+    assert check(ledger) == (['bad'], True)
+
+
+def test_beancount_version_is_part_of_the_key(ledger, monkeypatch):
+    check(ledger)
+    monkeypatch.setattr(checker.beancount, '__version__', '0.0.0')
+    assert check(ledger) == ([], True)
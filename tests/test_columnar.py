@@ -0,0 +1,68 @@
+import json
+import os
+from decimal import Decimal
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.parquet as pq  # noqa: E402
+from utils.output import SCHEMA_SAMPLE_SIZE, save_to_arrow, save_to_parquet  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def downloads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('downloads')
+    return tmp_path / 'downloads'
+
+
+def comdirect(index, value='1.00', **extra):
+    return {'reference': f'R{index}', 'bookingStatus': 'BOOKED', 'bookingDate': '2024-01-02',
+            'amount': {'value': value, 'unit': 'EUR'}, 'newTransaction': False, **extra}
+
+
+def test_more_decimal_places_than_the_sample_are_rounded(downloads):
+    rows = [comdirect(i) for i in range(SCHEMA_SAMPLE_SIZE)]
+    rows.append(comdirect(999, '0.123456789'))
+    save_to_parquet(rows, 'out.parquet', 'COMDIRECT')
+    table = pq.read_table(downloads / 'out.parquet')
+    assert table.schema.field('amount_value').type == pa.decimal128(38, 4)
+    assert table.column('amount_value')[-1].as_py() == Decimal('0.1235')
+
+
+def test_scale_is_taken_from_the_sample(downloads):
+    save_to_parquet([comdirect(0, '1.000001'), comdirect(1, '2.5')], 'out.parquet', 'COMDIRECT')
+    values = pq.read_table(downloads / 'out.parquet').column('amount_value').to_pylist()
+    assert values == [Decimal('1.000001'), Decimal('2.500000')]
+
+
+def test_values_not_matching_the_inferred_type_go_to_extra(downloads):
+    rows = [comdirect(i) for i in range(SCHEMA_SAMPLE_SIZE)]
+    rows.append(comdirect(999, 'n/a', newTransaction='yes'))
+    save_to_arrow(rows, 'out.arrow', 'COMDIRECT')
+    with pa.ipc.open_file(downloads / 'out.arrow') as reader:
+        table = reader.read_all()
+    assert table.column('newTransaction').to_pylist()[-1] is None
+    assert table.column('amount_value').to_pylist()[-1] is None
+    assert json.loads(table.column('extra').to_pylist()[-1]) == \
+        {'newTransaction': 'yes', 'amount_value': 'n/a'}
+    assert table.column('extra').to_pylist()[0] is None
+
+
+def test_nested_values_are_written_as_json(downloads):
+    rows = [{'id': 1, 'details': {'a': 1, 'b': [1, 2]}}]
+    save_to_parquet(rows, 'out.parquet', 'OTHER')
+    table = pq.read_table(downloads / 'out.parquet')
+    assert json.loads(table.column('details')[0].as_py()) == {'a': 1, 'b': [1, 2]}
+
+
+def test_failed_export_leaves_no_file(downloads):
+    save_to_parquet([comdirect(0)], 'out.parquet', 'COMDIRECT')
+    before = (downloads / 'out.parquet').read_bytes()
+
+    def broken():
+        yield comdirect(1)
+        raise RuntimeError('connection lost')
+
+    save_to_parquet(broken(), 'out.parquet', 'COMDIRECT')
+    assert os.listdir(downloads) == ['out.parquet']
+    assert (downloads / 'out.parquet').read_bytes() == before
@@ -0,0 +1,120 @@
+import logging
+import sys
+import time
+import pytest
+import requests
+from classes.comdirect_api import ComdirectAPI
+from utils import token_cache
+from utils.resilience import CircuitOpenError
+from utils.token_cache import TokenCache
+
+
+def http_error(status, body):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body.encode()
+    return requests.HTTPError(response=response)
+
+
+def token(name, expires_in=600):
+    return {'access_token': name, 'refresh_token': f'refresh-{name}', 'expires_in': expires_in}
+
+
+@pytest.fixture
+def bank(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for key in ('CLIENT_ID', 'CLIENT_SECRET', 'USERNAME', 'PIN'):
+        monkeypatch.setenv(f'COMDIRECT_{key}', 'test')
+    bank = ComdirectAPI()
+    bank.token_cache = TokenCache('COMDIRECT', 'test', 'pin', str(tmp_path / 'tokens'))
+    bank.tan_runs = 0
+    bank.refresh_result = token('refreshed')
+
+    def authenticate_with_tan(on_progress=None):
+        bank.tan_runs += 1
+        bank.access_token = f'tan-{bank.tan_runs}'
+        return token(bank.access_token)
+
+    def request(method, url, headers=None, data=None, **kwargs):
+        assert data['grant_type'] == 'refresh_token'
+        if isinstance(bank.refresh_result, Exception):
+            raise bank.refresh_result
+        return bank.refresh_result
+
+    bank.authenticate_with_tan = authenticate_with_tan
+    bank.client.request = request
+    return bank
+
+
+def expire_token(bank):
+    bank.token['expires_at'] = time.time()
+
+
+def test_valid_token_skips_tan(bank):
+    bank.authenticate()
+    bank.access_token = None
+    bank.authenticate()
+    assert bank.tan_runs == 1
+    assert bank.access_token == 'tan-1'
+
+
+def test_new_instance_uses_the_disk_cache(bank):
+    bank.authenticate()
+    bank.token = bank.access_token = None
+    bank.authenticate()
+    assert bank.tan_runs == 1
+    assert bank.access_token == 'tan-1'
+
+
+def test_without_disk_cache_the_token_is_kept_in_memory(bank):
+    bank.token_cache = TokenCache('COMDIRECT', 'test', None)
+    bank.authenticate()
+    bank.authenticate()
+    assert bank.tan_runs == 1
+
+    bank.keep_alive(within=3600)
+    assert bank.access_token == 'refreshed'
+    bank.authenticate()
+    assert bank.tan_runs == 1
+
+
+def test_expired_token_is_refreshed(bank):
+    bank.authenticate()
+    expire_token(bank)
+    bank.authenticate()
+    assert bank.tan_runs == 1
+    assert bank.access_token == 'refreshed'
+    assert bank.token_cache.load()['expires_at'] > time.time()
+
+
+@pytest.mark.parametrize('error', [
+    http_error(503, '{"error": "unavailable"}'),
+    CircuitOpenError('circuit open'),
+    requests.ConnectionError('reset'),
+])
+def test_transient_refresh_errors_keep_the_token(bank, error):
+    bank.authenticate()
+    expire_token(bank)
+    bank.refresh_result = error
+    with pytest.raises(type(error)):
+        bank.authenticate()
+    assert bank.tan_runs == 1
+    assert bank.token_cache.load()['refresh_token'] == 'refresh-tan-1'
+
+
+def test_invalid_grant_falls_back_to_tan(bank):
+    bank.authenticate()
+    expire_token(bank)
+    bank.refresh_result = http_error(400, '{"error": "invalid_grant"}')
+    bank.authenticate()
+    assert bank.tan_runs == 2
+    assert bank.token_cache.load()['access_token'] == 'tan-2'
+
+
+def test_missing_cryptography_disables_the_cache_with_one_warning(tmp_path, monkeypatch, caplog):
+    monkeypatch.setitem(sys.modules, 'cryptography.fernet', None)
+    monkeypatch.setattr(token_cache, '_warned', False)
+    with caplog.at_level(logging.WARNING, logger='utils.token_cache'):
+        caches = [TokenCache('COMDIRECT', 'test', 'pin', str(tmp_path)) for _ in range(2)]
+    assert not any(cache.enabled for cache in caches)
+    assert len(caplog.records) == 1
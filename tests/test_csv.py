@@ -0,0 +1,42 @@
+import csv
+import json
+import pytest
+from utils.output import SCHEMA_SAMPLE_SIZE, save_to_csv
+
+
+@pytest.fixture
+def downloads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'downloads').mkdir()
+    return tmp_path / 'downloads'
+
+
+def read(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def test_columns_are_the_union_of_the_sampled_records(downloads):
+    save_to_csv([{'id': 1, 'name': 'Giro'}, {'id': 2, 'iban': 'DE00', 'owner': {'name': 'A'}}],
+                'accounts.csv')
+    rows = read(downloads / 'accounts.csv')
+    assert list(rows[0]) == ['iban', 'id', 'name', 'owner']
+    assert rows[0] == {'iban': '', 'id': '1', 'name': 'Giro', 'owner': ''}
+    assert rows[1]['iban'] == 'DE00' and rows[1]['owner']
+
+
+def test_fields_after_the_sample_are_refused(downloads, capsys):
+    records = [{'id': index} for index in range(SCHEMA_SAMPLE_SIZE)] + [{'id': 'x', 'late': 1}]
+    save_to_csv(iter(records), 'accounts.csv')
+    assert 'late' in capsys.readouterr().out
+
+
+def test_comdirect_fields_after_the_sample_go_to_extra(downloads):
+    records = [{'reference': f'R{index}', 'bookingDate': '2024-01-01'}
+               for index in range(SCHEMA_SAMPLE_SIZE)]
+    records.append({'reference': 'late', 'bookingDate': '2024-01-02', 'note': 'n'})
+    save_to_csv({'values': records}, 'transactions.csv', 'COMDIRECT')
+    rows = read(downloads / 'transactions.csv')
+    assert len(rows) == SCHEMA_SAMPLE_SIZE + 1
+    assert json.loads(rows[-1]['extra']) == {'note': 'n'}
+    assert rows[0]['extra'] == ''
@@ -0,0 +1,103 @@
+import json
+import os
+import time
+import requests
+from utils.api import ApiClient
+from utils.http_cache import ResponseCache
+
+URL = 'https://api.bank.test/accounts'
+ACCOUNTS = {'values': [{'accountId': 'A1', 'iban': 'DE89370400440532013000'}]}
+
+
+class Server:
+    """Answers with ETag "v1" and a 304 when the client already has it"""
+
+    def __init__(self, client):
+        self.requests = []
+        self.payload = ACCOUNTS
+        self.etag = '"v1"'
+        client.session.request = self
+
+    def __call__(self, method, url, headers=None, **kwargs):
+        self.requests.append(headers or {})
+        response = requests.Response()
+        if (headers or {}).get('If-None-Match') == self.etag:
+            response.status_code = 304
+            response._content = b''
+        else:
+            response.status_code = 200
+            response.headers['ETag'] = self.etag
+            response._content = json.dumps(self.payload).encode()
+        return response
+
+
+def test_fresh_entries_are_served_and_stale_ones_revalidated():
+    client = ApiClient(rate_limit=0)
+    server = Server(client)
+
+    assert client.request('GET', URL, cache_ttl=60) == ACCOUNTS
+    assert client.request('GET', URL, cache_ttl=60) == ACCOUNTS
+    assert len(server.requests) == 1
+
+    # Once stale the entry is revalidated and a 304 makes it fresh again
+    next(iter(client.cache.entries.values())).stored_at -= 120
+    assert client.request('GET', URL, cache_ttl=60) == ACCOUNTS
+    assert server.requests[-1]['If-None-Match'] == '"v1"'
+    assert client.request('GET', URL, cache_ttl=60) == ACCOUNTS
+    assert len(server.requests) == 2
+
+    # A changed resource replaces the entry, force_refresh skips freshness
+    server.payload, server.etag = {'values': []}, '"v2"'
+    assert client.request('GET', URL, cache_ttl=60, force_refresh=True) == {'values': []}
+    assert client.request('GET', URL, cache_ttl=60) == {'values': []}
+    assert len(server.requests) == 3
+    assert (client.stats['cache_hits'], client.stats['cache_misses'],
+            client.stats['cache_revalidated']) == (3, 3, 1)
+
+
+def test_users_do_not_share_entries():
+    client = ApiClient(rate_limit=0)
+    server = Server(client)
+    client.cache_namespace = 'BANK:alice'
+    client.request('GET', URL, cache_ttl=60)
+    client.cache_namespace = 'BANK:bob'
+    client.request('GET', URL, cache_ttl=60)
+    assert len(server.requests) == 2
+
+
+def test_persisted_cache_is_encrypted(tmp_path):
+    path = str(tmp_path / 'cache' / 'http.bin')
+    client = ApiClient(rate_limit=0, cache=ResponseCache(path=path, secret='1234'))
+    Server(client)
+    client.request('GET', URL, cache_ttl=60)
+
+    with open(path, 'rb') as f:
+        content = f.read()
+    assert b'DE89370400440532013000' not in content and b'accountId' not in content
+    assert os.stat(path).st_mode & 0o777 == 0o600
+
+    reloaded = ResponseCache(path=path, secret='1234')
+    [entry] = reloaded.entries.values()
+    assert json.loads(entry.body) == ACCOUNTS and entry.etag == '"v1"' and entry.fresh
+    assert not ResponseCache(path=path, secret='0000').entries
+
+
+def test_cache_without_secret_stays_in_memory(tmp_path):
+    path = tmp_path / 'http.bin'
+    cache = ResponseCache(path=str(path), secret=None)
+    client = ApiClient(rate_limit=0, cache=cache)
+    Server(client)
+    client.request('GET', URL, cache_ttl=60)
+    assert len(cache.entries) == 1
+    assert not path.exists()
+
+
+def test_touch_refreshes_an_entry():
+    cache = ResponseCache()
+    client = ApiClient(rate_limit=0, cache=cache)
+    Server(client)
+    client.request('GET', URL, cache_ttl=1)
+    [key] = cache.entries
+    cache.entries[key].stored_at = time.time() - 10
+    assert cache.touch(key, 60).fresh
+    assert cache.touch('missing', 60) is None
@@ -0,0 +1,61 @@
+import json
+import pytest
+from utils.json_stream import iter_json_array
+
+DOCUMENT = {
+    'paging': {'index': 0, 'matches': 3},
+    'values': [
+        {'reference': 'R1', 'amount': {'value': '-12.50', 'unit': 'EUR'}, 'tags': [1, [2, 3]]},
+        {'reference': 'R2', 'remittanceInfo': 'Überweisung für Café ☕', 'count': 1234567890},
+        {'reference': 'R3', 'amount': None, 'rate': -1.5e-3, 'booked': True},
+    ],
+    'aggregated': {'total': 3},
+}
+
+
+def chunked(data, size):
+    return (data[start:start + size] for start in range(0, len(data), size))
+
+
+def decode(data, size, key='values'):
+    meta = {}
+    return list(iter_json_array(chunked(data, size), key, meta)), meta
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 1 << 16])
+def test_every_chunking_decodes_like_json_loads(size):
+    data = json.dumps(DOCUMENT, ensure_ascii=False, indent=1).encode()
+    items, meta = decode(data, size)
+    assert items == DOCUMENT['values']
+    assert meta == {'paging': DOCUMENT['paging'], 'aggregated': DOCUMENT['aggregated']}
+
+
+def test_number_split_at_a_chunk_boundary():
+    data = b'{"values": [1234567890, 98.76, -1.5e-3]}'
+    for size in range(1, len(data) + 1):
+        assert decode(data, size)[0] == [1234567890, 98.76, -1.5e-3]
+
+
+def test_items_are_yielded_before_the_stream_ends():
+    def chunks():
+        yield b'{"values": [{"id": 1}, '
+        raise AssertionError('read past the first item')
+
+    assert next(iter_json_array(chunks())) == {'id': 1}
+
+
+def test_empty_missing_and_non_array_keys():
+    assert decode(b'{"values": [], "paging": {}}', 4) == ([], {'paging': {}})
+    assert decode(b'{"paging": {"matches": 0}}', 4) == ([], {'paging': {'matches': 0}})
+    assert decode(b'{"values": null}', 4) == ([], {'values': None})
+    assert decode(b'{"rows": [1, 2]}', 3, key='rows') == ([1, 2], {})
+
+
+@pytest.mark.parametrize('data', [
+    b'{"values": [{"id": 1}, {"id": 2',
+    b'{"values": [1, 2',
+    b'[{"id": 1}]',
+])
+def test_malformed_or_truncated_streams_raise(data):
+    with pytest.raises(ValueError):
+        decode(data, 5)
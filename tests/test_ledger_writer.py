@@ -0,0 +1,72 @@
+import datetime
+import os
+from decimal import Decimal
+from beancount.core import data
+from beancount.core.amount import Amount
+import pytest
+from lib import moneymoney
+from lib.ledger_writer import LedgerWriter
+
+
+def transaction(date, account, number):
+    meta = data.new_metadata('test', 0)
+    postings = [
+        data.Posting(account, Amount(Decimal(number), 'EUR'), None, None, None, None),
+        data.Posting('Expenses:Food', Amount(-Decimal(number), 'EUR'), None, None, None, None),
+    ]
+    return data.Transaction(meta, date, '*', 'Shop', 'Food', frozenset(), frozenset(), postings)
+
+
+def test_new_shards_get_include_lines(tmp_path):
+    (tmp_path / 'main.beancount').write_text('option "title" "Test"\ninclude "2023.beancount"\n')
+    LedgerWriter(str(tmp_path)).write([
+        transaction(datetime.date(2023, 5, 1), 'Assets:Bank', '-1'),
+        transaction(datetime.date(2024, 5, 1), 'Assets:Bank', '-2'),
+    ])
+    assert (tmp_path / 'main.beancount').read_text() == (
+        'option "title" "Test"\ninclude "2023.beancount"\ninclude "2024.beancount"\n')
+
+
+def test_glob_includes_cover_their_shards(tmp_path):
+    main = 'include "2024/*.beancount"\n'
+    (tmp_path / 'main.beancount').write_text(main)
+    writer = LedgerWriter(str(tmp_path), by_account=True)
+    written = writer.write([
+        transaction(datetime.date(2024, 5, 1), 'Assets:Bank', '-1'),
+        transaction(datetime.date(2024, 5, 2), 'Assets:Cash', '-2'),
+    ])
+    assert sorted(written) == [str(tmp_path / '2024' / 'Assets-Bank.beancount'),
+                               str(tmp_path / '2024' / 'Assets-Cash.beancount')]
+    assert (tmp_path / 'main.beancount').read_text() == main
+
+    writer.write([transaction(datetime.date(2025, 1, 1), 'Assets:Bank', '-3')])
+    assert (tmp_path / 'main.beancount').read_text() == \
+        main + 'include "2025/Assets-Bank.beancount"\n'
+
+
+def test_resorted_shard_keeps_its_mode(tmp_path):
+    writer = LedgerWriter(str(tmp_path))
+    writer.write([transaction(datetime.date(2024, 5, 1), 'Assets:Bank', '-1')])
+    shard = tmp_path / '2024.beancount'
+    os.chmod(shard, 0o644)
+
+    writer.write([transaction(datetime.date(2024, 1, 1), 'Assets:Bank', '-2')])
+
+    text = shard.read_text()
+    assert text.index('2024-01-01') < text.index('2024-05-01')
+    assert os.stat(shard).st_mode & 0o777 == 0o644
+    assert sorted(os.listdir(tmp_path)) == ['2024.beancount', 'main.beancount']
+
+
+def test_failed_resort_leaves_no_temp_file(tmp_path, monkeypatch):
+    writer = LedgerWriter(str(tmp_path))
+    writer.write([transaction(datetime.date(2024, 5, 1), 'Assets:Bank', '-1')])
+
+    def broken(lines, memory_budget):
+        raise OSError('disk full')
+        yield
+
+    monkeypatch.setattr(moneymoney, 'sort_ledger', broken)
+    with pytest.raises(OSError):
+        writer.write([transaction(datetime.date(2024, 1, 1), 'Assets:Bank', '-2')])
+    assert sorted(os.listdir(tmp_path)) == ['2024.beancount', 'main.beancount']
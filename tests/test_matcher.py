@@ -0,0 +1,55 @@
+from lib.deutschebank import Target
+from lib.matcher import FIRST_MATCH, LAST_MATCH, PRIORITY, AhoCorasick, Matcher, Rule
+
+
+def rules():
+    return [
+        Rule('REWE', Target('Expenses:Groceries', payee='REWE Markt')),
+        Rule('REWE Tankstelle', Target('Expenses:Fuel'), priority=5),
+        Rule(r'Miete \d{4}', Target('Expenses:Rent', narration='Rent'), regex=True),
+        Rule('Stadtwerke', Target('Expenses:Utilities'), field='payee'),
+    ]
+
+
+def test_aho_corasick_finds_overlapping_patterns():
+    automaton = AhoCorasick(['he', 'she', 'his', 'hers'])
+    assert automaton.search('ushers') == {0, 1, 3}
+    assert automaton.search('nothing') == set()
+
+
+def test_dict_mapping_matches_substrings():
+    matcher = Matcher({'Salary': Target('Assets:Income', 'Foo Company')})
+    assert matcher.resolve('Salary March', 'ACME', 'Expenses:Unknown') == \
+        ('Assets:Income', 'Foo Company', 'Salary March')
+    assert matcher.resolve('Other', 'ACME', 'Expenses:Unknown') == \
+        ('Expenses:Unknown', 'ACME', 'Other')
+
+
+def test_modes_pick_one_winner():
+    text = 'REWE Tankstelle 123'
+    assert Matcher(rules(), LAST_MATCH).resolve(text, 'x', 'D')[0] == 'Expenses:Fuel'
+    assert Matcher(rules(), FIRST_MATCH).resolve(text, 'x', 'D')[0] == 'Expenses:Groceries'
+    assert Matcher(rules(), PRIORITY).resolve(text, 'x', 'D')[0] == 'Expenses:Fuel'
+
+
+def test_losing_rules_do_not_leak_payee_or_count_hits():
+    matcher = Matcher(rules(), PRIORITY)
+    account, payee, narration = matcher.resolve('REWE Tankstelle 123', 'Bank payee', 'D')
+    assert (account, payee, narration) == ('Expenses:Fuel', 'Bank payee', 'REWE Tankstelle 123')
+    assert [rule.hits for rule in matcher.rules] == [0, 1, 0, 0]
+
+
+def test_regex_and_payee_rules():
+    matcher = Matcher(rules())
+    assert matcher.resolve('Miete 2024', '', 'D') == ('Expenses:Rent', '', 'Rent')
+    assert matcher.resolve('Abschlag', 'Stadtwerke Bonn', 'D')[0] == 'Expenses:Utilities'
+    assert matcher.resolve('Stadtwerke', 'Someone', 'D')[0] == 'D'
+
+
+def test_report_and_unused():
+    matcher = Matcher(rules())
+    matcher.resolve('REWE 1', '', 'D')
+    matcher.resolve('REWE 2', '', 'D')
+    assert [rule.pattern for rule in matcher.unused()] == \
+        ['REWE Tankstelle', r'Miete \d{4}', 'Stadtwerke']
+    assert matcher.report()[-1] == (matcher.rules[0], 2)
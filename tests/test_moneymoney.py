@@ -0,0 +1,93 @@
+import os
+import pytest
+from click.testing import CliRunner
+from lib import moneymoney
+from lib.moneymoney import read_blocks, sort_ledger
+
+LEDGER = """option "title" "Test"
+
+2024-03-02 * "Shop" "Third"
+  Assets:Bank  -3.00 EUR
+  Expenses:Food
+
+; Second, booked late
+2024-02-01 * "Shop" "Second"
+  Assets:Bank  -2.00 EUR
+  ; split below
+  Expenses:Food
+
+;; Section header
+
+2024-01-15 * "Shop" "First"
+  Assets:Bank  -1.00 EUR
+  Expenses:Food
+
+2024-01-15 balance Assets:Bank  -1.00 EUR
+"""
+
+
+def narrations(lines):
+    return [line.split('"')[3] for line in lines if line.startswith('2024') and '*' in line]
+
+
+@pytest.mark.parametrize('budget', [1, 10 ** 6])
+def test_sorts_by_date_in_memory_and_with_spilled_runs(budget):
+    lines = list(sort_ledger(LEDGER.splitlines(True), memory_budget=budget))
+
+    assert narrations(lines) == ['First', 'Second', 'Third']
+    assert sorted(lines) == sorted(LEDGER.splitlines(True))
+    # Undated blocks keep their slot, equal dates keep their order
+    text = ''.join(lines)
+    assert lines[0] == 'option "title" "Test"\n'
+    assert text.index('"First"') < text.index('balance') < text.index('Section header') \
+        < text.index('"Second"')
+
+
+def test_comment_moves_with_the_entry_below_it():
+    lines = ''.join(sort_ledger(LEDGER.splitlines(True), memory_budget=1))
+    assert '; Second, booked late\n2024-02-01 * "Shop" "Second"\n' in lines
+    assert '  Assets:Bank  -2.00 EUR\n  ; split below\n  Expenses:Food\n' in lines
+
+
+def test_blocks():
+    blocks = list(read_blocks(LEDGER.splitlines(True)))
+    assert [date for date, _ in blocks] == [
+        None, '2024-03-02', '2024-02-01', None, '2024-01-15', '2024-01-15']
+    assert blocks[3][1] == [';; Section header\n', '\n']
+
+
+def test_in_place_keeps_the_file_mode(tmp_path):
+    ledger = tmp_path / 'main.beancount'
+    ledger.write_text(LEDGER)
+    os.chmod(ledger, 0o644)
+
+    result = CliRunner().invoke(moneymoney.main, [str(ledger), '--in-place'])
+
+    assert result.exit_code == 0, result.output
+    assert narrations(ledger.read_text().splitlines(True)) == ['First', 'Second', 'Third']
+    assert os.stat(ledger).st_mode & 0o777 == 0o644
+    assert os.listdir(tmp_path) == ['main.beancount']
+
+
+def test_failed_sort_leaves_no_temp_file(tmp_path, monkeypatch):
+    ledger = tmp_path / 'main.beancount'
+    ledger.write_text(LEDGER)
+
+    def broken(lines, memory_budget):
+        yield next(iter(lines))
+        raise OSError('disk full')
+
+    monkeypatch.setattr(moneymoney, 'sort_ledger', broken)
+    result = CliRunner().invoke(moneymoney.main, [str(ledger), '--in-place'])
+
+    assert isinstance(result.exception, OSError)
+    assert ledger.read_text() == LEDGER
+    assert os.listdir(tmp_path) == ['main.beancount']
+
+
+def test_last_entry_without_newline_is_not_glued_to_the_next():
+    ledger = ('2024-02-01 * "B"\n  Assets:Cash -1 EUR\n  Expenses:X\n\n'
+              '2024-01-01 * "A"\n  Assets:Cash -5 EUR\n  Expenses:Y')
+    assert ''.join(sort_ledger(ledger.splitlines(True))) == (
+        '2024-01-01 * "A"\n  Assets:Cash -5 EUR\n  Expenses:Y\n'
+        '2024-02-01 * "B"\n  Assets:Cash -1 EUR\n  Expenses:X\n\n')
@@ -0,0 +1,99 @@
+import os
+from beancount.core import data
+from beancount.ingest import importer
+from beancount.parser import parser
+from lib.deutschebank import Target
+from lib.matcher import Matcher, Rule
+from lib.pipeline import import_downloads
+
+
+class BeancountImporter(importer.ImporterProtocol):
+    """Downloads that already are beancount text, run through a Matcher"""
+
+    def __init__(self):
+        self.matcher = Matcher([Rule('Coffee', Target('Expenses:Food')),
+                                Rule('Gym', Target('Expenses:Sport'))])
+
+    def identify(self, file):
+        return file.name.endswith('.bean')
+
+    def extract(self, file):
+        entries, _, _ = parser.parse_file(file.name)
+        for entry in entries:
+            if isinstance(entry, data.Transaction):
+                self.matcher.resolve(entry.narration, entry.payee, 'Expenses:Unknown')
+        return entries
+
+
+CONFIG = [BeancountImporter()]
+
+COFFEE = '''
+2024-03-01 * "Cafe" "Coffee"
+  Assets:Checking  -3.50 EUR
+  Expenses:Food
+'''
+RENT = '''
+2024-03-02 * "Landlord" "Rent"
+  Assets:Checking  -900.00 EUR
+  Expenses:Rent
+'''
+
+
+def download(tmp_path, name, *entries):
+    os.makedirs(tmp_path / 'downloads', exist_ok=True)
+    (tmp_path / 'downloads' / name).write_text(''.join(entries))
+
+
+def run(tmp_path):
+    ledgers = tmp_path / 'ledgers'
+    os.makedirs(ledgers, exist_ok=True)
+    return import_downloads(str(tmp_path / 'downloads'), str(ledgers),
+                            config_module='tests.test_pipeline',
+                            output=str(ledgers / 'main.beancount'),
+                            state_path=str(tmp_path / 'imports.db'), max_workers=1)
+
+
+def ledger_transactions(tmp_path):
+    entries, _, _ = parser.parse_file(str(tmp_path / 'ledgers' / 'main.beancount'))
+    return [entry.narration for entry in entries if isinstance(entry, data.Transaction)]
+
+
+def test_identical_bookings_in_one_download_are_all_imported(tmp_path):
+    download(tmp_path, 'a.bean', COFFEE, COFFEE, RENT)
+    result = run(tmp_path)
+    assert result['entries'] == 3
+    assert result['dropped'] == []
+    assert sorted(ledger_transactions(tmp_path)) == ['Coffee', 'Coffee', 'Rent']
+
+
+def test_overlapping_download_imports_only_extra_occurrences(tmp_path):
+    download(tmp_path, 'a.bean', COFFEE, RENT)
+    run(tmp_path)
+    download(tmp_path, 'b.bean', COFFEE, COFFEE, RENT)
+    result = run(tmp_path)
+    assert result['entries'] == 1
+    assert [entry.narration for entry in result['dropped']] == ['Coffee', 'Rent']
+    assert sorted(ledger_transactions(tmp_path)) == ['Coffee', 'Coffee', 'Rent']
+
+
+def test_overlapping_new_downloads_are_not_imported_twice(tmp_path):
+    download(tmp_path, 'a.bean', COFFEE, RENT)
+    download(tmp_path, 'b.bean', RENT)
+    result = run(tmp_path)
+    assert result['entries'] == 2
+    assert [entry.narration for entry in result['dropped']] == ['Rent']
+    assert sorted(ledger_transactions(tmp_path)) == ['Coffee', 'Rent']
+
+
+def test_already_imported_files_are_skipped(tmp_path):
+    download(tmp_path, 'a.bean', COFFEE)
+    run(tmp_path)
+    result = run(tmp_path)
+    assert result['skipped_files'] == 1
+    assert result['files'] == 0
+
+
+def test_unused_mapping_rules_are_reported(tmp_path):
+    download(tmp_path, 'a.bean', COFFEE, COFFEE, RENT)
+    result = run(tmp_path)
+    assert [rule.pattern for rule in result['unused_rules']] == ['Gym']
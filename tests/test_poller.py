@@ -0,0 +1,89 @@
+import asyncio
+import os
+import signal
+import threading
+import pytest
+import requests
+from classes.api_base import BankAPIBase
+from utils.poller import ChallengePoller, PollCancelled
+
+
+class PendingClient:
+    """Answers every status check with a still pending challenge"""
+
+    replaying = False
+
+    def __init__(self):
+        self.checks = 0
+        self.checked = threading.Event()
+
+    def send(self, method, url, headers=None):
+        self.checks += 1
+        self.checked.set()
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"status": "PENDING"}'
+        return response
+
+
+class PushBank(BankAPIBase):
+    def __init__(self):
+        super().__init__('PUSHBANK')
+        self.pending = PendingClient()
+        self.outcome = None
+        self.finished = threading.Event()
+
+    def authenticate(self, on_progress=None):
+        poller = ChallengePoller(self.pending, 'https://bank.test/challenge', {},
+                                 lambda status: status['status'] == 'AUTHENTICATED',
+                                 initial_delay=30, cancelled=self.auth_cancelled)
+        try:
+            poller.poll()
+        except PollCancelled as e:
+            self.outcome = e
+        finally:
+            self.finished.set()
+
+
+def test_cancel_stops_a_waiting_poll():
+    bank = PushBank()
+    thread = threading.Thread(target=bank.authenticate)
+    thread.start()
+    assert bank.pending.checked.wait(5)
+    bank.cancel_authentication()
+    thread.join(5)
+    assert isinstance(bank.outcome, PollCancelled)
+    assert bank.pending.checks == 1
+
+
+def test_cancelling_the_task_stops_polling():
+    bank = PushBank()
+
+    async def run():
+        task = asyncio.create_task(bank.authenticate_async())
+        while not bank.pending.checked.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert bank.finished.wait(5)
+    assert isinstance(bank.outcome, PollCancelled)
+    assert bank.pending.checks == 1
+
+
+def test_ctrl_c_during_the_tan_wait_cancels_authentication(capsys):
+    import main
+
+    bank = PushBank()
+
+    def interrupt():
+        assert bank.pending.checked.wait(5)
+        os.kill(os.getpid(), signal.SIGINT)
+
+    threading.Thread(target=interrupt).start()
+    assert main.authenticate(bank) is False
+    assert bank.finished.wait(5)
+    assert isinstance(bank.outcome, PollCancelled)
+    assert 'Authentication cancelled' in capsys.readouterr().out
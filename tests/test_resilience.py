@@ -0,0 +1,126 @@
+import pytest
+import requests
+from utils import resilience
+from utils.api import ApiClient
+from utils.resilience import CircuitBreaker, RetryPolicy, TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, 'monotonic', clock)
+    return clock
+
+
+def test_connection_errors_are_retried_only_for_idempotent_methods():
+    policy = RetryPolicy()
+    error = requests.ConnectionError()
+    assert policy.should_retry('get', 0, error=error)
+    assert policy.should_retry('PUT', 0, error=requests.Timeout())
+    assert not policy.should_retry('POST', 0, error=error)
+    assert not policy.should_retry('GET', 0, error=requests.HTTPError())
+
+
+def test_server_errors_are_retried_for_post_only_when_unprocessed():
+    policy = RetryPolicy()
+    assert policy.should_retry('POST', 0, status=429)
+    assert policy.should_retry('POST', 0, status=503)
+    assert not policy.should_retry('POST', 0, status=500)
+    assert not policy.should_retry('POST', 0, status=504)
+    assert policy.should_retry('GET', 0, status=500)
+    assert not policy.should_retry('GET', 0, status=404)
+
+
+def test_retries_stop_at_max_retries():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.should_retry('GET', 1, status=503)
+    assert not policy.should_retry('GET', 2, status=503)
+
+
+def test_retry_after_wins_over_backoff_and_is_capped():
+    policy = RetryPolicy(backoff_factor=0.5, max_backoff=10.0)
+    assert policy.backoff(0, retry_after=7) == 7
+    assert policy.backoff(0, retry_after=0) == 0
+    assert policy.backoff(0, retry_after=3600) == 10.0
+
+
+def test_backoff_grows_exponentially_within_jitter():
+    policy = RetryPolicy(backoff_factor=0.5, max_backoff=3.0, jitter=0.2)
+    for attempt, base in [(0, 0.5), (1, 1.0), (2, 2.0), (5, 3.0)]:
+        delay = policy.backoff(attempt)
+        assert base * 0.8 <= delay <= base * 1.2
+
+
+def test_breaker_opens_at_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.state == 'closed' and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+
+def test_half_open_lets_a_single_trial_through_and_success_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == 'half-open'
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_trial_reopens_for_a_full_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_interrupted_trial_frees_the_half_open_slot(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    client = ApiClient(rate_limit=0, circuit_breaker=breaker)
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    client.session.request = interrupted
+    breaker.record_failure()
+    clock.now += 30
+    with pytest.raises(KeyboardInterrupt):
+        client.send('GET', 'https://bank.test/accounts')
+
+    assert not breaker.trial_running
+    assert breaker.state == 'half-open'
+    assert breaker.allow()
+
+
+def test_token_bucket_waits_once_the_burst_is_spent(clock, monkeypatch):
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(resilience.time, 'sleep', sleep)
+    bucket = TokenBucket(rate=2, burst=2)
+    assert bucket.acquire() == 0 and bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert slept == [pytest.approx(0.5)]
@@ -0,0 +1,92 @@
+import datetime
+from decimal import Decimal
+import pytest
+from classes.models import Balance, Transaction
+from utils.statement import (FONT_SIZE, ELLIPSIS, Statement, TablePDF, booking_order,
+                             fit_text, opening_balance)
+from utils.store import TransactionStore
+
+
+def booking(reference, booked, amount):
+    return Transaction(reference, 'A', 'BOOKED' if booked else 'NOTBOOKED',
+                       booked and datetime.date.fromisoformat(booked), None, Decimal(amount), 'EUR')
+
+
+TRANSACTIONS = [
+    booking('R1', '2024-01-05', '1000.00'),
+    booking('R2', '2024-01-20', '-250.50'),
+    booking('R3', '2024-02-01', '-49.50'),
+    booking('R4', None, '-10.00'),
+]
+
+
+@pytest.fixture
+def rows(monkeypatch):
+    drawn = []
+    monkeypatch.setattr(TablePDF, 'row',
+                        lambda pdf, values, bold=False, fill=False: drawn.append((values, bold)))
+    return drawn
+
+
+def test_subtotals_and_balances(rows, tmp_path):
+    balance = Balance('A', Decimal('1200.00'), 'EUR')
+    opening = opening_balance(balance, TRANSACTIONS)
+    assert opening == Decimal('500.00')
+
+    statement = Statement('Test', opening)
+    for transaction in TRANSACTIONS:
+        statement.add(transaction)
+    statement.close(str(tmp_path / 'statement.pdf'))
+
+    assert [values[0] for values, bold in rows if not bold] == \
+        ['2024-01-05', '2024-01-20', '2024-02-01', '']
+    totals = [values[3:] for values, bold in rows if bold]
+    assert totals == [
+        ('Opening balance', '', '', '500.00'),
+        ('Subtotal 2024-01 (2 bookings)', 'in 1,000.00   out -250.50', '749.50', '1,249.50'),
+        ('Subtotal 2024-02 (1 bookings)', 'in 0.00   out -49.50', '-49.50', '1,200.00'),
+        ('Subtotal not booked (1 bookings)', 'in 0.00   out -10.00', '-10.00', '1,190.00'),
+        ('Closing balance (4 bookings)', '', '690.00', '1,190.00'),
+    ]
+    assert (tmp_path / 'statement.pdf').stat().st_size > 0
+
+
+def test_unknown_balance_starts_at_zero_without_opening_row(rows, tmp_path):
+    assert opening_balance(None, TRANSACTIONS) is None
+    statement = Statement('Test', None)
+    statement.add(TRANSACTIONS[0])
+    statement.close(str(tmp_path / 'statement.pdf'))
+    assert [bold for _, bold in rows] == [False, True, True]
+    assert rows[-1][0][3:] == ('Closing balance (1 bookings)', '', '1,000.00', '1,000.00')
+
+
+def test_out_of_order_transactions_are_refused(rows):
+    statement = Statement('Test')
+    statement.add(TRANSACTIONS[1])
+    with pytest.raises(ValueError):
+        statement.add(TRANSACTIONS[0])
+    statement.add(TRANSACTIONS[3])
+    with pytest.raises(ValueError):
+        statement.add(TRANSACTIONS[2])
+
+
+def test_newest_first_input_sorts_into_booking_order():
+    assert sorted(reversed(TRANSACTIONS), key=booking_order) == TRANSACTIONS
+
+
+def test_store_yields_booking_order(tmp_path):
+    store = TransactionStore(str(tmp_path / 'tx.db'))
+    store.upsert_transactions('COMDIRECT', 'A', [
+        {'reference': 'P1', 'bookingStatus': 'NOTBOOKED', 'bookingDate': None},
+        {'reference': 'B2', 'bookingStatus': 'BOOKED', 'bookingDate': '2024-02-01'},
+        {'reference': 'B1', 'bookingStatus': 'BOOKED', 'bookingDate': '2024-01-01'},
+    ])
+    assert [t['reference'] for t in store.iter_transactions('A')] == ['B1', 'B2', 'P1']
+    store.close()
+
+
+def test_fit_text_with_a_selected_font():
+    pdf = TablePDF([('Text', 20, 'L')])
+    assert fit_text('short', 20, pdf.font_key) == 'short'
+    cut = fit_text('x' * 200, 20, pdf.font_key, FONT_SIZE)
+    assert cut.endswith(ELLIPSIS) and len(cut) < 200
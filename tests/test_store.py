@@ -0,0 +1,64 @@
+from utils.store import TransactionStore, transaction_hash
+
+
+def booked(reference, day, value='-10.00'):
+    return {'reference': reference, 'bookingStatus': 'BOOKED', 'bookingDate': day,
+            'amount': {'value': value, 'unit': 'EUR'}, 'remittanceInfo': reference}
+
+
+def pending(day, value='-25.00'):
+    return {'reference': None, 'bookingStatus': 'NOTBOOKED', 'bookingDate': day,
+            'amount': {'value': value, 'unit': 'EUR'}, 'remittanceInfo': 'card payment'}
+
+
+def store(tmp_path):
+    return TransactionStore(str(tmp_path / 'transactions.db'))
+
+
+def test_hash_uses_reference_and_falls_back_to_content():
+    assert transaction_hash(booked('R1', '2024-01-01')) == 'R1'
+    assert transaction_hash(pending('2024-01-02')) == transaction_hash(pending('2024-01-02'))
+    assert transaction_hash(pending('2024-01-02')) != transaction_hash(pending('2024-01-03'))
+
+
+def test_upsert_counts_and_watermark(tmp_path):
+    db = store(tmp_path)
+    counts = db.upsert_transactions('COMDIRECT', 'A', [booked('R1', '2024-01-01'),
+                                                       booked('R2', '2024-01-05')])
+    assert counts == {'inserted': 2, 'updated': 0, 'skipped': 0, 'removed': 0}
+    assert db.get_watermark('A') == '2024-01-05'
+
+    counts = db.upsert_transactions('COMDIRECT', 'A', [booked('R2', '2024-01-05'),
+                                                       booked('R1', '2024-01-01', '-11.00')])
+    assert counts == {'inserted': 0, 'updated': 1, 'skipped': 1, 'removed': 0}
+    assert [t['reference'] for t in db.iter_transactions('A')] == ['R1', 'R2']
+    assert [t['reference'] for t in db.iter_transactions('A', '2024-01-02')] == ['R2']
+
+
+def test_pending_row_is_replaced_once_it_books(tmp_path):
+    db = store(tmp_path)
+    db.upsert_transactions('COMDIRECT', 'A', [booked('R1', '2024-01-01'), pending('2024-01-02')])
+
+    counts = db.upsert_transactions('COMDIRECT', 'A', [booked('R1', '2024-01-01'),
+                                                       pending('2024-01-02')])
+    assert counts == {'inserted': 0, 'updated': 0, 'skipped': 2, 'removed': 0}
+
+    counts = db.upsert_transactions('COMDIRECT', 'A', [booked('R1', '2024-01-01'),
+                                                       booked('R2', '2024-01-02', '-25.00')])
+    assert counts == {'inserted': 1, 'updated': 0, 'skipped': 1, 'removed': 1}
+    assert [t['bookingStatus'] for t in db.iter_transactions('A')] == ['BOOKED', 'BOOKED']
+
+
+def test_failed_sync_keeps_pending_rows(tmp_path):
+    db = store(tmp_path)
+    db.upsert_transactions('COMDIRECT', 'A', [pending('2024-01-02')])
+
+    def broken():
+        yield booked('R1', '2024-01-01')
+        raise ConnectionError
+
+    try:
+        db.upsert_transactions('COMDIRECT', 'A', broken())
+    except ConnectionError:
+        pass
+    assert [t['bookingStatus'] for t in db.iter_transactions('A')] == ['NOTBOOKED']
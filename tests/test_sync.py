@@ -0,0 +1,66 @@
+import threading
+import time
+import pytest
+from utils.store import TransactionStore
+from utils.sync import sync_accounts
+
+
+class FakeBank:
+    max_workers = 3
+
+    def __init__(self, accounts, fail=None):
+        self.accounts = accounts
+        self.fail = fail
+        self.running = 0
+        self.peak = 0
+        self.from_dates = {}
+        self._lock = threading.Lock()
+
+    def get_account_ids(self):
+        return list(self.accounts)
+
+    def iter_transactions(self, account_id, from_date=None, to_date=None, stream=False):
+        self.from_dates[account_id] = from_date
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            for index in range(self.accounts[account_id]):
+                time.sleep(0.01)
+                if account_id == self.fail:
+                    raise ConnectionError(f'{account_id} failed')
+                yield {'reference': f'{account_id}-{index}', 'bookingStatus': 'BOOKED',
+                       'bookingDate': f'2024-01-{index + 1:02d}'}
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TransactionStore(str(tmp_path / 'tx.db'))
+    yield store
+    store.close()
+
+
+def test_accounts_download_concurrently_into_the_store(store):
+    bank = FakeBank({'A': 5, 'B': 3, 'C': 4, 'D': 2})
+    results = sync_accounts(bank, store, 'COMDIRECT')
+
+    assert list(results) == ['A', 'B', 'C', 'D']
+    assert [results[a]['inserted'] for a in results] == [5, 3, 4, 2]
+    assert bank.peak > 1
+    assert [t['reference'] for t in store.iter_transactions('B')] == ['B-0', 'B-1', 'B-2']
+
+    # The next sync starts from each account's watermark
+    assert sync_accounts(bank, store, 'COMDIRECT')['A']['skipped'] == 5
+    assert bank.from_dates['A'] == '2024-01-02'
+
+
+def test_failed_account_stops_the_sync(store):
+    bank = FakeBank({'A': 2, 'B': 50, 'C': 50}, fail='B')
+    with pytest.raises(ConnectionError):
+        sync_accounts(bank, store, 'COMDIRECT')
+    assert bank.running == 0
+    assert len(list(store.iter_transactions('A'))) == 2
+    assert list(store.iter_transactions('B')) == []